@@ -0,0 +1,201 @@
+"""
+Backtest orchestration: history download, strategy dispatch and result caching
+"""
+import os
+import re
+from typing import Dict, Any, List, Optional, Callable
+import yfinance as yf
+from django.conf import settings
+from .backtester import BacktestEngine, iter_csv_bars, run_chunked
+from .factor_backtester import run_factor_strategy
+from .market_tools import NIFTY_50_SYMBOLS
+from .cache import TTLCache
+
+# Downloaded history is reused for a short while so that repeated playground
+# submissions do not hit yfinance. Results are keyed by the last bar of that
+# history, so they go stale on their own as soon as a new bar lands.
+_history_cache = TTLCache(maxsize=settings.BACKTEST_CACHE_SIZE, ttl=settings.BACKTEST_HISTORY_TTL)
+_result_cache = TTLCache(maxsize=settings.BACKTEST_CACHE_SIZE)
+
+# A plain exchange ticker, e.g. RELIANCE.NS or M&M.NS
+TICKER_PATTERN = r'[A-Z0-9&_\-]+(\.[A-Z]+)?'
+
+
+def to_ticker_symbol(symbol: str) -> str:
+    # Append .NS if not present (assuming NSE)
+    if not symbol.endswith(".NS") and not symbol.endswith(".BO"):
+        return f"{symbol}.NS"
+    return symbol
+
+
+def normalize_params(strategy: str, params: Dict[str, Any]) -> Dict[str, int]:
+    """
+    Applies strategy defaults and coerces values, so that equivalent requests
+    ("50" vs 50, omitted vs default) map to the same cache entry.
+    Raises ValueError for unknown strategies or non-numeric parameters.
+    """
+    params = params or {}
+    if strategy == 'sma':
+        return {
+            'short_window': int(params.get('short_window', 50)),
+            'long_window': int(params.get('long_window', 200)),
+        }
+    if strategy == 'rsi':
+        return {
+            'period': int(params.get('period', 14)),
+            'overbought': int(params.get('overbought', 70)),
+            'oversold': int(params.get('oversold', 30)),
+        }
+    raise ValueError('Unknown strategy')
+
+
+def fetch_history(ticker_symbol: str, period: str):
+    key = (ticker_symbol, period)
+    df = _history_cache.get(key)
+    if df is None:
+        ticker = yf.Ticker(ticker_symbol)
+        # Fetch enough data for indicators
+        df = ticker.history(period=period)
+        _history_cache.set(key, df)
+    return df
+
+
+def run_strategy(engine: BacktestEngine, strategy: str, params: Dict[str, int]) -> Dict[str, Any]:
+    if strategy == 'sma':
+        return engine.run_sma_strategy(params['short_window'], params['long_window'])
+    if strategy == 'rsi':
+        return engine.run_rsi_strategy(params['period'], params['overbought'], params['oversold'])
+    raise ValueError('Unknown strategy')
+
+
+def run_backtest(symbol: str, strategy: str, params: Dict[str, Any], period: str = '1y') -> Optional[Dict[str, Any]]:
+    """
+    Runs (or serves from cache) a backtest for a symbol.
+    Returns None when no history is available for the symbol.
+    The returned dict may be shared with other callers and must not be mutated.
+    """
+    params = normalize_params(strategy, params)
+    ticker_symbol = to_ticker_symbol(symbol)
+
+    df = fetch_history(ticker_symbol, period)
+    if df.empty:
+        return None
+
+    # The last close is part of the key too: yfinance revises today's bar in
+    # place while the market is open.
+    last_bar = (df.index[-1], float(df['Close'].iloc[-1]), len(df))
+    key = (ticker_symbol, period, strategy, tuple(sorted(params.items())), last_bar)
+    results = _result_cache.get(key)
+    if results is None:
+        results = run_strategy(BacktestEngine(df), strategy, params)
+        _result_cache.set(key, results)
+    return results
+
+
+def normalize_factor_params(strategy: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Defaults for the cross-sectional strategies: 6-month momentum skipping the
+    last month, and 1-week mean reversion, both holding the top 10 names.
+    """
+    params = params or {}
+    if strategy == 'momentum':
+        defaults = {'lookback': 126, 'skip': 21, 'top_n': 10, 'bottom_n': 0, 'rebalance': 21}
+    elif strategy == 'mean_reversion':
+        defaults = {'lookback': 5, 'skip': 0, 'top_n': 10, 'bottom_n': 0, 'rebalance': 5}
+    else:
+        raise ValueError('Unknown strategy')
+    normalized = {name: int(params.get(name, default)) for name, default in defaults.items()}
+    normalized['cost_bps'] = float(params.get('cost_bps', 0))
+    return normalized
+
+
+def fetch_universe(ticker_symbols: tuple, period: str):
+    """Close prices as a (dates x symbols) DataFrame, one download for the universe."""
+    key = ('universe', ticker_symbols, period)
+    df = _history_cache.get(key)
+    if df is None:
+        df = yf.download(list(ticker_symbols), period=period, progress=False)['Close']
+        df = df.dropna(axis=1, how='all')
+        _history_cache.set(key, df)
+    return df
+
+
+def normalize_symbols(symbols: Optional[List[str]]) -> tuple:
+    """
+    Sorted, de-duplicated ticker symbols for a factor universe (NIFTY_50_SYMBOLS
+    if none are given). Raises ValueError unless `symbols` is a list of plain
+    ticker strings no longer than FACTOR_MAX_SYMBOLS.
+    """
+    if not symbols:
+        symbols = NIFTY_50_SYMBOLS
+    elif not isinstance(symbols, list) or not all(isinstance(s, str) for s in symbols):
+        raise ValueError('symbols must be a list of strings')
+    elif len(symbols) > settings.FACTOR_MAX_SYMBOLS:
+        raise ValueError(f'At most {settings.FACTOR_MAX_SYMBOLS} symbols are allowed')
+    tickers = tuple(sorted({to_ticker_symbol(s.strip().upper()) for s in symbols}))
+    for ticker in tickers:
+        if not re.fullmatch(TICKER_PATTERN, ticker):
+            raise ValueError(f'Invalid symbol: {ticker}')
+    return tickers
+
+
+def run_factor_backtest(strategy: str, params: Dict[str, Any], period: str = '2y',
+                        symbols: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Runs (or serves from cache) a momentum/mean reversion strategy ranking the
+    universe (NIFTY_50_SYMBOLS unless `symbols` is given) on every rebalance.
+    Returns None when no prices are available.
+    """
+    params = normalize_factor_params(strategy, params)
+    tickers = normalize_symbols(symbols)
+
+    prices = fetch_universe(tickers, period)
+    if prices.empty:
+        return None
+
+    last_bar = (prices.index[-1], tuple(prices.iloc[-1].fillna(0).round(4)), len(prices))
+    key = ('factor', tickers, period, strategy, tuple(sorted(params.items())), last_bar)
+    results = _result_cache.get(key)
+    if results is None:
+        results = run_factor_strategy(prices.rename(columns=lambda c: c.rsplit('.', 1)[0]), strategy, **params)
+        _result_cache.set(key, results)
+    return results
+
+
+def bars_path(ticker_symbol: str, interval: str) -> str:
+    """
+    Location of stored bars: BARS_DATA_DIR/<interval>/<TICKER>.csv, e.g.
+    bars/1m/RELIANCE.NS.csv. Raises ValueError for symbols that are not a
+    plain ticker, so user input cannot escape the data directory.
+    """
+    if not re.fullmatch(TICKER_PATTERN, ticker_symbol):
+        raise ValueError('Invalid symbol')
+    return os.path.join(settings.BARS_DATA_DIR, interval, f"{ticker_symbol}.csv")
+
+
+def run_intraday_backtest(symbol: str, strategy: str, params: Dict[str, Any], curve_every: int = 1,
+                          on_chunk: Optional[Callable[[int], None]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Backtests stored 1-minute bars in blocks of INTRADAY_CHUNK_ROWS, so years
+    of minute data never have to be loaded as one DataFrame. The equity curve
+    keeps every `curve_every`-th bar, thinned further to at most
+    INTRADAY_CURVE_POINTS points.
+    Returns None when no bars are stored for the symbol.
+    """
+    params = normalize_params(strategy, params)
+    path = bars_path(to_ticker_symbol(symbol.upper()), '1m')
+    if not os.path.exists(path):
+        return None
+    return run_chunked(
+        iter_csv_bars(path, chunksize=settings.INTRADAY_CHUNK_ROWS),
+        strategy, params,
+        date_format='%Y-%m-%d %H:%M',
+        curve_every=curve_every,
+        max_points=settings.INTRADAY_CURVE_POINTS,
+        on_chunk=on_chunk,
+    )
+
+
+def clear_cache():
+    _history_cache.clear()
+    _result_cache.clear()
@@ -1,15 +1,404 @@
+from collections.abc import Sequence
 import pandas as pd
 import numpy as np
 
+INITIAL_CAPITAL = 100000
+
+
+class RollingMean:
+    """
+    Trailing mean over `window` values, NaN until the window is full.
+    Can be fed a series in consecutive blocks: the float64 running sum (which
+    also keeps float32 inputs precise) is carried across block boundaries, so
+    blocks give bit-identical results to a single call over the whole series.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.seen = 0
+        self.total = 0.0
+        self.tail = np.empty(0)  # running sums of the last `window` bars
+
+    def update(self, values, dtype=np.float64):
+        w = self.window
+        n = len(values)
+        out = np.full(n, np.nan, dtype=dtype)
+        if n == 0:
+            return out
+
+        running = np.empty(n + 1)
+        running[0] = self.total
+        running[1:] = values
+        np.cumsum(running, out=running)
+        sums = np.concatenate((self.tail, running[1:]))
+        del running
+        h = len(self.tail)
+
+        # Bar j of this block is bar seen + j of the series
+        first_full = w - 1 - self.seen
+        if 0 <= first_full < n:
+            out[first_full] = sums[h + first_full] / w
+        j = max(w - self.seen, 0)
+        if j < n:
+            out[j:] = (sums[h + j:h + n] - sums[h + j - w:h + n - w]) / w
+
+        self.seen += n
+        self.total = sums[-1]
+        self.tail = sums[-w:].copy()
+        return out
+
+
+def rolling_mean(values, window, dtype=np.float64):
+    return RollingMean(window).update(values, dtype)
+
+
+class SmaCrossoverSignals:
+    """
+    Array version of the SMA crossover rules that carries its state across
+    blocks. positions() returns int8 1 (Buy) / -1 (Sell), the equivalent of
+    Signal.diff(); the first bar of the series never trades.
+    """
+
+    def __init__(self, short_window, long_window):
+        self.short = RollingMean(short_window)
+        self.long = RollingMean(long_window)
+        self.last_signal = None
+
+    def positions(self, close):
+        sma_short = self.short.update(close, dtype=close.dtype)
+        sma_long = self.long.update(close, dtype=close.dtype)
+
+        # NaN compares False both ways, so warm-up bars get a 0 signal
+        signal = np.greater(sma_short, sma_long).view(np.int8) - np.less(sma_short, sma_long).view(np.int8)
+        del sma_short, sma_long
+
+        position = np.zeros(len(signal), dtype=np.int8)
+        np.subtract(signal[1:], signal[:-1], out=position[1:])
+        if len(signal):
+            if self.last_signal is not None:
+                position[0] = signal[0] - self.last_signal
+            self.last_signal = signal[-1]
+        return position
+
+
+class RsiReversionSignals:
+    """
+    Array version of the RSI mean reversion rules that carries the previous
+    close, the rolling gain/loss sums and the open position across blocks.
+    """
+
+    def __init__(self, period, overbought, oversold):
+        self.gain = RollingMean(period)
+        self.loss = RollingMean(period)
+        self.overbought = overbought
+        self.oversold = oversold
+        self.prev_close = None
+        self.state = 0
+
+    def positions(self, close):
+        # The first bar has no change, which counts as neither gain nor loss
+        delta = np.zeros(len(close), dtype=close.dtype)
+        np.subtract(close[1:], close[:-1], out=delta[1:])
+        if len(close):
+            if self.prev_close is not None:
+                delta[0] = close[0] - self.prev_close
+            self.prev_close = close[-1]
+        gain = self.gain.update(np.maximum(delta, 0), dtype=close.dtype)
+        loss = self.loss.update(np.maximum(-delta, 0), dtype=close.dtype)
+        del delta
+
+        # Same IEEE behaviour as the pandas path: no losses -> RSI 100,
+        # no movement at all -> NaN (no signal)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = gain / loss
+            rsi += 1
+            np.divide(100, rsi, out=rsi)
+            np.subtract(100, rsi, out=rsi)
+        del gain, loss
+
+        position, self.state = rsi_positions(rsi, self.overbought, self.oversold, self.state)
+        return position
+
+
+def rsi_positions(rsi, overbought, oversold, state=0):
+    """
+    Enter when RSI drops below oversold, exit when it rises above overbought,
+    holding state in between. Returns an int8 array with 1 (Buy) / -1 (Sell)
+    and the state (0 flat, 1 long) after the last bar.
+    """
+    position = np.zeros(len(rsi), dtype=np.int8)
+    enter = rsi < oversold
+    exit_ = rsi > overbought
+    if np.any(enter & exit_):
+        # Thresholds overlap, so a bar can flip either way: walk the bars
+        for i in np.flatnonzero(enter | exit_):
+            if state == 0 and enter[i]:
+                state = 1
+                position[i] = 1
+            elif state == 1 and exit_[i]:
+                state = 0
+                position[i] = -1
+        return position, state
+
+    # Only the first mark after a change of state trades
+    marks = np.flatnonzero(enter | exit_)
+    if len(marks) == 0:
+        return position, state
+    wanted = enter[marks].astype(np.int8)
+    previous = np.concatenate(([state], wanted[:-1]))
+    changes = marks[wanted != previous]
+    position[changes] = np.where(enter[changes], 1, -1)
+    return position, int(wanted[-1])
+
+
+class EquityCurve(Sequence):
+    """
+    Equity curve held as arrays of bar dates, equity and price. The
+    {'date', 'equity', 'price'} points are only built when the curve is
+    indexed, iterated or serialized (DRF's encoder calls tolist()), so a
+    curve over millions of bars costs 24 bytes per bar until then.
+    """
+
+    def __init__(self, index, equity, price, date_format='%Y-%m-%d'):
+        self.index = index
+        self.equity = equity
+        self.price = price
+        self.date_format = date_format
+
+    def __len__(self):
+        return len(self.equity)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return EquityCurve(self.index[i], self.equity[i], self.price[i], self.date_format).tolist()
+        return {'date': self.index[i].strftime(self.date_format),
+                'equity': float(self.equity[i]), 'price': float(self.price[i])}
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __eq__(self, other):
+        if not isinstance(other, (Sequence, list)) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and self.tolist() == list(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"EquityCurve({len(self)} points)"
+
+    def tolist(self):
+        dates = self.index.strftime(self.date_format)
+        return [
+            {'date': date, 'equity': value, 'price': price}
+            for date, value, price in zip(dates, self.equity.tolist(), self.price.tolist())
+        ]
+
+
+def _sample(values, rows):
+    # A strided view would keep the whole block alive
+    return values[rows].copy() if rows.step > 1 else values[rows]
+
+
+class PerformanceTracker:
+    """
+    Calculates returns, trades, and equity curve from arrays, one block of
+    bars at a time. `position` contains 1 (Buy) and -1 (Sell) signals;
+    anything else is a hold.
+    curve_every: keep every n-th bar (and the last one) in the equity curve.
+    max_points: when the curve grows past this, drop every other point and
+    double curve_every, so a stream of unknown length keeps a bounded curve.
+    The curve is kept as arrays (one equity array per block, the block's
+    dates and prices as views) and returned as an EquityCurve.
+    """
+
+    def __init__(self, date_format='%Y-%m-%d', curve_every=1, max_points=None):
+        self.date_format = date_format
+        self.curve_every = curve_every
+        self.max_points = max_points
+        self.points = 0
+        self.cash = INITIAL_CAPITAL
+        self.holdings = 0
+        self.trades = []
+        self.blocks = []  # (dates, equity, price) per block
+        self.seen = 0
+        self.last_point = None
+
+    def update(self, index, close, position):
+        n = len(close)
+        if n == 0:
+            return
+
+        # Only bars with an action can change the account, so walk those and
+        # fill the bars in between from the resulting cash/holdings segments.
+        trade_bars = [0]
+        cash_values = [self.cash]
+        holding_values = [self.holdings]
+        for i in np.flatnonzero((position == 1) | (position == -1)):
+            price = float(close[i])
+            if position[i] == 1: # Buy
+                if self.cash > 0:
+                    self.holdings = self.cash / price
+                    self.cash = 0
+                    self.trades.append({
+                        'type': 'BUY',
+                        'date': index[i],
+                        'price': price
+                    })
+                else:
+                    continue
+            else: # Sell
+                if self.holdings > 0:
+                    self.cash = self.holdings * price
+                    self.holdings = 0
+                    self.trades.append({
+                        'type': 'SELL',
+                        'date': index[i],
+                        'price': price
+                    })
+                else:
+                    continue
+            trade_bars.append(i)
+            cash_values.append(self.cash)
+            holding_values.append(self.holdings)
+
+        lengths = np.diff(np.append(trade_bars, n))
+        equity = np.repeat(np.asarray(holding_values, dtype=np.float64), lengths)
+        equity *= close
+        equity += np.repeat(np.asarray(cash_values, dtype=np.float64), lengths)
+
+        rows = slice((-self.seen) % self.curve_every, n, self.curve_every)
+        if rows.start < n:
+            self.blocks.append((index[rows].copy(deep=rows.step > 1), _sample(equity, rows), _sample(close, rows)))
+            self.points += len(self.blocks[-1][1])
+        self.last_point = (index[-1:], equity[-1:].copy(), close[-1:].copy())
+        self.seen += n
+        while self.max_points and self.points > self.max_points:
+            self._halve_curve()
+
+    def _halve_curve(self):
+        # Kept points sit on multiples of curve_every, so every other one
+        # (starting with bar 0) sits on multiples of twice that
+        blocks = []
+        offset = 0
+        for dates, equity, price in self.blocks:
+            rows = slice(offset % 2, None, 2)
+            offset += len(equity)
+            blocks.append((dates[rows].copy(deep=True), equity[rows].copy(), price[rows].copy()))
+        self.blocks = blocks
+        self.points = sum(len(b[1]) for b in blocks)
+        self.curve_every *= 2
+
+    def equity_curve(self):
+        blocks = list(self.blocks)
+        if (self.seen - 1) % self.curve_every:
+            blocks.append(self.last_point)
+        if len(blocks) == 1:
+            dates, equity, price = blocks[0]
+        else:
+            dates = blocks[0][0].append([b[0] for b in blocks[1:]])
+            equity = np.concatenate([b[1] for b in blocks])
+            price = np.concatenate([b[2] for b in blocks])
+        return EquityCurve(dates, equity, price, self.date_format)
+
+    def result(self):
+        if self.last_point is None:
+            raise ValueError("Data is empty")
+
+        initial_capital = INITIAL_CAPITAL
+        final_equity = float(self.last_point[1][0])
+        total_return = ((final_equity - initial_capital) / initial_capital) * 100
+
+        return {
+            'equity_curve': self.equity_curve(),
+            'trades': self.trades,
+            'metrics': {
+                'total_return': round(total_return, 2),
+                'final_equity': round(final_equity, 2),
+                'total_trades': len(self.trades)
+            }
+        }
+
+
+def calculate_performance(index, close, position, date_format='%Y-%m-%d'):
+    tracker = PerformanceTracker(date_format)
+    tracker.update(index, close, position)
+    return tracker.result()
+
+
+def make_signals(strategy, params):
+    if strategy == 'sma':
+        return SmaCrossoverSignals(params['short_window'], params['long_window'])
+    if strategy == 'rsi':
+        return RsiReversionSignals(params['period'], params['overbought'], params['oversold'])
+    raise ValueError('Unknown strategy')
+
+
+def iter_csv_bars(path, chunksize=250_000):
+    """
+    Streams bars from a CSV laid out like yfinance history written with
+    DataFrame.to_csv() (timestamp first, then OHLCV), reading only the
+    timestamp and Close columns, `chunksize` rows at a time.
+    """
+    date_column = pd.read_csv(path, nrows=0).columns[0]
+    with pd.read_csv(path, usecols=[date_column, 'Close'], index_col=date_column,
+                     parse_dates=True, chunksize=chunksize) as reader:
+        for chunk in reader:
+            yield chunk
+
+
+def run_chunked(chunks, strategy, params, dtype=None, date_format='%Y-%m-%d', curve_every=1, max_points=None,
+                on_chunk=None):
+    """
+    Runs a strategy over bars that arrive in blocks (e.g. iter_csv_bars),
+    carrying indicator, position and account state across block boundaries.
+    Gives the same result as a low-memory BacktestEngine over all bars.
+
+    chunks: iterable of DataFrames with a 'Close' column and datetime index.
+    params: strategy parameters as returned by backtest_service.normalize_params.
+    curve_every, max_points: equity curve sampling, see PerformanceTracker.
+    on_chunk: optional callback receiving the number of bars processed so far.
+    """
+    signals = make_signals(strategy, params)
+    tracker = PerformanceTracker(date_format, curve_every, max_points)
+    rows = 0
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        close = chunk['Close'].to_numpy(dtype=dtype, copy=False)
+        tracker.update(chunk.index, close, signals.positions(close))
+        rows += len(close)
+        if on_chunk:
+            on_chunk(rows)
+    return tracker.result()
+
+
 class BacktestEngine:
-    def __init__(self, data):
+    def __init__(self, data, low_memory=False, dtype=None, date_format='%Y-%m-%d'):
         """
         data: pd.DataFrame with columns ['Open', 'High', 'Low', 'Close', 'Volume']
               and datetime index.
+        low_memory: keep a read-only view of the Close column instead of a
+                    copy of the frame; strategies then allocate only the
+                    arrays they need instead of adding DataFrame columns.
+        dtype: price precision in low-memory mode, e.g. np.float32 to halve
+               the footprint (this copies the Close column once).
+        date_format: strftime format of equity curve dates.
         """
-        self.data = data.copy()
-        if self.data.empty:
+        if data.empty:
             raise ValueError("Data is empty")
+        if dtype is not None and not low_memory:
+            raise ValueError("dtype is only supported with low_memory=True")
+        self.low_memory = low_memory
+        self.date_format = date_format
+        if low_memory:
+            self.data = None
+            self.index = data.index
+            close = data['Close'].to_numpy(dtype=dtype, copy=False).view()
+            close.flags.writeable = False
+            self.close = close
+        else:
+            self.data = data.copy()
 
     def run_sma_strategy(self, short_window=50, long_window=200):
         """
@@ -17,21 +406,24 @@ class BacktestEngine:
         Buy when Short SMA crosses above Long SMA.
         Sell when Short SMA crosses below Long SMA.
         """
+        if self.low_memory:
+            return self._run_arrays(SmaCrossoverSignals(short_window, long_window))
+
         df = self.data.copy()
-        
+
         # Calculate Indicators (Manual Pandas)
         df['SMA_Short'] = df['Close'].rolling(window=short_window).mean()
         df['SMA_Long'] = df['Close'].rolling(window=long_window).mean()
-        
+
         # Generate Signals
         df['Signal'] = 0
         df.loc[df['SMA_Short'] > df['SMA_Long'], 'Signal'] = 1
         df.loc[df['SMA_Short'] < df['SMA_Long'], 'Signal'] = -1
-        
+
         # Identify Crossovers (Trades)
         # 1 -> Buy, -1 -> Sell
         df['Position'] = df['Signal'].diff()
-        
+
         return self._calculate_performance(df)
 
     def run_rsi_strategy(self, period=14, overbought=70, oversold=30):
@@ -40,29 +432,32 @@ class BacktestEngine:
         Buy when RSI crosses above Oversold (30).
         Sell when RSI crosses below Overbought (70).
         """
+        if self.low_memory:
+            return self._run_arrays(RsiReversionSignals(period, overbought, oversold))
+
         df = self.data.copy()
-        
+
         # Calculate RSI (Manual Pandas)
         delta = df['Close'].diff()
         gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
         loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
-        
+
         rs = gain / loss
         df['RSI'] = 100 - (100 / (1 + rs))
-        
+
         # Generate Signals
         df['Signal'] = 0
-        
+
         # We need to track state to hold position
         position = 0
         signals = []
-        
+
         for i in range(len(df)):
             rsi = df['RSI'].iloc[i]
             if pd.isna(rsi):
                 signals.append(0)
                 continue
-                
+
             if position == 0:
                 if rsi < oversold:
                     position = 1
@@ -75,68 +470,19 @@ class BacktestEngine:
                     signals.append(-1)
                 else:
                     signals.append(0)
-        
-        df['Position'] = signals 
-        
+
+        df['Position'] = signals
+
         return self._calculate_performance(df)
 
+    def _run_arrays(self, signals):
+        tracker = PerformanceTracker(self.date_format)
+        tracker.update(self.index, self.close, signals.positions(self.close))
+        return tracker.result()
+
     def _calculate_performance(self, df):
         """
         Calculates returns, trades, and equity curve.
         Assumes 'Position' column contains 1 (Buy) and -1 (Sell) signals.
         """
-        initial_capital = 100000
-        cash = initial_capital
-        holdings = 0
-        
-        equity_curve = []
-        trades = []
-        
-        # Filter only rows with action
-        actions = df[df['Position'] != 0]
-        
-        last_price = 0
-        
-        for date, row in df.iterrows():
-            price = row['Close']
-            action = row['Position']
-            
-            if action == 1: # Buy
-                if cash > 0:
-                    holdings = cash / price
-                    cash = 0
-                    trades.append({
-                        'type': 'BUY',
-                        'date': date,
-                        'price': price
-                    })
-            elif action == -1: # Sell
-                if holdings > 0:
-                    cash = holdings * price
-                    holdings = 0
-                    trades.append({
-                        'type': 'SELL',
-                        'date': date,
-                        'price': price
-                    })
-            
-            current_equity = cash + (holdings * price)
-            equity_curve.append({
-                'date': date.strftime('%Y-%m-%d'),
-                'equity': current_equity,
-                'price': price
-            })
-            last_price = price
-
-        final_equity = equity_curve[-1]['equity']
-        total_return = ((final_equity - initial_capital) / initial_capital) * 100
-        
-        return {
-            'equity_curve': equity_curve,
-            'trades': trades,
-            'metrics': {
-                'total_return': round(total_return, 2),
-                'final_equity': round(final_equity, 2),
-                'total_trades': len(trades)
-            }
-        }
+        return calculate_performance(df.index, df['Close'].to_numpy(), df['Position'].to_numpy(), self.date_format)
@@ -0,0 +1,71 @@
+"""
+Small in-process caches shared by the API modules
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Thread-safe, size-bounded LRU cache with an optional per-entry TTL.
+
+    maxsize: maximum number of entries; the least recently used entry is
+             evicted when the cache is full.
+    ttl: seconds an entry stays valid, or None to keep entries until evicted.
+    stale_ttl: seconds an expired entry is still kept for get_stale()
+               (stale-while-revalidate); 0 drops entries once they expire.
+    """
+
+    def __init__(self, maxsize=128, ttl=None, stale_ttl=0):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        value, fresh = self.get_stale(key, default)
+        return value if fresh else default
+
+    def get_stale(self, key, default=None):
+        """
+        Returns (value, fresh). Expired entries within stale_ttl come back with
+        fresh=False; missing or fully expired ones as (default, False).
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default, False
+            value, stored_at = entry
+            age = time.monotonic() - stored_at
+            if self.ttl is not None and age > self.ttl:
+                if age > self.ttl + self.stale_ttl:
+                    del self._data[key]
+                    return default, False
+                self._data.move_to_end(key)
+                return value, False
+            self._data.move_to_end(key)
+            return value, True
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return entry[0] if entry is not None else default
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
@@ -0,0 +1,158 @@
+"""
+Token-budgeted conversation history.
+
+Only the most recent messages, up to CHAT_HISTORY_TOKENS, are sent to Gemini
+verbatim; older ones are folded into a rolling summary stored on the
+conversation document ("summary", plus "summary_upto": how many messages it
+covers). So the prompt stays bounded however long a conversation runs.
+
+The summary is refreshed on a background thread after a reply is saved, and
+only when messages are about to leave the window. It then folds the new
+messages into the previous summary, down to half the budget, so it runs
+once every few turns and never re-reads the whole conversation.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+from bson import ObjectId
+from django.conf import settings
+from . import gemini
+from . import mongo
+
+SUMMARY_INSTRUCTION = (
+    "You maintain a running summary of a conversation between a user and a trading assistant. "
+    "Given the current summary and the next messages, return the updated summary. Keep facts the "
+    "assistant will need later: the user's goals, holdings, symbols and numbers discussed, orders "
+    "placed and open questions. Write plain prose, no preamble."
+)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English)."""
+    return len(text) // 4 + 1
+
+
+def cap_summary(summary: str) -> str:
+    """The summary cut to at most half of CHAT_HISTORY_TOKENS, so recent turns keep room."""
+    limit = settings.CHAT_HISTORY_TOKENS // 2 * 4  # characters
+    if len(summary) <= limit:
+        return summary
+    return summary[:limit].rsplit(' ', 1)[0] + ' ...'
+
+
+def window_start(messages: List[Dict[str, Any]], budget: int) -> int:
+    """Index of the oldest message in the longest recent run that fits in `budget` tokens."""
+    used = 0
+    start = len(messages)
+    while start > 0:
+        used += estimate_tokens(messages[start - 1].get('content') or '')
+        if used > budget:
+            break
+        start -= 1
+    return start
+
+
+def build_history(messages: List[Dict[str, Any]], summary: Optional[str] = None,
+                  summary_upto: int = 0) -> List[Dict[str, Any]]:
+    """
+    Gemini history for a conversation: the summary of older messages (if
+    any) followed by the recent messages that fit in CHAT_HISTORY_TOKENS.
+    The latest user turn and its reply are always included, even if they
+    alone exceed the budget.
+    """
+    budget = settings.CHAT_HISTORY_TOKENS
+    history = []
+    if summary:
+        summary = cap_summary(summary)
+        budget -= estimate_tokens(summary)
+        history.append({"role": "user", "parts": [f"Summary of our conversation so far: {summary}"]})
+        history.append({"role": "model", "parts": ["Understood. I'll keep that context in mind."]})
+    start = max(window_start(messages, budget), summary_upto if summary else 0)
+    # Open on a user turn: the preambles end with a model turn, and turns
+    # must alternate
+    while start < len(messages) and messages[start].get('role') != 'user':
+        start += 1
+    last_user = next((i for i in range(len(messages) - 1, -1, -1) if messages[i].get('role') == 'user'), None)
+    if last_user is not None:
+        start = min(start, last_user)
+    for msg in messages[start:]:
+        content = msg.get('content', '')
+        if content:
+            history.append({
+                "role": "user" if msg.get('role') == 'user' else "model",
+                "parts": [content]
+            })
+    return history
+
+
+def summarize(summary: Optional[str], messages: List[Dict[str, Any]]) -> str:
+    """Folds `messages` into `summary` with one model call."""
+    transcript = "\n".join(
+        f"{'User' if msg.get('role') == 'user' else 'AI'}: {msg.get('content', '')}" for msg in messages
+    )
+    prompt = (
+        f"Current summary:\n{summary or '(none)'}\n\n"
+        f"Next messages:\n{transcript}\n\n"
+        f"Updated summary (at most {settings.CHAT_SUMMARY_WORDS} words):"
+    )
+    response = gemini.get_model('summary', system_instruction=SUMMARY_INSTRUCTION).generate_content(prompt)
+    return response.text.strip()
+
+
+def update_summary(conversation_id) -> bool:
+    """
+    Folds messages that have left the history window into the conversation's
+    summary. Returns True if the summary changed. The write is guarded on
+    summary_upto, so a concurrent update is never overwritten with an older
+    one.
+    """
+    col = mongo.get_db()['conversations']
+    convo = col.find_one({'_id': ObjectId(conversation_id)}, {'messages': 1, 'summary': 1, 'summary_upto': 1})
+    if not convo:
+        return False
+    messages = convo.get('messages', [])
+    summary = convo.get('summary')
+    upto = convo.get('summary_upto', 0)
+    budget = settings.CHAT_HISTORY_TOKENS - (estimate_tokens(cap_summary(summary)) if summary else 0)
+    if window_start(messages, budget) <= upto:
+        return False  # everything not yet summarized still fits
+
+    new_upto = window_start(messages, budget // 2)
+    new_summary = summarize(summary, messages[upto:new_upto])
+    result = col.update_one(
+        {'_id': convo['_id'], 'summary_upto': convo.get('summary_upto', {'$exists': False})},
+        {'$set': {'summary': new_summary, 'summary_upto': new_upto}}
+    )
+    return result.modified_count == 1
+
+
+def _run_update(conversation_id):
+    with _lock:
+        _pending.discard(conversation_id)
+    try:
+        update_summary(conversation_id)
+    except Exception as e:
+        print(f"Failed to update conversation summary: {e}")
+
+
+def schedule_summary_update(conversation_id):
+    """
+    Queues update_summary on a background thread so the reply is not held
+    up; requests for a conversation already queued are coalesced.
+    """
+    global _executor
+    if not settings.GEMINI_API_KEY:
+        return
+    conversation_id = str(conversation_id)
+    with _lock:
+        if conversation_id in _pending:
+            return
+        _pending.add(conversation_id)
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.CHAT_SUMMARY_WORKERS, thread_name_prefix='chat-summary')
+        executor = _executor
+    executor.submit(_run_update, conversation_id)
@@ -1,10 +1,17 @@
 import datetime
+import functools
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
+from django.db import close_old_connections
 from .models import UserProfile
+from . import chat_history
+from . import gemini
 from . import kite_tools
 from . import market_tools
 from . import sim_tools
+from . import order_book
 from .guardrails.safety import SafetyFilter
 
 # Initialize safety filter globally
@@ -14,9 +21,10 @@ except Exception as e:
     print(f"Error initializing SafetyFilter: {e}")
     safety_filter = None
 
+@functools.lru_cache(maxsize=None)
 def get_gemini_tools():
     """
-    Define tools for Gemini Function Calling
+    Define tools for Gemini Function Calling (built once; the result is shared)
     """
     return [
         {
@@ -45,6 +53,31 @@ def get_gemini_tools():
                         "required": ["tradingsymbol", "exchange", "transaction_type", "quantity"]
                     }
                 },
+                {
+                    "name": "place_basket_order",
+                    "description": "Place several MARKET orders at once (e.g. to rebalance). Orders are sent together; each one reports its own status.",
+                    "parameters": {
+                        "type": "OBJECT",
+                        "properties": {
+                            "orders": {
+                                "type": "ARRAY",
+                                "description": "The orders to place.",
+                                "items": {
+                                    "type": "OBJECT",
+                                    "properties": {
+                                        "tradingsymbol": {"type": "STRING", "description": "The stock symbol (e.g., RELIANCE, TCS)."},
+                                        "exchange": {"type": "STRING", "description": "The exchange (NSE or BSE).", "enum": ["NSE", "BSE"]},
+                                        "transaction_type": {"type": "STRING", "description": "BUY or SELL.", "enum": ["BUY", "SELL"]},
+                                        "quantity": {"type": "INTEGER", "description": "Number of shares to trade."},
+                                        "product": {"type": "STRING", "description": "Product type (CNC for delivery, MIS for intraday).", "enum": ["CNC", "MIS", "NRML"]}
+                                    },
+                                    "required": ["tradingsymbol", "exchange", "transaction_type", "quantity"]
+                                }
+                            }
+                        },
+                        "required": ["orders"]
+                    }
+                },
                 {
                     "name": "get_stock_info",
                     "description": "Get live price and fundamentals for a specific stock.",
@@ -119,14 +152,340 @@ def get_gemini_tools():
         }
     ]
 
+SYSTEM_INSTRUCTION = "You are a personalized trading assistant. You have full permission to access the user's portfolio (holdings), place orders, and fetch market data on their behalf using the provided tools. Do not refuse these requests based on privacy; the user has authenticated and authorized this. Your goal is to help the user study market trends, understand financial concepts, and learn about trading algorithms. You have access to a local database of stock market data which you can query using the 'query_market_data' tool to find stocks based on sector, price, PE ratio, and market cap. Use this tool when the user asks to find, list, or screen for stocks (e.g., 'undervalued banks', 'large cap IT'). You can also provide technical analysis and news. Always state that your analysis is for educational purposes only and does not constitute financial advice. Explain your reasoning to help the user learn."
+
+
+def bio_preamble(user_bio):
+    """
+    History turns carrying the user's bio. Kept out of the system instruction
+    so every user shares the same cached model.
+    """
+    if not user_bio:
+        return []
+    return [
+        {"role": "user", "parts": [f"The user has provided the following bio: '{user_bio}'. Adapt your persona and responses accordingly."]},
+        {"role": "model", "parts": ["Understood. I will tailor my answers to your background."]},
+    ]
+
 import io
 from PIL import Image
 import pypdf
 
-def process_chat_message(user, user_text, previous_messages=None, mode='real', files=None):
+def execute_tool(user, tool_name, args, mode='real', trade_threshold=None):
+    """
+    Runs one function call from the model. Returns (result, events): the
+    result for the model and any [HOLDINGS]/[STOCKS] events for the client.
+    """
+    events = []
+    result = {}
+    # Execute tool
+    if mode == 'simulation':
+         if tool_name == 'place_order':
+            # Ensure quantity is int
+            if 'quantity' in args:
+                try:
+                    args['quantity'] = int(args['quantity'])
+                except: pass
+            # Uppercase enums
+            for key in ['transaction_type', 'exchange', 'order_type']:
+                if key in args and isinstance(args[key], str):
+                    args[key] = args[key].upper()
+
+            result = sim_tools.place_simulated_order(user.id, **args)
+
+         elif tool_name == 'place_basket_order':
+            # Legs arrive as proto maps
+            orders = [dict(order) for order in args.get('orders', [])]
+            result = sim_tools.place_simulated_basket(user.id, orders)
+
+         elif tool_name == 'get_orders':
+            result = order_book.list_orders(user.id, bool(args.get('pending_only')))
+
+         elif tool_name == 'cancel_order':
+            result = order_book.cancel_order(user.id, str(args.get('order_id', '')))
+
+         elif tool_name == 'get_holdings':
+            result = sim_tools.get_simulated_holdings(user.id)
+            if result.get('success'):
+                try:
+                    holdings_json = json.dumps(result.get('holdings', []), default=str)
+                    events.append(f"data: [HOLDINGS] {holdings_json}\n\n")
+                except Exception as e:
+                    print(f"Error serializing sim holdings: {e}")
+
+         elif tool_name == 'get_stock_info':
+            # Same as real
+            result = market_tools.get_stock_info(**args)
+            if result.get('success'):
+                try:
+                    payload = {"type": "single", "data": result}
+                    stocks_json = json.dumps(payload, default=str)
+                    events.append(f"data: [STOCKS] {stocks_json}\n\n")
+                except: pass
+
+         elif tool_name == 'get_market_movers':
+            # Same as real
+            result = market_tools.get_market_movers()
+            if result.get('success'):
+                try:
+                    payload = {"type": "movers", "data": result}
+                    stocks_json = json.dumps(payload, default=str)
+                    events.append(f"data: [STOCKS] {stocks_json}\n\n")
+                except: pass
+
+         elif tool_name == 'screen_stocks':
+            # Same as real
+            result = market_tools.screen_stocks(**args)
+            if result.get('success'):
+                try:
+                    payload = {"type": "list", "title": f"{args.get('strategy', 'Stock').capitalize()} Stocks", "data": result.get('stocks', [])}
+                    stocks_json = json.dumps(payload, default=str)
+                    events.append(f"data: [STOCKS] {stocks_json}\n\n")
+                except: pass
+
+         elif tool_name == 'get_stock_history':
+            result = market_tools.get_stock_history(**args)
+            if result.get('success'):
+                try:
+                    # Send chart data to frontend
+                    payload = {"type": "single", "data": {"symbol": result.get('symbol'), "history_1d": result.get('data')}}
+                    pass
+                except: pass
+
+         elif tool_name == 'get_company_news':
+            result = market_tools.get_company_news(**args)
+
+         elif tool_name == 'query_market_data':
+            result = market_tools.query_market_data(**args)
+            if result.get('success'):
+                try:
+                    payload = {
+                        "type": "list",
+                        "title": "Market Query Results",
+                        "data": result.get('stocks', [])
+                    }
+                    stocks_json = json.dumps(payload, default=str)
+                    events.append(f"data: [STOCKS] {stocks_json}\n\n")
+                except Exception as e:
+                    print(f"Error serializing query results: {e}")
+         else:
+            result = {"error": f"Unknown tool: {tool_name}"}
+
+    else:
+        # REAL MODE
+        if tool_name == 'place_order':
+            # Ensure quantity is an integer
+            if 'quantity' in args:
+                try:
+                    args['quantity'] = int(args['quantity'])
+                except (ValueError, TypeError):
+                    pass  # Let downstream handle it if it's really broken
+
+            # Ensure enums are uppercase
+            for key in ['transaction_type', 'exchange', 'product', 'order_type']:
+                if key in args and isinstance(args[key], str):
+                    args[key] = args[key].upper()
+
+            # Check Threshold
+            if trade_threshold is not None:
+                qty = args.get('quantity', 0)
+                price = args.get('price', 0) 
+
+                if not price:
+                    symbol = args.get('tradingsymbol')
+                    if symbol:
+                        try:
+                            info = market_tools.get_stock_info(symbol=symbol)
+                            if info.get('success'):
+                                price = info.get('current_price', 0)
+                        except:
+                            pass
+
+                estimated_value = qty * float(price) if price else 0
+
+                if price and estimated_value > trade_threshold:
+                    result = {"status": "error", "message": f"Order value ({estimated_value}) exceeds your configured threshold of {trade_threshold}."}
+                else:
+                    result = kite_tools.place_order(user, **args)
+            else:
+                result = kite_tools.place_order(user, **args)
+        elif tool_name == 'place_basket_order':
+            # Legs arrive as proto maps; baskets are market orders
+            orders = [{**dict(order), 'order_type': 'MARKET'} for order in args.get('orders', [])]
+            result = None
+            if trade_threshold is not None:
+                # Price every leg with one quote download
+                quotes = market_tools.get_quotes([str(o.get('tradingsymbol', '')).upper() for o in orders])
+                for order in orders:
+                    symbol = str(order.get('tradingsymbol', '')).upper()
+                    estimated_value = float(order.get('quantity') or 0) * quotes.get(symbol, 0)
+                    if estimated_value > trade_threshold:
+                        result = {"status": "error", "message": f"Order value for {symbol} ({estimated_value}) exceeds your configured threshold of {trade_threshold}."}
+                        break
+            if result is None:
+                result = kite_tools.place_orders(user, orders)
+        elif tool_name == 'get_holdings':
+            # A slightly old answer beats blocking the chat on the broker
+            result = kite_tools.get_holdings(user, allow_stale=True)
+            if result.get('success'):
+                try:
+                    holdings_json = json.dumps(result.get('holdings', []), default=str)
+                    events.append(f"data: [HOLDINGS] {holdings_json}\n\n")
+                except Exception as e:
+                    print(f"Error serializing holdings: {e}")
+        elif tool_name == 'get_stock_info':
+            result = market_tools.get_stock_info(**args)
+            if result.get('success'):
+                try:
+                    payload = {
+                        "type": "single",
+                        "data": result
+                    }
+                    stocks_json = json.dumps(payload, default=str)
+                    events.append(f"data: [STOCKS] {stocks_json}\n\n")
+                except Exception as e:
+                    print(f"Error serializing stock info: {e}")
+        elif tool_name == 'get_market_movers':
+            result = market_tools.get_market_movers()
+            if result.get('success'):
+                try:
+                    payload = {
+                        "type": "movers",
+                        "data": result
+                    }
+                    stocks_json = json.dumps(payload, default=str)
+                    events.append(f"data: [STOCKS] {stocks_json}\n\n")
+                except Exception as e:
+                    print(f"Error serializing movers: {e}")
+        elif tool_name == 'screen_stocks':
+            result = market_tools.screen_stocks(**args)
+            if result.get('success'):
+                try:
+                    payload = {
+                        "type": "list",
+                        "title": f"{args.get('strategy', 'Stock').capitalize()} Stocks",
+                        "data": result.get('stocks', [])
+                    }
+                    stocks_json = json.dumps(payload, default=str)
+                    events.append(f"data: [STOCKS] {stocks_json}\n\n")
+                except Exception as e:
+                    print(f"Error serializing screened stocks: {e}")
+        elif tool_name == 'query_market_data':
+            result = market_tools.query_market_data(**args)
+            if result.get('success'):
+                try:
+                    payload = {
+                        "type": "list",
+                        "title": "Market Query Results",
+                        "data": result.get('stocks', [])
+                    }
+                    stocks_json = json.dumps(payload, default=str)
+                    events.append(f"data: [STOCKS] {stocks_json}\n\n")
+                except Exception as e:
+                    print(f"Error serializing query results: {e}")
+        else:
+            result = {"error": f"Unknown tool: {tool_name}"}
+
+    return result, events
+
+
+def stream_parts(response):
+    """
+    (text, function call) for every part of a streamed model response, as
+    chunks arrive; one of the two is None. Function calls are (name, args).
+    """
+    for chunk in response:
+        if not chunk.candidates:
+            continue
+        for part in chunk.candidates[0].content.parts:
+            if part.function_call:
+                yield None, (part.function_call.name, {k: v for k, v in part.function_call.args.items()})
+            elif getattr(part, 'text', ''):
+                yield part.text, None
+
+
+# Events other than reply text: [DONE], [HOLDINGS] <json>, [STOCKS] <json>, [TITLE] <title>
+CONTROL_EVENTS = ('[DONE]', '[HOLDINGS]', '[STOCKS]', '[TITLE]')
+
+
+def sse_event(text):
+    """One Server-Sent Event; every line of the text gets its own data: field."""
+    return "".join(f"data: {line}\n" for line in text.split("\n")) + "\n"
+
+
+def event_data(event):
+    """The text carried by an event from sse_event (newlines included)."""
+    return "\n".join(line[6:] if line.startswith("data: ") else line[5:] for line in event.rstrip("\n").split("\n"))
+
+
+def is_text_event(data):
+    return not data.startswith(CONTROL_EVENTS)
+
+
+_tool_executor = None
+_tool_lock = threading.Lock()
+
+
+def _get_tool_executor():
+    global _tool_executor
+    with _tool_lock:
+        if _tool_executor is None:
+            _tool_executor = ThreadPoolExecutor(max_workers=settings.CHAT_TOOL_WORKERS, thread_name_prefix='chat-tools')
+        return _tool_executor
+
+
+def _execute_tool_safely(user, tool_name, args, mode, trade_threshold, in_worker=False):
+    if in_worker:
+        close_old_connections()
+    try:
+        return execute_tool(user, tool_name, args, mode, trade_threshold)
+    except Exception as e:
+        print(f"Error running tool {tool_name}: {e}")
+        return {"success": False, "message": f"Tool {tool_name} failed: {str(e)}"}, []
+    finally:
+        if in_worker:
+            close_old_connections()
+
+
+# Tools that only read market data and can run side by side. Everything else
+# (orders, cancels, holdings) touches the user's account and runs in order.
+READ_ONLY_TOOLS = frozenset({
+    'get_stock_info', 'get_stock_history', 'get_company_news',
+    'get_market_movers', 'screen_stocks', 'query_market_data',
+})
+
+
+def run_tool_calls(user, calls, mode='real', trade_threshold=None):
+    """
+    Runs a turn's function calls. Read-only market data calls run
+    concurrently, so comparing three stocks costs one round of tool latency
+    instead of three; account calls run one after another in the order the
+    model emitted them, so "sell X, then buy Y" and a holdings check after an
+    order see each other's effects. Returns (result, events) per call, in
+    order; a failing call reports its error without sinking the rest.
+    """
+    parallel = [i for i, (tool_name, _) in enumerate(calls) if tool_name in READ_ONLY_TOOLS]
+    futures = {}
+    if parallel and (len(parallel) > 1 or len(calls) > 1):
+        executor = _get_tool_executor()
+        futures = {
+            i: executor.submit(_execute_tool_safely, user, calls[i][0], calls[i][1], mode, trade_threshold, True)
+            for i in parallel
+        }
+    results = [None] * len(calls)
+    for i, (tool_name, args) in enumerate(calls):
+        if i not in futures:
+            results[i] = _execute_tool_safely(user, tool_name, args, mode, trade_threshold)
+    for i, future in futures.items():
+        results[i] = future.result()
+    return results
+
+def process_chat_message(user, user_text, previous_messages=None, mode='real', files=None, summary=None, summary_upto=0):
     """
     Process a chat message using Gemini, executing tools if needed.
     Returns a generator that yields chunks of the response (or events).
+    summary/summary_upto: the conversation's rolling summary of its first
+    summary_upto messages (see chat_history).
     """
     if previous_messages is None:
         previous_messages = []
@@ -138,43 +497,27 @@ def process_chat_message(user, user_text, previous_messages=None, mode='real', f
     user_bio = profile.bio if profile else ""
     trade_threshold = profile.trade_threshold if profile else None
 
-    system_instruction = "You are a personalized trading assistant. You have full permission to access the user's portfolio (holdings), place orders, and fetch market data on their behalf using the provided tools. Do not refuse these requests based on privacy; the user has authenticated and authorized this. Your goal is to help the user study market trends, understand financial concepts, and learn about trading algorithms. You have access to a local database of stock market data which you can query using the 'query_market_data' tool to find stocks based on sector, price, PE ratio, and market cap. Use this tool when the user asks to find, list, or screen for stocks (e.g., 'undervalued banks', 'large cap IT'). You can also provide technical analysis and news. Always state that your analysis is for educational purposes only and does not constitute financial advice. Explain your reasoning to help the user learn."
-    if user_bio:
-        system_instruction += f" The user has provided the following bio: '{user_bio}'. Adapt your persona and responses accordingly."
-    
     # 1. Safety Check (Guardrails)
     if safety_filter:
         # Note: Safety filter currently only checks text.
         is_safe, safety_msg, risk_data = safety_filter.filter_query(user_text)
         if not is_safe:
-            yield f"data: {safety_msg}\n\n"
+            yield sse_event(safety_msg)
             yield "data: [DONE]\n\n"
             return
 
     if settings.GEMINI_API_KEY:
         try:
-            import google.generativeai as genai  # type: ignore
-            genai.configure(api_key=settings.GEMINI_API_KEY)
-            
-            # Initialize model with tools
+            # Shared model with tools for this mode
             if mode == 'simulation':
-                tools = sim_tools.get_simulated_tools()
+                model = gemini.get_model('simulation', sim_tools.get_simulated_tools(), SYSTEM_INSTRUCTION)
             else:
-                tools = get_gemini_tools()
-                
-            model = genai.GenerativeModel("gemini-2.5-flash", tools=tools, system_instruction=system_instruction)
-            
-            # Build history
-            history = []
-            for msg in previous_messages:
-                role = "user" if msg.get('role') == 'user' else "model"
-                content = msg.get('content', '')
-                if content:
-                    history.append({
-                        "role": role,
-                        "parts": [content]
-                    })
-            
+                model = gemini.get_model('real', get_gemini_tools(), SYSTEM_INSTRUCTION)
+
+            # Build history: recent messages within the token budget, older
+            # ones through the conversation's rolling summary
+            history = bio_preamble(user_bio) + chat_history.build_history(previous_messages, summary, summary_upto)
+
             chat = model.start_chat(history=history) if history else model.start_chat()
             
             # Prepare message parts
@@ -216,218 +559,38 @@ def process_chat_message(user, user_text, previous_messages=None, mode='real', f
             if not message_parts:
                 message_parts.append(" ") # Empty message if only files failed
 
-            # Send message and handle function calls
-            response = chat.send_message(message_parts)
-            
-            # Check for function call
-            part = response.candidates[0].content.parts[0]
-            
-            if part.function_call:
-                fc = part.function_call
-                tool_name = fc.name
-                args = {k: v for k, v in fc.args.items()}
-                
-                result = {}
-                # Execute tool
-                if mode == 'simulation':
-                     if tool_name == 'place_order':
-                        # Ensure quantity is int
-                        if 'quantity' in args:
-                            try:
-                                args['quantity'] = int(args['quantity'])
-                            except: pass
-                        # Uppercase enums
-                        for key in ['transaction_type', 'exchange', 'order_type']:
-                            if key in args and isinstance(args[key], str):
-                                args[key] = args[key].upper()
-                                
-                        result = sim_tools.place_simulated_order(user.id, **args)
-                        
-                     elif tool_name == 'get_holdings':
-                        result = sim_tools.get_simulated_holdings(user.id)
-                        if result.get('success'):
-                            try:
-                                holdings_json = json.dumps(result.get('holdings', []), default=str)
-                                yield f"data: [HOLDINGS] {holdings_json}\n\n"
-                            except Exception as e:
-                                print(f"Error serializing sim holdings: {e}")
-                                
-                     elif tool_name == 'get_stock_info':
-                        # Same as real
-                        result = market_tools.get_stock_info(**args)
-                        if result.get('success'):
-                            try:
-                                payload = {"type": "single", "data": result}
-                                stocks_json = json.dumps(payload, default=str)
-                                yield f"data: [STOCKS] {stocks_json}\n\n"
-                            except: pass
-                            
-                     elif tool_name == 'get_market_movers':
-                        # Same as real
-                        result = market_tools.get_market_movers()
-                        if result.get('success'):
-                            try:
-                                payload = {"type": "movers", "data": result}
-                                stocks_json = json.dumps(payload, default=str)
-                                yield f"data: [STOCKS] {stocks_json}\n\n"
-                            except: pass
-                            
-                     elif tool_name == 'screen_stocks':
-                        # Same as real
-                        result = market_tools.screen_stocks(**args)
-                        if result.get('success'):
-                            try:
-                                payload = {"type": "list", "title": f"{args.get('strategy', 'Stock').capitalize()} Stocks", "data": result.get('stocks', [])}
-                                stocks_json = json.dumps(payload, default=str)
-                                yield f"data: [STOCKS] {stocks_json}\n\n"
-                            except: pass
-                            
-                     elif tool_name == 'get_stock_history':
-                        result = market_tools.get_stock_history(**args)
-                        if result.get('success'):
-                            try:
-                                # Send chart data to frontend
-                                payload = {"type": "single", "data": {"symbol": result.get('symbol'), "history_1d": result.get('data')}}
-                                pass
-                            except: pass
-                            
-                     elif tool_name == 'get_company_news':
-                        result = market_tools.get_company_news(**args)
-                        
-                     elif tool_name == 'query_market_data':
-                        result = market_tools.query_market_data(**args)
-                        if result.get('success'):
-                            try:
-                                payload = {
-                                    "type": "list",
-                                    "title": "Market Query Results",
-                                    "data": result.get('stocks', [])
-                                }
-                                stocks_json = json.dumps(payload, default=str)
-                                yield f"data: [STOCKS] {stocks_json}\n\n"
-                            except Exception as e:
-                                print(f"Error serializing query results: {e}")
-                     else:
-                        result = {"error": f"Unknown tool: {tool_name}"}
-
-                else:
-                    # REAL MODE
-                    if tool_name == 'place_order':
-                        # Ensure quantity is an integer
-                        if 'quantity' in args:
-                            try:
-                                args['quantity'] = int(args['quantity'])
-                            except (ValueError, TypeError):
-                                pass  # Let downstream handle it if it's really broken
-
-                        # Ensure enums are uppercase
-                        for key in ['transaction_type', 'exchange', 'product', 'order_type']:
-                            if key in args and isinstance(args[key], str):
-                                args[key] = args[key].upper()
-
-                        # Check Threshold
-                        if trade_threshold is not None:
-                            qty = args.get('quantity', 0)
-                            price = args.get('price', 0) 
-                            
-                            if not price:
-                                symbol = args.get('tradingsymbol')
-                                if symbol:
-                                    try:
-                                        info = market_tools.get_stock_info(symbol=symbol)
-                                        if info.get('success'):
-                                            price = info.get('current_price', 0)
-                                    except:
-                                        pass
-                            
-                            estimated_value = qty * float(price) if price else 0
-                            
-                            if price and estimated_value > trade_threshold:
-                                result = {"status": "error", "message": f"Order value ({estimated_value}) exceeds your configured threshold of {trade_threshold}."}
-                            else:
-                                result = kite_tools.place_order(user, **args)
-                        else:
-                            result = kite_tools.place_order(user, **args)
-                    elif tool_name == 'get_holdings':
-                        result = kite_tools.get_holdings(user)
-                        if result.get('success'):
-                            try:
-                                holdings_json = json.dumps(result.get('holdings', []), default=str)
-                                yield f"data: [HOLDINGS] {holdings_json}\n\n"
-                            except Exception as e:
-                                print(f"Error serializing holdings: {e}")
-                    elif tool_name == 'get_stock_info':
-                        result = market_tools.get_stock_info(**args)
-                        if result.get('success'):
-                            try:
-                                payload = {
-                                    "type": "single",
-                                    "data": result
-                                }
-                                stocks_json = json.dumps(payload, default=str)
-                                yield f"data: [STOCKS] {stocks_json}\n\n"
-                            except Exception as e:
-                                print(f"Error serializing stock info: {e}")
-                    elif tool_name == 'get_market_movers':
-                        result = market_tools.get_market_movers()
-                        if result.get('success'):
-                            try:
-                                payload = {
-                                    "type": "movers",
-                                    "data": result
-                                }
-                                stocks_json = json.dumps(payload, default=str)
-                                yield f"data: [STOCKS] {stocks_json}\n\n"
-                            except Exception as e:
-                                print(f"Error serializing movers: {e}")
-                    elif tool_name == 'screen_stocks':
-                        result = market_tools.screen_stocks(**args)
-                        if result.get('success'):
-                            try:
-                                payload = {
-                                    "type": "list",
-                                    "title": f"{args.get('strategy', 'Stock').capitalize()} Stocks",
-                                    "data": result.get('stocks', [])
-                                }
-                                stocks_json = json.dumps(payload, default=str)
-                                yield f"data: [STOCKS] {stocks_json}\n\n"
-                            except Exception as e:
-                                print(f"Error serializing screened stocks: {e}")
-                    elif tool_name == 'query_market_data':
-                        result = market_tools.query_market_data(**args)
-                        if result.get('success'):
-                            try:
-                                payload = {
-                                    "type": "list",
-                                    "title": "Market Query Results",
-                                    "data": result.get('stocks', [])
-                                }
-                                stocks_json = json.dumps(payload, default=str)
-                                yield f"data: [STOCKS] {stocks_json}\n\n"
-                            except Exception as e:
-                                print(f"Error serializing query results: {e}")
+            # Stream the reply, running the model's function calls (all of a
+            # turn's calls at once) until it answers in text, for at most
+            # CHAT_MAX_TOOL_ROUNDS turns
+            response = chat.send_message(message_parts, stream=True)
+            rounds = 0
+            while True:
+                calls = []
+                for text, call in stream_parts(response):
+                    if call:
+                        calls.append(call)
                     else:
-                        result = {"error": f"Unknown tool: {tool_name}"}
-                    
-                # Send result back to model
-                function_response = {
-                    "function_response": {
-                        "name": tool_name,
-                        "response": result
-                    }
-                }
-                
-                final_response = chat.send_message(
-                    [function_response]
-                )
-                
-                assistant_text = final_response.text
-                yield f"data: {assistant_text}\n\n"
-                
-            else:
-                # No function call, just text
-                assistant_text = response.text
-                yield f"data: {assistant_text}\n\n"
+                        yield sse_event(text)
+                if not calls:
+                    break
+                if rounds == settings.CHAT_MAX_TOOL_ROUNDS:
+                    yield sse_event("Sorry, that needed more steps than I'm allowed to take in one reply. Please break it into smaller questions.")
+                    break
+                rounds += 1
+
+                function_responses = []
+                for (tool_name, _args), (result, events) in zip(calls, run_tool_calls(user, calls, mode, trade_threshold)):
+                    for event in events:
+                        yield event
+                    function_responses.append({
+                        "function_response": {
+                            "name": tool_name,
+                            "response": result
+                        }
+                    })
+
+                # Send all results back to model together
+                response = chat.send_message(function_responses, stream=True)
 
             yield "data: [DONE]\n\n"
             
@@ -436,12 +599,12 @@ def process_chat_message(user, user_text, previous_messages=None, mode='real', f
             print(f"DEBUG: Exception in stream: {e}")
             print(traceback.format_exc())
             err_text = f"AI error: {str(e)}"
-            yield f"data: {err_text}\n\n"
+            yield sse_event(err_text)
             yield "data: [DONE]\n\n"
     else:
         # Fallback if no key
         text = "Gemini API key not configured."
-        yield f"data: {text}\n\n"
+        yield sse_event(text)
         yield "data: [DONE]\n\n"
 
 
@@ -453,9 +616,7 @@ def generate_conversation_title(messages):
         return None
 
     try:
-        import google.generativeai as genai
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        model = genai.GenerativeModel("gemini-2.5-flash")
+        model = gemini.get_model()
 
         # Construct a simple prompt
         conversation_text = ""
@@ -0,0 +1,140 @@
+"""
+Cross-sectional factor backtests on a (dates x symbols) close price matrix.
+
+Every `rebalance` bars the universe is ranked by a factor score and the
+portfolio is reset to equal weights in the top N names (long) and, optionally,
+the bottom N names (short). All ranking, turnover and return calculations are
+matrix operations, so the cost grows with the matrix size rather than with a
+Python loop per symbol.
+"""
+import numpy as np
+
+INITIAL_CAPITAL = 100000
+TRADING_DAYS = 252
+
+
+def momentum_scores(prices, rows, lookback, skip=0):
+    """
+    Trailing return from `lookback` bars ago up to `skip` bars ago, for each
+    row in `rows`. Higher is more attractive.
+    """
+    return prices[rows - skip] / prices[rows - lookback] - 1
+
+
+def mean_reversion_scores(prices, rows, lookback, skip=0):
+    """Negative trailing return: the biggest recent losers rank first."""
+    return -momentum_scores(prices, rows, lookback, skip)
+
+
+FACTORS = {
+    'momentum': momentum_scores,
+    'mean_reversion': mean_reversion_scores,
+}
+
+
+def select_weights(scores, top_n, bottom_n=0):
+    """
+    Equal weights per rebalance row: +1/top_n for the highest scores and
+    -1/bottom_n for the lowest. Names without a score (NaN) are never picked;
+    rows without enough scored names stay in cash.
+    """
+    rows, n = scores.shape
+    weights = np.zeros((rows, n))
+    valid = ~np.isnan(scores)
+    counts = valid.sum(axis=1)
+    # NaN sorts last, so each row's scored names occupy order[:, :count]
+    order = np.argsort(np.where(valid, scores, np.inf), axis=1, kind='stable')
+    ok = counts >= top_n + bottom_n
+    row_ids = np.flatnonzero(ok)[:, None]
+
+    if top_n:
+        top = np.take_along_axis(order[ok], counts[ok, None] - 1 - np.arange(top_n), axis=1)
+        weights[row_ids, top] = 1.0 / top_n
+    if bottom_n:
+        weights[row_ids, order[ok, :bottom_n]] = -1.0 / bottom_n
+    return weights
+
+
+def run_factor_strategy(prices, factor, lookback, skip=0, top_n=10, bottom_n=0, rebalance=21, cost_bps=0.0):
+    """
+    prices: DataFrame of closes, dates x symbols. Gaps are forward filled;
+            names that have not listed yet (leading NaN) cannot be picked.
+    Returns equity curve, rebalances (holdings and turnover) and metrics.
+    """
+    if factor not in FACTORS:
+        raise ValueError('Unknown strategy')
+    if prices.empty:
+        raise ValueError("Data is empty")
+    if not 0 <= skip < lookback:
+        raise ValueError('skip must be smaller than lookback')
+    if top_n < 0 or bottom_n < 0 or top_n + bottom_n == 0:
+        raise ValueError('top_n/bottom_n must select at least one name')
+    if top_n + bottom_n > prices.shape[1]:
+        raise ValueError('Universe is smaller than top_n + bottom_n')
+    if rebalance < 1:
+        raise ValueError('rebalance must be at least 1 bar')
+
+    prices = prices.ffill()
+    close = prices.to_numpy(dtype=np.float64)
+    symbols = np.asarray(prices.columns)
+    n_dates = len(close)
+    if n_dates <= lookback:
+        raise ValueError('Not enough history for the lookback')
+
+    # Rank at the close of each rebalance bar, hold until the next one
+    reb = np.arange(lookback, n_dates, rebalance)
+    weights = select_weights(FACTORS[factor](close, reb, lookback, skip), top_n, bottom_n)
+    turnover = 0.5 * np.abs(np.diff(weights, axis=0, prepend=0)).sum(axis=1)
+
+    # Value of each holding period relative to its start: 1 + sum(w * (P_t / P_reb - 1))
+    period = np.searchsorted(reb, np.arange(n_dates), side='left') - 1
+    held = period >= 0
+    start = reb[period[held]]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        pnl = weights[period[held]] * (close[held] / close[start] - 1)
+    growth = np.ones(n_dates)
+    growth[held] += np.nansum(pnl, axis=1)
+    del pnl
+
+    # Chain the periods: value at each rebalance after paying for its turnover
+    costs = 1 - turnover * cost_bps / 10000
+    chained = np.cumprod(costs * np.append(1.0, growth[reb[1:]]))
+    equity = np.full(n_dates, 1.0)
+    equity[held] = chained[period[held]] * growth[held]
+    equity *= INITIAL_CAPITAL
+
+    daily = np.diff(equity) / equity[:-1]
+    years = max(n_dates - 1, 1) / TRADING_DAYS
+    final_equity = float(equity[-1])
+    total_return = (final_equity / INITIAL_CAPITAL - 1) * 100
+    volatility = daily.std() * np.sqrt(TRADING_DAYS) if len(daily) > 1 else 0.0
+    sharpe = daily.mean() / daily.std() * np.sqrt(TRADING_DAYS) if len(daily) > 1 and daily.std() > 0 else 0.0
+    drawdown = equity / np.maximum.accumulate(equity) - 1
+
+    dates = prices.index.strftime('%Y-%m-%d')
+    rebalances = [
+        {
+            'date': dates[row],
+            'long': symbols[w > 0].tolist(),
+            'short': symbols[w < 0].tolist(),
+            'turnover': round(float(t), 4),
+        }
+        for row, w, t in zip(reb, weights, turnover)
+    ]
+
+    return {
+        'equity_curve': [
+            {'date': date, 'equity': value}
+            for date, value in zip(dates, equity.tolist())
+        ],
+        'rebalances': rebalances,
+        'metrics': {
+            'total_return': round(total_return, 2),
+            'annualized_return': round(((final_equity / INITIAL_CAPITAL) ** (1 / years) - 1) * 100, 2),
+            'volatility': round(float(volatility) * 100, 2),
+            'sharpe': round(float(sharpe), 2),
+            'max_drawdown': round(float(drawdown.min()) * 100, 2),
+            'average_turnover': round(float(turnover.mean()), 4),
+            'rebalance_count': len(reb),
+        }
+    }
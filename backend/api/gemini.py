@@ -0,0 +1,59 @@
+"""
+Process-wide Gemini models.
+
+Building a GenerativeModel converts the tool declarations to protos and
+genai.configure sets up the client, so both happen once per worker instead
+of on every request. Models are keyed by name (which tool set they carry)
+and system instruction; per-request context such as the user's bio or a
+backtest's results goes into the chat history, so a handful of models serve
+every user.
+"""
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+from django.conf import settings
+
+MODEL_NAME = "gemini-2.5-flash"
+
+_models: Dict[Tuple[str, Optional[str], str], Any] = {}
+_configured_key: Optional[str] = None
+_lock = threading.Lock()
+
+
+def _configure(genai):
+    global _configured_key
+    if _configured_key != settings.GEMINI_API_KEY:
+        genai.configure(api_key=settings.GEMINI_API_KEY)
+        _configured_key = settings.GEMINI_API_KEY
+
+
+def get_model(name: str = 'plain', tools: Optional[List[Dict[str, Any]]] = None,
+              system_instruction: Optional[str] = None):
+    """
+    The shared model for (name, system_instruction), built on first use.
+    `tools` is only read when the model is built, so callers should pass the
+    same declarations for the same name.
+    """
+    key = (name, system_instruction, settings.GEMINI_API_KEY)
+    model = _models.get(key)
+    if model is not None:
+        return model
+    import google.generativeai as genai  # type: ignore
+    with _lock:
+        model = _models.get(key)
+        if model is None:
+            _configure(genai)
+            kwargs = {}
+            if tools:
+                kwargs['tools'] = tools
+            if system_instruction:
+                kwargs['system_instruction'] = system_instruction
+            model = _models[key] = genai.GenerativeModel(MODEL_NAME, **kwargs)
+        return model
+
+
+def reset():
+    """Drops the cached models (e.g. after changing GEMINI_API_KEY in tests)."""
+    global _configured_key
+    with _lock:
+        _models.clear()
+        _configured_key = None
@@ -0,0 +1,120 @@
+"""
+Local instrument master built from Kite's daily instruments dump.
+
+The dump is reduced to one numpy structured array sorted by "EXCHANGE:SYMBOL"
+and saved as a .npy file. Processes open it with np.load(mmap_mode='r'), so
+the index lives in the page cache once and is shared between workers; a
+lookup is a binary search (searchsorted) that touches O(log n) rows.
+"""
+import os
+import threading
+from typing import Dict, Any, Optional, Tuple
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+INDEX_DTYPE = np.dtype([
+    ('key', 'S48'),  # b"NSE:RELIANCE"
+    ('instrument_token', '<i8'),
+    ('lot_size', '<i4'),
+    ('tick_size', '<f8'),
+])
+
+_index: Optional[Tuple[Tuple[str, float], np.ndarray]] = None
+_lock = threading.Lock()
+
+
+def instrument_key(tradingsymbol: str, exchange: str) -> bytes:
+    return f"{exchange.upper()}:{tradingsymbol.upper()}".encode('ascii', 'replace')
+
+
+def build_index(dump: pd.DataFrame, path: Optional[str] = None) -> int:
+    """
+    Writes the index for an instruments dump (columns tradingsymbol,
+    exchange, instrument_token, lot_size, tick_size) and returns the number of
+    instruments. The file is replaced atomically, so processes that have the
+    old one mapped keep reading it until they reload.
+    """
+    path = path or settings.INSTRUMENTS_FILE
+    keys = (dump['exchange'].astype(str).str.upper() + ':' + dump['tradingsymbol'].astype(str).str.upper())
+    index = np.empty(len(dump), dtype=INDEX_DTYPE)
+    index['key'] = keys.str.encode('ascii', 'replace').to_numpy()
+    index['instrument_token'] = dump['instrument_token'].to_numpy(dtype=np.int64)
+    # Some dump rows (indices, some BSE listings) have lot_size 0: any quantity goes
+    index['lot_size'] = np.maximum(dump['lot_size'].fillna(1).to_numpy(dtype=np.int32), 1)
+    index['tick_size'] = dump['tick_size'].fillna(0.05).to_numpy(dtype=np.float64)
+    index.sort(order='key', kind='stable')
+    # A symbol listed twice (e.g. an expired and a new contract) keeps its last row
+    last = np.append(index['key'][1:] != index['key'][:-1], True) if len(index) else np.ones(0, dtype=bool)
+    index = index[last]
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f"{path}.tmp.npy"
+    np.save(tmp, index)
+    os.replace(tmp, path)
+    return len(index)
+
+
+def load_dump(source: Optional[str] = None) -> pd.DataFrame:
+    """Reads the instruments CSV from a path or URL (default INSTRUMENTS_URL)."""
+    return pd.read_csv(source or settings.INSTRUMENTS_URL,
+                       usecols=['instrument_token', 'tradingsymbol', 'tick_size', 'lot_size', 'exchange'])
+
+
+def get_index() -> Optional[np.ndarray]:
+    """
+    The memory-mapped index, reopened when the file changes on disk. None
+    when no instruments have been loaded yet.
+    """
+    global _index
+    path = settings.INSTRUMENTS_FILE
+    try:
+        version = (path, os.stat(path).st_mtime)
+    except FileNotFoundError:
+        return None
+    cached = _index
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    with _lock:
+        if _index is None or _index[0] != version:
+            _index = (version, np.load(path, mmap_mode='r'))
+        return _index[1]
+
+
+def lookup(tradingsymbol: str, exchange: str = 'NSE') -> Optional[Dict[str, Any]]:
+    """
+    Instrument details for a symbol, or None if it is not listed (or no
+    index has been loaded; check get_index() to tell the two apart).
+    """
+    index = get_index()
+    if index is None or not len(index):
+        return None
+    key = instrument_key(tradingsymbol, exchange)
+    keys = index['key']
+    i = int(np.searchsorted(keys, key))
+    if i == len(keys) or keys[i] != key:
+        return None
+    row = index[i]
+    return {
+        'tradingsymbol': tradingsymbol.upper(),
+        'exchange': exchange.upper(),
+        'instrument_token': int(row['instrument_token']),
+        'lot_size': int(row['lot_size']),
+        'tick_size': float(row['tick_size']),
+    }
+
+
+def validate_order(tradingsymbol: str, exchange: str, quantity: int) -> Optional[str]:
+    """
+    Reason an order cannot be valid, or None. Without a loaded index every
+    order passes, so deployments that never loaded instruments keep working.
+    """
+    if get_index() is None:
+        return None
+    instrument = lookup(tradingsymbol, exchange)
+    if instrument is None:
+        return f"Unknown instrument {exchange.upper()}:{tradingsymbol.upper()}"
+    # Indexes built before lot sizes were clamped may still hold 0
+    if instrument['lot_size'] > 1 and quantity % instrument['lot_size']:
+        return f"Quantity must be a multiple of the lot size ({instrument['lot_size']}) for {tradingsymbol.upper()}"
+    return None
@@ -0,0 +1,309 @@
+"""
+Background job queue for long-running backtests, with progress events for SSE
+"""
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, List, Optional
+from django.conf import settings
+from . import backtest_service
+
+
+class JobLimitError(Exception):
+    """Raised when a submission would exceed the queue or per-user limits."""
+
+
+class JobCancelled(Exception):
+    """Raised inside a job handler once cancellation has been requested."""
+
+
+class Job:
+    def __init__(self, owner, kind: str, payload: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.kind = kind
+        self.payload = payload
+        self.status = 'queued'  # queued, running, done, failed, cancelled
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.events: List[Dict[str, Any]] = []
+        self.closed = False  # set once the terminal event has been emitted
+        self._cancel = threading.Event()
+        self._cond = threading.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('done', 'failed', 'cancelled')
+
+    def emit(self, event: str, data: Dict[str, Any]):
+        with self._cond:
+            self.events.append({'id': len(self.events) + 1, 'event': event, 'data': data})
+            self._cond.notify_all()
+
+    def finish(self, status: str):
+        with self._cond:
+            self.status = status
+            self.finished_at = time.time()
+            self.events.append({'id': len(self.events) + 1, 'event': status, 'data': self.to_dict()})
+            self.closed = True
+            self._cond.notify_all()
+
+    def report(self, progress: float, message: str = '', partial: Any = None):
+        """
+        Called by job handlers to publish progress (0-1) and optional partial
+        results. Raises JobCancelled if the job has been cancelled meanwhile.
+        """
+        if self._cancel.is_set():
+            raise JobCancelled()
+        self.progress = max(0.0, min(float(progress), 1.0))
+        data = {'progress': round(self.progress, 4), 'message': message}
+        if partial is not None:
+            data['partial'] = partial
+        self.emit('progress', data)
+
+    def cancel(self):
+        self._cancel.set()
+
+    def wait_for_events(self, after: int, timeout: float) -> List[Dict[str, Any]]:
+        """Returns events with id > after, blocking up to timeout for new ones."""
+        with self._cond:
+            if len(self.events) <= after and not self.closed:
+                self._cond.wait(timeout)
+            return self.events[after:]
+
+    def to_dict(self, include_result=True) -> Dict[str, Any]:
+        data = {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': round(self.progress, 4),
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+        }
+        if self.error:
+            data['error'] = self.error
+        if include_result and self.status == 'done':
+            data['result'] = self.result
+        return data
+
+
+def run_backtest_job(job: Job, payload: Dict[str, Any]):
+    job.report(0.0, 'Fetching data')
+    results = backtest_service.run_backtest(
+        payload.get('symbol', 'RELIANCE'),
+        payload.get('strategy', 'sma'),
+        payload.get('parameters', {}),
+        payload.get('period', '1y'),
+    )
+    if results is None:
+        raise ValueError('No data found')
+    return results
+
+
+def run_sweep_job(job: Job, payload: Dict[str, Any]):
+    """
+    Runs a strategy over the cartesian product of a parameter grid, e.g.
+    {"short_window": [10, 20], "long_window": [50, 100]}.
+    Each finished combination is streamed as a partial result.
+    """
+    grid = payload.get('grid') or {}
+    names = sorted(grid)
+    combos = list(itertools.product(*(grid[name] for name in names)))
+    if not combos:
+        raise ValueError('grid is empty')
+    if len(combos) > settings.BACKTEST_SWEEP_MAX_COMBINATIONS:
+        raise ValueError(f"grid has {len(combos)} combinations, limit is {settings.BACKTEST_SWEEP_MAX_COMBINATIONS}")
+
+    rows = []
+    for i, values in enumerate(combos, 1):
+        params = dict(payload.get('parameters') or {}, **dict(zip(names, values)))
+        results = backtest_service.run_backtest(
+            payload.get('symbol', 'RELIANCE'),
+            payload.get('strategy', 'sma'),
+            params,
+            payload.get('period', '1y'),
+        )
+        if results is None:
+            raise ValueError('No data found')
+        row = {'parameters': params, 'metrics': results['metrics']}
+        rows.append(row)
+        job.report(i / len(combos), f"Ran {i}/{len(combos)} combinations", partial=row)
+
+    rows.sort(key=lambda r: r['metrics']['total_return'], reverse=True)
+    return {'runs': rows, 'best': rows[0]}
+
+
+def run_intraday_job(job: Job, payload: Dict[str, Any]):
+    """
+    Chunked backtest over stored minute bars. Progress is estimated from the
+    file size, as the row count is not known until the last block is read.
+    """
+    symbol = payload.get('symbol', 'RELIANCE')
+    try:
+        path = backtest_service.bars_path(backtest_service.to_ticker_symbol(symbol.upper()), '1m')
+        with open(path, 'rb') as f:
+            f.readline()
+            sample = f.readlines(1 << 16)
+        bytes_per_row = max(sum(map(len, sample)) / max(len(sample), 1), 1)
+        estimated_rows = os.path.getsize(path) / bytes_per_row
+    except OSError:
+        estimated_rows = 0
+
+    def on_chunk(rows):
+        progress = min(rows / estimated_rows, 0.99) if estimated_rows else 0.0
+        job.report(progress, f"Processed {rows} bars")
+
+    job.report(0.0, 'Reading bars')
+    results = backtest_service.run_intraday_backtest(
+        symbol,
+        payload.get('strategy', 'sma'),
+        payload.get('parameters', {}),
+        curve_every=payload.get('curve_every', 1),
+        on_chunk=on_chunk,
+    )
+    if results is None:
+        raise ValueError('No data found')
+    return results
+
+
+def run_factor_job(job: Job, payload: Dict[str, Any]):
+    job.report(0.0, 'Fetching universe')
+    results = backtest_service.run_factor_backtest(
+        payload.get('strategy', 'momentum'),
+        payload.get('parameters', {}),
+        payload.get('period', '2y'),
+        payload.get('symbols'),
+    )
+    if results is None:
+        raise ValueError('No data found')
+    return results
+
+
+# kind -> handler(job, payload) returning the final result
+JOB_KINDS: Dict[str, Callable[[Job, Dict[str, Any]], Any]] = {
+    'backtest': run_backtest_job,
+    'sweep': run_sweep_job,
+    'intraday': run_intraday_job,
+    'factor': run_factor_job,
+}
+
+_executor: Optional[ThreadPoolExecutor] = None
+_jobs: Dict[str, Job] = {}
+_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.BACKTEST_JOB_WORKERS,
+            thread_name_prefix='backtest-job',
+        )
+    return _executor
+
+
+def _purge_finished():
+    cutoff = time.time() - settings.BACKTEST_JOB_RETENTION
+    for job_id in [j.id for j in _jobs.values() if j.finished and j.finished_at < cutoff]:
+        del _jobs[job_id]
+
+
+def _execute(job: Job):
+    handler = JOB_KINDS[job.kind]
+    if job._cancel.is_set():
+        job.finish('cancelled')
+        return
+    job.status = 'running'
+    job.emit('status', {'status': job.status})
+    try:
+        job.result = handler(job, job.payload)
+        job.progress = 1.0
+        job.finish('done')
+    except JobCancelled:
+        job.finish('cancelled')
+    except Exception as e:
+        job.error = str(e)
+        job.finish('failed')
+
+
+def validate_payload(kind: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Checks the fields a job would only trip over once running and returns the
+    payload with them coerced. Raises ValueError for bad values.
+    """
+    if kind == 'intraday':
+        try:
+            curve_every = int(payload.get('curve_every', 1))
+        except (TypeError, ValueError):
+            raise ValueError('curve_every must be an integer')
+        if curve_every < 1:
+            raise ValueError('curve_every must be at least 1')
+        payload = {**payload, 'curve_every': curve_every}
+    elif kind == 'factor':
+        backtest_service.normalize_symbols(payload.get('symbols'))
+    return payload
+
+
+def submit(owner, kind: str, payload: Dict[str, Any]) -> Job:
+    """
+    Queues a job for the owner (user id, or a client key for anonymous users).
+    Raises ValueError for unknown kinds or invalid payloads and JobLimitError
+    when the queue or the owner's concurrency limit is exhausted.
+    """
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    payload = validate_payload(kind, payload)
+
+    with _lock:
+        _purge_finished()
+        active = [j for j in _jobs.values() if not j.finished]
+        if len(active) >= settings.BACKTEST_JOB_QUEUE_SIZE:
+            raise JobLimitError('Backtest queue is full, try again shortly')
+        if sum(1 for j in active if j.owner == owner) >= settings.BACKTEST_JOBS_PER_USER:
+            raise JobLimitError(f"At most {settings.BACKTEST_JOBS_PER_USER} backtests can run at once")
+        job = Job(owner, kind, payload)
+        _jobs[job.id] = job
+        executor = _get_executor()
+
+    job.emit('status', {'status': job.status})
+    executor.submit(_execute, job)
+    return job
+
+
+def get_job(job_id: str, owner) -> Optional[Job]:
+    job = _jobs.get(job_id)
+    if job is None or job.owner != owner:
+        return None
+    return job
+
+
+def _json_default(obj):
+    # Equity curves and numpy values serialize through tolist()
+    return obj.tolist() if hasattr(obj, 'tolist') else str(obj)
+
+
+def stream_events(job: Job, last_event_id: int = 0):
+    """
+    Generator of SSE frames for a job, starting after last_event_id so that
+    EventSource reconnects resume where they left off.
+    """
+    sent = last_event_id
+    while True:
+        events = job.wait_for_events(sent, timeout=settings.BACKTEST_JOB_HEARTBEAT)
+        if not events:
+            if job.closed:
+                return
+            yield ": keep-alive\n\n"
+            continue
+        for ev in events:
+            sent = ev['id']
+            yield f"id: {ev['id']}\nevent: {ev['event']}\ndata: {json.dumps(ev['data'], default=_json_default)}\n\n"
+        if job.closed and sent >= len(job.events):
+            return
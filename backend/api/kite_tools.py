@@ -1,23 +1,73 @@
 """
 Trading tools for KiteConnect API integration
 """
-from typing import Dict, Any, List
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 from kiteconnect import KiteConnect
+from . import instruments
+from . import order_dispatcher
+from .cache import TTLCache
 from .models import UserProfile
+from .security import decrypt_value
+
+# Ready clients per user id, as (credentials version, client), so repeated
+# calls skip decryption and reuse the client's HTTP connections
+_clients = TTLCache(maxsize=settings.KITE_CLIENT_CACHE_SIZE, ttl=settings.KITE_CLIENT_TTL)
+
+# Broker holdings per user id. Placing an order bumps the user's generation,
+# so a fetch that was in flight during the order cannot store pre-order data.
+_holdings = TTLCache(maxsize=settings.KITE_CLIENT_CACHE_SIZE, ttl=settings.KITE_HOLDINGS_TTL,
+                     stale_ttl=settings.KITE_HOLDINGS_STALE_TTL)
+_generations: Dict[int, int] = {}
+_refreshing = set()
+_holdings_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _credentials_version(key_encrypted: str, access_token: str) -> str:
+    return hashlib.sha256(f"{key_encrypted}\0{access_token}".encode("utf-8")).hexdigest()
 
 
 def get_kite_client(user) -> KiteConnect:
-    """Create and configure a KiteConnect client for the user"""
-    profile = UserProfile.objects.get(user=user)
-    
-    if not profile.kiteconnect_key or not profile.kiteconnect_access_token:
+    """
+    KiteConnect client for the user, cached until the stored credentials
+    change. Only the encrypted credentials are read on each call, so a token
+    refreshed by another process is picked up on the next call.
+    """
+    row = UserProfile.objects.filter(user=user).values_list('kiteconnect_key_encrypted', 'kiteconnect_access_token').first()
+    if row is None:
+        raise UserProfile.DoesNotExist("UserProfile matching query does not exist.")
+    key_encrypted, access_token = row
+
+    if not key_encrypted or not access_token:
         raise ValueError("KiteConnect credentials not configured. Please set your API key and access token in your profile.")
-    
-    kite = KiteConnect(api_key=profile.kiteconnect_key)
-    kite.set_access_token(profile.kiteconnect_access_token)
+
+    version = _credentials_version(key_encrypted, access_token)
+    cached = _clients.get(user.id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    api_key = decrypt_value(key_encrypted)
+    if not api_key:
+        raise ValueError("KiteConnect credentials not configured. Please set your API key and access token in your profile.")
+    kite = KiteConnect(api_key=api_key, root=settings.KITE_API_ROOT)
+    kite.set_access_token(access_token)
+    _clients.set(user.id, (version, kite))
     return kite
 
 
+@receiver(post_save, sender=UserProfile)
+def _forget_kite_client(sender, instance, **kwargs):
+    # Drop the client as soon as this process saves new credentials
+    _clients.pop(instance.user_id)
+
+
 def place_order(user, tradingsymbol: str, exchange: str, transaction_type: str, quantity: int, order_type: str = "MARKET", product: str = "CNC") -> Dict[str, Any]:
     """
     Place an order on KiteConnect
@@ -35,6 +85,11 @@ def place_order(user, tradingsymbol: str, exchange: str, transaction_type: str,
         Dictionary with order details or error message
     """
     try:
+        # Reject symbols the exchange doesn't list before calling the broker
+        error = instruments.validate_order(tradingsymbol, exchange, quantity)
+        if error:
+            return {"success": False, "message": f"Failed to place order: {error}"}
+
         kite = get_kite_client(user)
         
         # Place the order
@@ -48,6 +103,8 @@ def place_order(user, tradingsymbol: str, exchange: str, transaction_type: str,
             variety='regular'
         )
         
+        invalidate_holdings(user.id)
+
         return {
             "success": True,
             "message": f"Order placed successfully",
@@ -68,19 +125,125 @@ def place_order(user, tradingsymbol: str, exchange: str, transaction_type: str,
         }
 
 
-def get_holdings(user) -> Dict[str, Any]:
+def place_orders(user, orders: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Place several orders (e.g. the legs of a rebalance) concurrently
+    
+    Args:
+        user: Django user object
+        orders: dicts with tradingsymbol, transaction_type, quantity and
+                optional exchange (NSE), order_type (MARKET), product (CNC)
+                and price
+    
+    Returns:
+        Dictionary with one status per order; success only if all were placed
+    """
+    legs = []
+    statuses: List[Optional[Dict[str, Any]]] = []
+    for order in orders:
+        leg = {
+            "tradingsymbol": str(order.get("tradingsymbol", "")).upper(),
+            "exchange": str(order.get("exchange") or "NSE").upper(),
+            "transaction_type": str(order.get("transaction_type", "")).upper(),
+            "quantity": order.get("quantity", 0),
+            "order_type": str(order.get("order_type") or "MARKET").upper(),
+            "product": str(order.get("product") or "CNC").upper(),
+        }
+        if order.get("price"):
+            leg["price"] = order["price"]
+        try:
+            leg["quantity"] = int(leg["quantity"])
+            error = instruments.validate_order(leg["tradingsymbol"], leg["exchange"], leg["quantity"])
+        except (TypeError, ValueError):
+            error = "Quantity must be an integer"
+        if error:
+            statuses.append({**leg, "success": False, "attempts": 0, "message": f"Failed to place order: {error}"})
+        else:
+            statuses.append(None)
+            legs.append(leg)
+
+    if legs:
+        try:
+            sent = iter(order_dispatcher.dispatch_orders(get_kite_client(user), user.id, legs))
+        except Exception as e:
+            failed = {"success": False, "attempts": 0, "message": f"Failed to place order: {str(e)}"}
+            sent = iter({**leg, **failed} for leg in legs)
+        statuses = [status or next(sent) for status in statuses]
+
+    placed = sum(1 for status in statuses if status["success"])
+    if placed:
+        invalidate_holdings(user.id)
+    return {
+        "success": bool(statuses) and placed == len(statuses),
+        "message": f"Placed {placed} of {len(statuses)} orders",
+        "orders": statuses,
+    }
+
+
+def invalidate_holdings(user_id):
+    with _holdings_lock:
+        _generations[user_id] = _generations.get(user_id, 0) + 1
+    _holdings.pop(user_id)
+
+
+def _fetch_holdings(user) -> List[Dict[str, Any]]:
+    with _holdings_lock:
+        generation = _generations.get(user.id, 0)
+    holdings = get_kite_client(user).holdings()
+    with _holdings_lock:
+        if _generations.get(user.id, 0) == generation:
+            _holdings.set(user.id, holdings)
+    return holdings
+
+
+def _refresh_holdings(user):
+    close_old_connections()
+    try:
+        _fetch_holdings(user)
+    except Exception as e:
+        print(f"Failed to refresh holdings: {e}")
+    finally:
+        with _holdings_lock:
+            _refreshing.discard(user.id)
+        close_old_connections()
+
+
+def _schedule_refresh(user):
+    global _executor
+    with _holdings_lock:
+        if user.id in _refreshing:
+            return
+        _refreshing.add(user.id)
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.KITE_HOLDINGS_REFRESH_WORKERS, thread_name_prefix='kite-holdings')
+        executor = _executor
+    executor.submit(_refresh_holdings, user)
+
+
+def get_holdings(user, allow_stale: bool = False) -> Dict[str, Any]:
     """
     Get user's current holdings
     
+    Holdings are cached for KITE_HOLDINGS_TTL seconds and dropped when an
+    order is placed through place_order.
+    
     Args:
         user: Django user object
+        allow_stale: return holdings up to KITE_HOLDINGS_STALE_TTL seconds past
+                     their TTL right away and refresh them in the background
     
     Returns:
         Dictionary with holdings or error message
     """
     try:
-        kite = get_kite_client(user)
-        holdings = kite.holdings()
+        holdings, fresh = _holdings.get_stale(user.id)
+        if holdings is not None and not fresh:
+            if allow_stale:
+                _schedule_refresh(user)
+            else:
+                holdings = None
+        if holdings is None:
+            holdings = _fetch_holdings(user)
         
         return {
             "success": True,
@@ -92,5 +255,3 @@ def get_holdings(user) -> Dict[str, Any]:
             "success": False,
             "message": f"Failed to get holdings: {str(e)}"
         }
-
-
@@ -0,0 +1,95 @@
+"""
+Leaderboard ordering, rank lookup and keyset pagination.
+
+Each metric orders by (metric desc, id asc), which is backed by a composite
+index, so both the rank of one snapshot (a COUNT of the rows ahead of it) and
+each page (a range scan from the cursor) cost an index seek rather than a scan
+of the whole table.
+"""
+import base64
+import json
+from decimal import Decimal
+from typing import Dict, Any, List, Optional, Tuple
+from django.db.models import Q
+from .models import LeaderboardSnapshot
+
+METRICS = {
+    'value': 'total_value',
+    'balanced': 'diversification_score',
+    'consistency': 'win_rate',
+}
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def metric_field(metric: str) -> str:
+    return METRICS.get(metric, METRICS['value'])
+
+
+def _ahead_of(field: str, value, snapshot_id: int) -> Q:
+    # Rows that sort before (value, id) in (field desc, id asc) order
+    return Q(**{f'{field}__gt': value}) | Q(**{field: value, 'id__lt': snapshot_id})
+
+
+def _behind(field: str, value, snapshot_id: int) -> Q:
+    return Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id__gt': snapshot_id})
+
+
+def rank_of(snapshot: LeaderboardSnapshot, metric: str) -> int:
+    field = metric_field(metric)
+    value = getattr(snapshot, field)
+    return LeaderboardSnapshot.objects.filter(_ahead_of(field, value, snapshot.id)).count() + 1
+
+
+def encode_cursor(value, snapshot_id: int, rank: int) -> str:
+    raw = json.dumps([str(value), snapshot_id, rank]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, field: str) -> Tuple[Any, int, int]:
+    """Raises ValueError for a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, snapshot_id, rank = json.loads(raw)
+        value = Decimal(value) if field == 'total_value' else float(value)
+        return value, int(snapshot_id), int(rank)
+    except (TypeError, ArithmeticError, json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def entry(snapshot: LeaderboardSnapshot, rank: int, current_user_id: Optional[int]) -> Dict[str, Any]:
+    return {
+        'rank': rank,
+        'username': snapshot.user.username,
+        'total_value': snapshot.total_value,
+        'diversification_score': snapshot.diversification_score,
+        'win_rate': snapshot.win_rate,
+        'is_current_user': snapshot.user_id == current_user_id,
+    }
+
+
+def get_page(metric: str, cursor: Optional[str] = None, limit: int = PAGE_SIZE,
+             current_user_id: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    One page of the leaderboard, starting after `cursor` (the first page when
+    None). Returns (entries, next_cursor); next_cursor is None on the last page.
+    """
+    field = metric_field(metric)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    queryset = LeaderboardSnapshot.objects.select_related('user').order_by(f'-{field}', 'id')
+    rank = 0
+    if cursor:
+        value, snapshot_id, rank = decode_cursor(cursor, field)
+        queryset = queryset.filter(_behind(field, value, snapshot_id))
+
+    # One extra row tells whether there is a next page
+    snapshots = list(queryset[:limit + 1])
+    more = len(snapshots) > limit
+    snapshots = snapshots[:limit]
+    entries = [entry(s, rank + i, current_user_id) for i, s in enumerate(snapshots, 1)]
+    next_cursor = None
+    if more:
+        last = snapshots[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.id, rank + len(snapshots))
+    return entries, next_cursor
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from api.instruments import build_index, load_dump
+
+
+class Command(BaseCommand):
+    help = "Builds the local instrument master from Kite's daily instruments dump (run once a day before market open)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=None,
+                            help='path or URL of the instruments CSV (default INSTRUMENTS_URL)')
+
+    def handle(self, *args, **options):
+        count = build_index(load_dump(options['source']))
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} instruments"))
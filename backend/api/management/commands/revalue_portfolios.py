@@ -0,0 +1,21 @@
+import datetime
+from django.core.management.base import BaseCommand
+from api.portfolio_valuation import revalue_portfolios
+
+
+class Command(BaseCommand):
+    help = "Marks every simulated portfolio to market and refreshes the leaderboard (run after market close)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--date', type=datetime.date.fromisoformat, default=None,
+                            help='trading day the values are recorded for (YYYY-MM-DD, default today)')
+
+    def handle(self, *args, **options):
+        summary = revalue_portfolios(batch_size=options['batch_size'], day=options['date'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Revalued {summary['portfolios']} portfolios ({summary['updated']} updated, "
+            f"{summary['created']} created) across {summary['symbols']} symbols"
+        ))
+        if summary['unpriced']:
+            self.stdout.write(self.style.WARNING(f"No price for: {', '.join(summary['unpriced'])}"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from api.order_book import match_forever
+
+
+class Command(BaseCommand):
+    help = ("Matches pending simulated orders against live quotes in the foreground. Run one of these "
+            "with SIM_ORDER_MATCHER=False on the web workers, so only one process polls quotes for the book.")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Matching simulated orders (Ctrl+C to stop)")
+        try:
+            match_forever()
+        except KeyboardInterrupt:
+            pass
@@ -78,6 +78,32 @@ def get_stock_info(symbol: str) -> Dict[str, Any]:
             "message": f"Failed to fetch info for {symbol}: {str(e)}"
         }
 
+def get_quotes(symbols: List[str]) -> Dict[str, float]:
+    """
+    Latest traded price for many symbols with one batched download, keyed by
+    the symbols as given. Symbols without data are left out.
+    """
+    if not symbols:
+        return {}
+    tickers = [s if s.endswith(".NS") or s.endswith(".BO") else f"{s}.NS" for s in symbols]
+    try:
+        data = yf.download(tickers, period="1d", interval="1m", progress=False)['Close']
+    except Exception as e:
+        print(f"Failed to fetch quotes: {e}")
+        return {}
+    if isinstance(data, pd.Series):
+        data = data.to_frame(tickers[0])
+    if data.empty:
+        return {}
+
+    last = data.ffill().iloc[-1]
+    quotes = {}
+    for symbol, ticker in zip(symbols, tickers):
+        price = last.get(ticker)
+        if price is not None and not pd.isna(price):
+            quotes[symbol] = float(price)
+    return quotes
+
 def get_market_movers() -> Dict[str, Any]:
     """
     Get top gainers and losers from Nifty 50.
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-19 03:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_goal_goalitem'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='leaderboardsnapshot',
+            index=models.Index(fields=['-total_value', 'id'], name='leaderboard_value_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leaderboardsnapshot',
+            index=models.Index(fields=['-diversification_score', 'id'], name='leaderboard_balanced_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leaderboardsnapshot',
+            index=models.Index(fields=['-win_rate', 'id'], name='leaderboard_consist_idx'),
+        ),
+    ]
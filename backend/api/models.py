@@ -51,6 +51,14 @@ class LeaderboardSnapshot(models.Model):
     win_rate = models.FloatField(default=0.0, help_text="Percentage of profitable trades")
     last_updated = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Leaderboard order per metric, ties broken by id (see leaderboard.py)
+        indexes = [
+            models.Index(fields=['-total_value', 'id'], name='leaderboard_value_idx'),
+            models.Index(fields=['-diversification_score', 'id'], name='leaderboard_balanced_idx'),
+            models.Index(fields=['-win_rate', 'id'], name='leaderboard_consist_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - ₹{self.total_value}"
 
@@ -0,0 +1,63 @@
+"""
+Process-wide MongoDB client.
+
+MongoClient is thread-safe and owns a connection pool plus background monitor
+threads, so a single instance is shared by request handlers, simulated orders
+and the WhatsApp worker threads. It is not fork-safe: a forked worker process
+drops the client it inherited and lazily creates its own.
+"""
+import os
+import threading
+from typing import Optional
+from pymongo import MongoClient
+from pymongo.database import Database
+from django.conf import settings
+
+_client: Optional[MongoClient] = None
+_client_pid: Optional[int] = None
+_lock = threading.Lock()
+
+
+def get_client() -> MongoClient:
+    global _client, _client_pid
+    client = _client
+    if client is not None and _client_pid == os.getpid():
+        return client
+    with _lock:
+        if _client is None or _client_pid != os.getpid():
+            # connect=False defers topology discovery to the first operation
+            _client = MongoClient(
+                settings.MONGODB_URI,
+                maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+                minPoolSize=settings.MONGODB_MIN_POOL_SIZE,
+                connect=False,
+            )
+            _client_pid = os.getpid()
+        return _client
+
+
+def get_db() -> Database:
+    return get_client()[settings.MONGODB_DB]
+
+
+def close():
+    """Closes the shared client; the next get_client() creates a new one."""
+    global _client, _client_pid
+    with _lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+
+def _after_fork_in_child():
+    # The parent's sockets and monitor threads are unusable here, and the lock
+    # may have been held by another thread at fork time.
+    global _client, _client_pid, _lock
+    _client = None
+    _client_pid = None
+    _lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
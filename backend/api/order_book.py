@@ -0,0 +1,431 @@
+"""
+Pending LIMIT and stop orders for simulation mode.
+
+Resting orders are stored in the simulated_orders collection and mirrored in
+the matcher's in-memory OrderBook: for each symbol and side, a sorted list of
+distinct price levels holding the orders at that price in arrival order. A
+background matcher takes one quote snapshot for every symbol with resting
+orders and, per symbol, finds the levels the quote has reached with a single
+bisect, so a pass costs O(symbols * log(levels) + fills) regardless of how many
+orders rest.
+
+Orders are placed and cancelled in Mongo only, from any process; each pass
+first syncs the book with the orders created or closed since the previous one.
+
+Order types follow Kite: LIMIT (price), SL-M (stop at trigger_price, fills at
+market) and SL (stop at trigger_price, then rests as a LIMIT at price).
+"""
+import bisect
+import datetime
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.conf import settings
+from . import market_tools
+from . import mongo
+from . import portfolio_valuation
+from . import sim_tools
+
+OPEN = 'OPEN'
+TRIGGER_PENDING = 'TRIGGER PENDING'
+FILLING = 'FILLING'
+COMPLETE = 'COMPLETE'
+CANCELLED = 'CANCELLED'
+REJECTED = 'REJECTED'
+
+PENDING_ORDER_TYPES = ('LIMIT', 'SL', 'SL-M')
+
+# A FILLING order older than this was claimed by a process that died mid-fill
+STALE_FILL_SECONDS = 60
+
+# Each sync re-reads this far back, for writes that land slightly out of
+# created_at/updated_at order (e.g. clock skew between web workers)
+SYNC_OVERLAP_SECONDS = 5
+
+
+class PriceLevels:
+    """
+    Orders of one book side at sorted price levels.
+    reached_at_or_below: a level is reached when the quote is at or below it
+    (buy limits, sell stops); otherwise when the quote is at or above it.
+    """
+
+    def __init__(self, reached_at_or_below: bool):
+        self.reached_at_or_below = reached_at_or_below
+        self.prices: List[float] = []
+        self.levels: Dict[float, Dict[str, Dict[str, Any]]] = {}
+        self.count = 0
+
+    def add(self, price: float, order: Dict[str, Any]):
+        level = self.levels.get(price)
+        if level is None:
+            bisect.insort(self.prices, price)
+            level = self.levels[price] = {}
+        level[order['id']] = order
+        self.count += 1
+
+    def remove(self, price: float, order_id: str) -> bool:
+        level = self.levels.get(price)
+        if level is None or level.pop(order_id, None) is None:
+            return False
+        self.count -= 1
+        if not level:
+            del self.levels[price]
+            del self.prices[bisect.bisect_left(self.prices, price)]
+        return True
+
+    def pop_reached(self, quote: float) -> List[Dict[str, Any]]:
+        """Removes and returns the orders the quote reaches, best price first."""
+        if self.reached_at_or_below:
+            i = bisect.bisect_left(self.prices, quote)
+            reached = self.prices[i:]
+            del self.prices[i:]
+            reached.reverse()
+        else:
+            i = bisect.bisect_right(self.prices, quote)
+            reached = self.prices[:i]
+            del self.prices[:i]
+
+        orders = []
+        for price in reached:
+            orders.extend(self.levels.pop(price).values())
+        self.count -= len(orders)
+        return orders
+
+
+def _book_side(order: Dict[str, Any]) -> Tuple[str, float]:
+    buy = order['transaction_type'] == 'BUY'
+    # Triggered SL orders rest on the limit side like LIMIT orders
+    if order['order_type'] == 'LIMIT' or order.get('status') == OPEN:
+        return ('buy_limit' if buy else 'sell_limit'), order['price']
+    return ('buy_stop' if buy else 'sell_stop'), order['trigger_price']
+
+
+class OrderBook:
+    """
+    In-memory index of resting orders. Orders are dicts with id, user_id,
+    symbol, transaction_type, quantity, order_type, price, trigger_price and
+    status (OPEN rests on a limit side, TRIGGER PENDING on a stop side).
+    """
+
+    def __init__(self):
+        self._symbols: Dict[str, Dict[str, PriceLevels]] = {}
+        self._index: Dict[str, Tuple[str, str, float]] = {}
+        self._lock = threading.Lock()
+        self.synced_at: Optional[datetime.datetime] = None
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, order_id: str) -> bool:
+        return order_id in self._index
+
+    def symbols(self) -> List[str]:
+        with self._lock:
+            return list(self._symbols)
+
+    def add(self, order: Dict[str, Any]):
+        with self._lock:
+            self._add(order)
+
+    def _add(self, order: Dict[str, Any]):
+        side, price = _book_side(order)
+        book = self._symbols.get(order['symbol'])
+        if book is None:
+            book = self._symbols[order['symbol']] = {
+                'buy_limit': PriceLevels(True),
+                'sell_limit': PriceLevels(False),
+                'buy_stop': PriceLevels(False),
+                'sell_stop': PriceLevels(True),
+            }
+        book[side].add(price, order)
+        self._index[order['id']] = (order['symbol'], side, price)
+
+    def remove(self, order_id: str) -> bool:
+        with self._lock:
+            entry = self._index.pop(order_id, None)
+            if entry is None:
+                return False
+            symbol, side, price = entry
+            self._symbols[symbol][side].remove(price, order_id)
+            self._drop_if_empty(symbol)
+            return True
+
+    def _drop_if_empty(self, symbol: str):
+        if not any(side.count for side in self._symbols[symbol].values()):
+            del self._symbols[symbol]
+
+    def match(self, quotes: Dict[str, float]) -> Tuple[List[Tuple[Dict[str, Any], float]], List[Dict[str, Any]]]:
+        """
+        Checks every resting order against one quote snapshot.
+        Returns (fills, triggered): orders to execute with their fill price
+        (the quote), and SL orders whose stop was hit and that now rest as
+        limit orders. Both are removed from (or moved within) the book.
+        """
+        fills = []
+        triggered = []
+        with self._lock:
+            for symbol, quote in quotes.items():
+                book = self._symbols.get(symbol)
+                if book is None:
+                    continue
+
+                for side in ('buy_stop', 'sell_stop'):
+                    for order in book[side].pop_reached(quote):
+                        del self._index[order['id']]
+                        if order['order_type'] == 'SL':
+                            order['status'] = OPEN
+                            self._add(order)
+                            triggered.append(order)
+                        else:
+                            fills.append((order, quote))
+
+                for side in ('buy_limit', 'sell_limit'):
+                    for order in book[side].pop_reached(quote):
+                        del self._index[order['id']]
+                        fills.append((order, quote))
+
+                self._drop_if_empty(symbol)
+        return fills, triggered
+
+
+_book: Optional[OrderBook] = None
+_matcher: Optional[threading.Thread] = None
+_indexed = False
+_lock = threading.Lock()
+
+
+def get_orders_collection():
+    global _indexed
+    col = mongo.get_db()['simulated_orders']
+    if not _indexed:
+        col.create_index([('status', 1), ('created_at', 1)])
+        col.create_index([('updated_at', 1)])
+        col.create_index([('user_id', 1), ('created_at', -1)])
+        _indexed = True
+    return col
+
+
+def _to_book_order(doc: Dict[str, Any]) -> Dict[str, Any]:
+    order = {k: doc.get(k) for k in ('user_id', 'symbol', 'transaction_type', 'quantity',
+                                     'order_type', 'price', 'trigger_price', 'status')}
+    order['id'] = str(doc['_id'])
+    return order
+
+
+def recover_stale_fills() -> int:
+    """
+    Settles orders left FILLING by a process that died mid-fill: COMPLETE if
+    the fill reached the trade log, otherwise REJECTED (the ledger may have
+    moved, so the order is not reopened). Returns the number settled.
+    """
+    orders = get_orders_collection()
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=STALE_FILL_SECONDS)
+    trades = mongo.get_db()['simulated_trades']
+    settled = 0
+    for doc in orders.find({'status': FILLING, 'updated_at': {'$lt': cutoff}}):
+        trade = trades.find_one({'order_id': str(doc['_id'])})
+        if trade:
+            update = {'status': COMPLETE, 'fill_price': trade['price']}
+        else:
+            update = {'status': REJECTED, 'message': 'Fill was interrupted; check your holdings before placing it again'}
+        update['updated_at'] = datetime.datetime.utcnow()
+        res = orders.update_one({'_id': doc['_id'], 'status': FILLING, 'updated_at': doc['updated_at']}, {'$set': update})
+        settled += res.modified_count
+    return settled
+
+
+def sync_book(book: OrderBook) -> Tuple[int, int]:
+    """
+    Brings the book up to date with simulated_orders: drops orders that have
+    left the pending states since the last sync (cancelled, or closed by
+    another process) and adds resting orders created since then. The first
+    sync loads every resting order. Returns (added, removed).
+    """
+    col = get_orders_collection()
+    now = datetime.datetime.utcnow()
+    pending = [OPEN, TRIGGER_PENDING]
+    added = removed = 0
+    if book.synced_at is None:
+        new_orders = col.find({'status': {'$in': pending}})
+    else:
+        since = book.synced_at - datetime.timedelta(seconds=SYNC_OVERLAP_SECONDS)
+        for doc in col.find({'updated_at': {'$gte': since}, 'status': {'$nin': pending}}, {'_id': 1}):
+            removed += book.remove(str(doc['_id']))
+        new_orders = col.find({'status': {'$in': pending}, 'created_at': {'$gte': since}})
+    for doc in new_orders:
+        if str(doc['_id']) not in book:
+            book.add(_to_book_order(doc))
+            added += 1
+    book.synced_at = now
+    return added, removed
+
+
+def get_book() -> OrderBook:
+    """
+    The process-wide book, created on first use (after settling fills a
+    crashed process left behind) and filled by sync_book on each pass.
+    """
+    global _book
+    if _book is not None:
+        return _book
+    with _lock:
+        if _book is None:
+            recover_stale_fills()
+            _book = OrderBook()
+    return _book
+
+
+def match_forever():
+    """Syncs and matches the book every SIM_ORDER_MATCH_INTERVAL seconds."""
+    while True:
+        try:
+            run_matching_pass()
+        except Exception as e:
+            print(f"Simulated order matching failed: {e}")
+        time.sleep(settings.SIM_ORDER_MATCH_INTERVAL)
+
+
+def start_matcher():
+    """
+    Starts the in-process matcher thread (once). Deployments with several web
+    workers should instead set SIM_ORDER_MATCHER=False and run the
+    `run_order_matcher` management command as a single dedicated worker.
+    """
+    global _matcher
+    with _lock:
+        if _matcher is None:
+            _matcher = threading.Thread(target=match_forever, name='sim-order-matcher', daemon=True)
+            _matcher.start()
+
+
+def submit_order(user_id, symbol: str, transaction_type: str, quantity: int, order_type: str,
+                 price: float = 0, trigger_price: float = 0) -> Dict[str, Any]:
+    """
+    Validates and stores a pending order; the matcher picks it up on its
+    next pass and fills it once a quote reaches it. Cash and shares are
+    checked at fill time.
+    """
+    if transaction_type not in ('BUY', 'SELL'):
+        return {"success": False, "message": f"Unknown transaction type: {transaction_type}"}
+    if order_type not in PENDING_ORDER_TYPES:
+        return {"success": False, "message": f"Unsupported order type: {order_type}"}
+    if quantity <= 0:
+        return {"success": False, "message": "Quantity must be positive"}
+    if order_type in ('LIMIT', 'SL') and not price:
+        return {"success": False, "message": f"{order_type} orders need a price"}
+    if order_type in ('SL', 'SL-M') and not trigger_price:
+        return {"success": False, "message": f"{order_type} orders need a trigger_price"}
+
+    now = datetime.datetime.utcnow()
+    doc = {
+        'user_id': user_id,
+        'symbol': symbol,
+        'transaction_type': transaction_type,
+        'quantity': quantity,
+        'order_type': order_type,
+        'price': float(price) if price else None,
+        'trigger_price': float(trigger_price) if trigger_price else None,
+        'status': OPEN if order_type == 'LIMIT' else TRIGGER_PENDING,
+        'created_at': now,
+        'updated_at': now,
+    }
+    result = get_orders_collection().insert_one(doc)
+
+    level = f"at {doc['price']:.2f}" if order_type == 'LIMIT' else f"triggering at {doc['trigger_price']:.2f}"
+    return {
+        "success": True,
+        "message": f"Simulated {order_type} {transaction_type} order for {quantity} {symbol} {level} is pending",
+        "order_id": str(result.inserted_id),
+        "status": doc['status'],
+    }
+
+
+def cancel_order(user_id, order_id: str) -> Dict[str, Any]:
+    try:
+        oid = ObjectId(order_id)
+    except (InvalidId, TypeError):
+        return {"success": False, "message": "Order not found"}
+    res = get_orders_collection().update_one(
+        {'_id': oid, 'user_id': user_id, 'status': {'$in': [OPEN, TRIGGER_PENDING]}},
+        {'$set': {'status': CANCELLED, 'updated_at': datetime.datetime.utcnow()}}
+    )
+    if res.matched_count == 0:
+        return {"success": False, "message": "Order not found or no longer pending"}
+    # The matcher drops it on its next sync; until then the fill claim skips it
+    return {"success": True, "message": f"Order {order_id} cancelled"}
+
+
+def list_orders(user_id, pending_only: bool = False, limit: int = 50) -> Dict[str, Any]:
+    query = {'user_id': user_id}
+    if pending_only:
+        query['status'] = {'$in': [OPEN, TRIGGER_PENDING]}
+    orders = []
+    for doc in get_orders_collection().find(query).sort('created_at', -1).limit(limit):
+        doc['order_id'] = str(doc.pop('_id'))
+        orders.append(doc)
+    return {"success": True, "orders": orders, "message": f"Retrieved {len(orders)} simulated orders"}
+
+
+def _execute_fill(order: Dict[str, Any], price: float) -> bool:
+    orders = get_orders_collection()
+    # Claim first, so an order is never filled twice (e.g. cancelled meanwhile)
+    claimed = orders.update_one(
+        {'_id': ObjectId(order['id']), 'status': {'$in': [OPEN, TRIGGER_PENDING]}},
+        {'$set': {'status': FILLING, 'updated_at': datetime.datetime.utcnow()}}
+    )
+    if claimed.modified_count == 0:
+        return False
+
+    try:
+        portfolio, error = sim_tools.apply_simulated_trade(
+            mongo.get_db()['simulated_portfolios'], order['user_id'], order['symbol'],
+            order['transaction_type'], order['quantity'], price, order_id=order['id']
+        )
+    except Exception as e:
+        # Don't leave the order FILLING; it has already left the book
+        portfolio, error = None, f"Fill failed: {str(e)}"
+    update = {'status': COMPLETE if portfolio else REJECTED, 'updated_at': datetime.datetime.utcnow()}
+    if portfolio:
+        update['fill_price'] = price
+    else:
+        update['message'] = error
+    # If this write fails too, recover_stale_fills settles the order on the next load
+    orders.update_one({'_id': ObjectId(order['id']), 'status': FILLING}, {'$set': update})
+    return portfolio is not None
+
+
+def run_matching_pass(quotes: Optional[Dict[str, float]] = None) -> int:
+    """
+    Syncs the book, matches it against one quote snapshot (fetched in a
+    single batch if not given) and executes the fills. Returns the number of
+    fills.
+    """
+    book = get_book()
+    sync_book(book)
+    if quotes is None:
+        symbols = book.symbols()
+        if not symbols:
+            return 0
+        quotes = market_tools.get_quotes(symbols)
+
+    fills, triggered = book.match(quotes)
+    if triggered:
+        get_orders_collection().update_many(
+            {'_id': {'$in': [ObjectId(o['id']) for o in triggered]}, 'status': TRIGGER_PENDING},
+            {'$set': {'status': OPEN, 'updated_at': datetime.datetime.utcnow()}}
+        )
+
+    filled_users = set()
+    for order, price in fills:
+        try:
+            if _execute_fill(order, price):
+                filled_users.add(order['user_id'])
+        except Exception as e:
+            print(f"Failed to fill simulated order {order['id']}: {e}")
+
+    for user_id in filled_users:
+        portfolio_valuation.schedule_snapshot_update(user_id)
+    return len(fills)
@@ -0,0 +1,183 @@
+"""
+Concurrent dispatch of multi-leg Kite orders.
+
+Legs are sent from a shared thread pool, so a rebalance costs about one broker
+round trip instead of one per leg, while a token bucket per user keeps each
+user's order rate within KITE_ORDERS_PER_SECOND (Kite limits order placement
+per API key). A user's legs hold at most KITE_DISPATCH_USER_WORKERS of the
+pool's threads at a time; the rest wait on the caller's thread, so a large
+basket waiting on its own rate limit never stalls other users' orders.
+Transient failures (network errors, rate limiting, OMS
+hiccups) are retried with exponential back-off; every leg reports its own
+status.
+
+Each leg carries a unique order tag. Before a leg is re-sent, the order book is
+checked for that tag, so a request that reached the broker but timed out on the
+way back is not placed twice.
+"""
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+import requests
+from django.conf import settings
+from kiteconnect import exceptions as kite_exceptions
+
+# Worth another attempt; input, order, permission and token errors are not
+TRANSIENT_ERRORS = (
+    kite_exceptions.NetworkException,
+    kite_exceptions.DataException,
+    requests.ConnectionError,
+    requests.Timeout,
+)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: acquire() blocks until one of `rate` tokens per
+    second is available, allowing bursts of up to `burst` requests. Any
+    one-second window sees at most burst + rate requests.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = burst or rate
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class UserLane:
+    """A user's rate budget and share of the dispatch workers."""
+
+    def __init__(self):
+        self.bucket = TokenBucket(settings.KITE_ORDERS_PER_SECOND, settings.KITE_ORDER_BURST)
+        self.slots = threading.BoundedSemaphore(min(settings.KITE_DISPATCH_USER_WORKERS, settings.KITE_DISPATCH_WORKERS))
+        self.active = 0  # dispatches in progress, guarded by _lock
+        self.last_used = time.monotonic()
+
+    def idle(self, now: float) -> bool:
+        # Idle long enough for the bucket to refill, a new lane behaves the same
+        return self.active == 0 and now - self.last_used >= self.bucket.burst / self.bucket.rate
+
+
+# Idle lanes are dropped at most this often, so _lanes does not grow per user forever
+LANE_SWEEP_SECONDS = 60
+
+_executor: Optional[ThreadPoolExecutor] = None
+_lanes: Dict[Any, UserLane] = {}
+_last_sweep = 0.0
+_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.KITE_DISPATCH_WORKERS, thread_name_prefix='kite-orders')
+        return _executor
+
+
+def _acquire_lane(user_id) -> UserLane:
+    global _last_sweep
+    now = time.monotonic()
+    with _lock:
+        if now - _last_sweep >= LANE_SWEEP_SECONDS:
+            for key in [key for key, lane in _lanes.items() if lane.idle(now)]:
+                del _lanes[key]
+            _last_sweep = now
+        lane = _lanes.get(user_id)
+        if lane is None:
+            lane = _lanes[user_id] = UserLane()
+        lane.active += 1
+        return lane
+
+
+def _release_lane(lane: UserLane):
+    with _lock:
+        lane.active -= 1
+        lane.last_used = time.monotonic()
+
+
+def _find_tagged_order(kite, tag: str) -> Optional[str]:
+    for order in kite.orders():
+        if order.get('tag') == tag:
+            return order.get('order_id')
+    return None
+
+
+def _send_leg(kite, bucket: TokenBucket, leg: Dict[str, Any]) -> Dict[str, Any]:
+    tag = uuid.uuid4().hex[:20]
+    status = {**leg, "success": False, "attempts": 0}
+    for attempt in range(settings.KITE_ORDER_MAX_RETRIES + 1):
+        if attempt:
+            # Full jitter, so retried legs don't come back in lockstep
+            time.sleep(random.uniform(0, settings.KITE_ORDER_RETRY_BACKOFF * 2 ** (attempt - 1)))
+            try:
+                bucket.acquire()
+                order_id = _find_tagged_order(kite, tag)
+            except TRANSIENT_ERRORS:
+                continue
+            if order_id:
+                return {**status, "success": True, "order_id": order_id, "message": "Order placed successfully"}
+
+        bucket.acquire()
+        status["attempts"] = attempt + 1
+        try:
+            order_id = kite.place_order(
+                variety='regular',
+                tradingsymbol=leg['tradingsymbol'],
+                exchange=leg['exchange'],
+                transaction_type=leg['transaction_type'],
+                quantity=leg['quantity'],
+                order_type=leg['order_type'],
+                product=leg['product'],
+                price=leg.get('price'),
+                tag=tag,
+            )
+            return {**status, "success": True, "order_id": order_id, "message": "Order placed successfully"}
+        except TRANSIENT_ERRORS as e:
+            status["message"] = f"Failed to place order: {str(e)}"
+        except Exception as e:
+            status["message"] = f"Failed to place order: {str(e)}"
+            return status
+    return status
+
+
+def dispatch_orders(kite, user_id, legs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Sends the legs concurrently within the user's rate budget and waits for
+    all of them. Legs are dicts with tradingsymbol, exchange,
+    transaction_type, quantity, order_type, product and optional price.
+    Returns one status per leg, in order: the leg plus success, order_id or
+    message, and attempts.
+    """
+    lane = _acquire_lane(user_id)
+    executor = _get_executor()
+    futures = []
+    try:
+        for leg in legs:
+            # Wait here rather than in the pool for one of the user's slots
+            lane.slots.acquire()
+            future = executor.submit(_send_leg, kite, lane.bucket, leg)
+            future.add_done_callback(lambda _: lane.slots.release())
+            futures.append(future)
+        return [future.result() for future in futures]
+    finally:
+        _release_lane(lane)
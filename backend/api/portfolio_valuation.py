@@ -0,0 +1,247 @@
+"""
+Portfolio valuation for the simulation leaderboard: price/sector lookup for
+many symbols at once, deferred per-user snapshot updates after trades, the
+end-of-day revaluation of every portfolio and its daily value series.
+"""
+import datetime
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from pymongo import UpdateOne
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import close_old_connections
+from django.utils import timezone
+from . import market_tools
+from . import mongo
+from . import sim_tools
+from .models import LeaderboardSnapshot, StockData
+
+_executor: Optional[ThreadPoolExecutor] = None
+_pending: Set[Any] = set()
+_lock = threading.Lock()
+
+
+def diversification_scores(sector_counts):
+    # Simple logic: 10 points per unique sector, max 100
+    return np.minimum(np.asarray(sector_counts) * 10, 100)
+
+
+def price_lookup(symbols: Iterable[str], live_first: bool = False) -> Tuple[Dict[str, float], Dict[str, str]]:
+    """
+    Prices and sectors for many symbols with one StockData query and at most
+    one batched quote download.
+    live_first: prefer live quotes over StockData prices (end of day marks);
+    otherwise quotes are only fetched for symbols StockData cannot price.
+    Symbols without a known sector use the symbol itself as a (weak) proxy
+    for diversification.
+    """
+    symbols = list(dict.fromkeys(symbols))
+    prices: Dict[str, float] = {}
+    sectors: Dict[str, str] = {}
+    for symbol, price, sector in StockData.objects.filter(symbol__in=symbols).values_list('symbol', 'current_price', 'sector'):
+        if price is not None:
+            prices[symbol] = float(price)
+        if sector and sector != "Unknown":
+            sectors[symbol] = sector
+
+    wanted = symbols if live_first else [s for s in symbols if s not in prices]
+    if wanted:
+        prices.update(market_tools.get_quotes(wanted))
+    for symbol in symbols:
+        sectors.setdefault(symbol, symbol)
+    return prices, sectors
+
+
+def schedule_snapshot_update(user_id):
+    """
+    Queues a leaderboard refresh for the user on a background thread, so
+    order latency does not depend on portfolio size. Requests for a user that
+    is already queued are coalesced; the refresh reads the latest portfolio.
+    """
+    global _executor
+    with _lock:
+        if user_id in _pending:
+            return
+        _pending.add(user_id)
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.LEADERBOARD_UPDATE_WORKERS, thread_name_prefix='leaderboard')
+        executor = _executor
+    executor.submit(refresh_snapshot, user_id)
+
+
+def refresh_snapshot(user_id):
+    with _lock:
+        # Trades from here on queue another refresh
+        _pending.discard(user_id)
+    close_old_connections()
+    try:
+        portfolio = mongo.get_db()["simulated_portfolios"].find_one({"user_id": user_id})
+        if portfolio:
+            sim_tools.update_leaderboard_snapshot(
+                user_id, portfolio["cash"], sim_tools.portfolio_holdings(portfolio), sim_tools.trade_stats(portfolio)
+            )
+    except Exception as e:
+        print(f"Failed to update leaderboard: {e}")
+    finally:
+        close_old_connections()
+
+
+def flatten_portfolios(portfolios: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Streams portfolio documents into flat arrays: one row per user (user_ids,
+    cash) and one row per open position (owner row, symbol id, quantity), so
+    that no portfolio document has to be kept around.
+    """
+    user_ids = []
+    cash = array('d')
+    owner = array('q')
+    symbol_ids = array('q')
+    quantities = array('d')
+    symbol_index: Dict[str, int] = {}
+    for portfolio in portfolios:
+        row = len(user_ids)
+        user_ids.append(portfolio["user_id"])
+        cash.append(portfolio.get("cash", 0))
+        for symbol, data in sim_tools.portfolio_holdings(portfolio).items():
+            owner.append(row)
+            symbol_ids.append(symbol_index.setdefault(symbol, len(symbol_index)))
+            quantities.append(data["quantity"])
+    return {
+        "user_ids": user_ids,
+        "cash": np.frombuffer(cash, dtype=np.float64),
+        "owner": np.frombuffer(owner, dtype=np.int64),
+        "symbol_ids": np.frombuffer(symbol_ids, dtype=np.int64),
+        "quantities": np.frombuffer(quantities, dtype=np.float64),
+        "symbols": list(symbol_index),
+    }
+
+
+def compute_valuations(flat: Dict[str, Any], prices: Dict[str, float], sectors: Dict[str, str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Total value and diversification score per user row of flatten_portfolios
+    output, summed with bincount. Unpriced symbols count as 0, as in the
+    per-order snapshot.
+    """
+    n_users = len(flat["user_ids"])
+    owner = flat["owner"]
+    symbol_ids = flat["symbol_ids"]
+    price = np.array([prices.get(s, 0.0) for s in flat["symbols"]], dtype=np.float64)
+
+    values = flat["cash"].copy()
+    values += np.bincount(owner, weights=flat["quantities"] * price[symbol_ids], minlength=n_users)
+
+    # Distinct (user, sector) pairs per user
+    sector_index: Dict[str, int] = {}
+    sector_of = np.array([sector_index.setdefault(sectors.get(s, s), len(sector_index)) for s in flat["symbols"]], dtype=np.int64)
+    n_sectors = max(len(sector_index), 1)
+    pairs = np.unique(owner * n_sectors + sector_of[symbol_ids]) if len(owner) else owner
+    counts = np.bincount(pairs // n_sectors, minlength=n_users)
+    return values, diversification_scores(counts)
+
+
+def get_value_series_collection():
+    # One document per user per year: {"user_id", "year", "values": [366 slots]}
+    # where values[i] is the closing value on day i of the year (0 = Jan 1) or
+    # None when the portfolio was not valued that day.
+    col = mongo.get_db()["portfolio_values"]
+    col.create_index([("user_id", 1), ("year", 1)], unique=True)
+    return col
+
+
+def record_daily_values(user_ids: List[Any], values: np.ndarray, day: datetime.date, batch_size: int = 2000) -> int:
+    """
+    Writes one day's closing values into each user's yearly bucket. Re-running
+    for the same day overwrites that day's slot.
+    """
+    col = get_value_series_collection()
+    slot = f"values.{day.timetuple().tm_yday - 1}"
+    operations = []
+    written = 0
+    for user_id, value in zip(user_ids, values.tolist()):
+        bucket = {"user_id": user_id, "year": day.year}
+        # Positional $set needs the array, and cannot share an update with
+        # the $setOnInsert that creates it
+        operations.append(UpdateOne(bucket, {"$setOnInsert": {"values": [None] * 366}}, upsert=True))
+        operations.append(UpdateOne(bucket, {"$set": {slot: round(value, 2)}}))
+        if len(operations) >= 2 * batch_size:
+            col.bulk_write(operations, ordered=True)
+            written += len(operations) // 2
+            operations = []
+    if operations:
+        col.bulk_write(operations, ordered=True)
+        written += len(operations) // 2
+    return written
+
+
+def get_value_series(user_id, start: Optional[datetime.date] = None, end: Optional[datetime.date] = None) -> Dict[str, List[Any]]:
+    """
+    Daily closing values of a portfolio in columnar form, {"dates", "values"},
+    read from the yearly buckets covering [start, end].
+    """
+    end = end or timezone.localdate()
+    # Not end.replace(year=...), which has no Feb 29 in the year before
+    start = start or end - datetime.timedelta(days=365)
+    dates = []
+    values = []
+    buckets = get_value_series_collection().find(
+        {"user_id": user_id, "year": {"$gte": start.year, "$lte": end.year}}, {"_id": 0, "year": 1, "values": 1}
+    ).sort("year", 1)
+    for bucket in buckets:
+        jan_1 = datetime.date(bucket["year"], 1, 1)
+        for i, value in enumerate(bucket["values"]):
+            if value is None:
+                continue
+            day = jan_1 + datetime.timedelta(days=i)
+            if start <= day <= end:
+                dates.append(day.isoformat())
+                values.append(value)
+    return {"dates": dates, "values": values}
+
+
+def revalue_portfolios(batch_size: int = 2000, day: Optional[datetime.date] = None) -> Dict[str, Any]:
+    """
+    Marks every simulated portfolio to market: streams simulated_portfolios,
+    fetches prices once for the distinct symbols, values all portfolios in
+    vectorized form and writes the leaderboard with one bulk_update (plus a
+    bulk_create for users that have never had a snapshot). The values are also
+    recorded as `day`'s point (default today) of each daily value series.
+    """
+    flat = flatten_portfolios(mongo.get_db()["simulated_portfolios"].find(
+        {}, {"_id": 0, "user_id": 1, "cash": 1, "holdings": 1}, batch_size=batch_size
+    ))
+    prices, sectors = price_lookup(flat["symbols"], live_first=True)
+    values, scores = compute_valuations(flat, prices, sectors)
+    user_ids = flat["user_ids"]
+
+    now = timezone.now()
+    existing = LeaderboardSnapshot.objects.in_bulk(user_ids, field_name='user_id')
+    missing = [u for u in user_ids if u not in existing]
+    known_users = User.objects.in_bulk(missing) if missing else {}
+
+    updated = []
+    created = []
+    for user_id, value, score in zip(user_ids, values.tolist(), scores.tolist()):
+        total_value = Decimal(str(round(value, 2)))
+        snapshot = existing.get(user_id)
+        if snapshot is not None:
+            snapshot.total_value = total_value
+            snapshot.diversification_score = score
+            snapshot.last_updated = now # auto_now is not applied by bulk_update
+            updated.append(snapshot)
+        elif user_id in known_users:
+            created.append(LeaderboardSnapshot(user_id=user_id, total_value=total_value, diversification_score=score))
+
+    LeaderboardSnapshot.objects.bulk_update(updated, ['total_value', 'diversification_score', 'last_updated'], batch_size=batch_size)
+    LeaderboardSnapshot.objects.bulk_create(created, batch_size=batch_size)
+    record_daily_values(user_ids, values, day or timezone.localdate(), batch_size=batch_size)
+    return {
+        "portfolios": len(user_ids),
+        "updated": len(updated),
+        "created": len(created),
+        "symbols": len(flat["symbols"]),
+        "unpriced": sorted(set(flat["symbols"]) - prices.keys()),
+    }
@@ -0,0 +1,206 @@
+"""
+Historical replay for simulation mode: a portfolio trades against stored daily
+bars while a clock advances through the past at a chosen speed (e.g. 1 day per
+second), so people can practise outside market hours.
+
+Sessions have no background work: the replay date is computed from the wall
+clock on every request (start_date + elapsed seconds * speed days). Prices come
+from BARS_DATA_DIR/1d/<TICKER>.csv, loaded once per process into sorted numpy
+arrays shared by every session, so a lookup is one searchsorted and no network
+call.
+"""
+import datetime
+import os
+from typing import Dict, Any, Iterable, Optional, Tuple
+import numpy as np
+import pandas as pd
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.conf import settings
+from . import mongo
+from . import sim_tools
+from .backtest_service import bars_path, to_ticker_symbol
+from .cache import TTLCache
+
+_bars = TTLCache(maxsize=settings.REPLAY_BAR_CACHE_SIZE)
+
+# Replay ledgers live apart from the live simulation ones. The ledger's
+# "user_id" is the session id, so sim_tools.apply_simulated_trade can be
+# reused unchanged and each session has its own cash and positions.
+PORTFOLIOS = 'replay_portfolios'
+TRADES = 'replay_trades'
+
+
+def load_daily_bars(symbol: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Stored daily closes of a symbol as (days, close): days are sorted
+    datetime64[D]. None when no bars are stored. Files are re-read when they
+    change on disk.
+    """
+    path = bars_path(symbol, '1d')
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+    cached = _bars.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    date_column = pd.read_csv(path, nrows=0).columns[0]
+    frame = pd.read_csv(path, usecols=[date_column, 'Close'], index_col=date_column)
+    # Dates may carry a time or UTC offset (yfinance to_csv); only the day matters
+    days = pd.to_datetime(frame.index.astype(str).str[:10]).to_numpy(dtype='datetime64[D]')
+    close = frame['Close'].to_numpy(dtype=np.float64)
+    order = np.argsort(days, kind='stable')
+    bars = (days[order], close[order])
+    _bars.set(path, (mtime, bars))
+    return bars
+
+
+def close_on(symbol: str, day: datetime.date) -> Optional[float]:
+    """Last stored close on or before `day`, or None before the first bar."""
+    bars = load_daily_bars(symbol)
+    if bars is None:
+        return None
+    days, close = bars
+    i = np.searchsorted(days, np.datetime64(day, 'D'), side='right') - 1
+    return float(close[i]) if i >= 0 else None
+
+
+def closes_on(symbols: Iterable[str], day: datetime.date) -> Dict[str, float]:
+    prices = {}
+    for symbol in symbols:
+        price = close_on(symbol, day)
+        if price is not None:
+            prices[symbol] = price
+    return prices
+
+
+def replay_date(session: Dict[str, Any], now: Optional[datetime.datetime] = None) -> datetime.date:
+    now = now or datetime.datetime.utcnow()
+    elapsed = max((now - session['started_at']).total_seconds(), 0)
+    start = datetime.date.fromisoformat(session['start_date'])
+    end = datetime.date.fromisoformat(session['end_date'])
+    return min(start + datetime.timedelta(days=int(elapsed * session['speed'])), end)
+
+
+def get_sessions_collection():
+    return mongo.get_db()['replay_sessions']
+
+
+def start_session(user_id, start_date: datetime.date, end_date: datetime.date, speed: float = 1.0,
+                  cash: float = sim_tools.STARTING_CASH) -> Dict[str, Any]:
+    """
+    Starts a replay from start_date to end_date; speed is in replayed days per
+    second.
+    """
+    if end_date <= start_date:
+        return {"success": False, "message": "end_date must be after start_date"}
+    if end_date > datetime.date.today():
+        return {"success": False, "message": "end_date cannot be in the future"}
+    if not 0 < speed <= settings.REPLAY_MAX_SPEED:
+        return {"success": False, "message": f"speed must be between 0 and {settings.REPLAY_MAX_SPEED} days per second"}
+    if cash <= 0:
+        return {"success": False, "message": "Starting cash must be positive"}
+
+    session = {
+        'user_id': user_id,
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'speed': float(speed),
+        'starting_cash': float(cash),
+        'started_at': datetime.datetime.utcnow(),
+    }
+    sessions = get_sessions_collection()
+    sessions.create_index([('user_id', 1), ('started_at', -1)])
+    session_id = sessions.insert_one(session).inserted_id
+
+    portfolios = mongo.get_db()[PORTFOLIOS]
+    portfolios.create_index('user_id', unique=True)
+    portfolios.insert_one({"user_id": str(session_id), "holdings": {}, "cash": float(cash),
+                           "ledger_version": sim_tools.LEDGER_VERSION})
+    return {
+        "success": True,
+        "message": f"Replay started at {session['start_date']}, {speed:g} day(s) per second",
+        "session_id": str(session_id),
+    }
+
+
+def _get_session(user_id, session_id: str) -> Optional[Dict[str, Any]]:
+    try:
+        oid = ObjectId(session_id)
+    except (InvalidId, TypeError):
+        return None
+    return get_sessions_collection().find_one({'_id': oid, 'user_id': user_id})
+
+
+def get_session_state(user_id, session_id: str) -> Dict[str, Any]:
+    """Replay date, cash and positions valued at that date's closes."""
+    session = _get_session(user_id, session_id)
+    if session is None:
+        return {"success": False, "message": "Replay session not found"}
+    day = replay_date(session)
+    portfolio = mongo.get_db()[PORTFOLIOS].find_one({"user_id": session_id}) or {}
+    positions = sim_tools.portfolio_holdings(portfolio)
+    prices = closes_on(positions, day)
+
+    holdings = []
+    for symbol, data in positions.items():
+        price = prices.get(symbol, 0)
+        qty = data['quantity']
+        holdings.append({
+            "tradingsymbol": symbol,
+            "quantity": qty,
+            "average_price": round(data['average_price'], 2),
+            "last_price": price,
+            "pnl": round((price - data['average_price']) * qty, 2) if price else 0,
+            "value": round(qty * price, 2),
+        })
+    cash = portfolio.get("cash", session['starting_cash'])
+    return {
+        "success": True,
+        "session_id": session_id,
+        "date": day.isoformat(),
+        "finished": day.isoformat() >= session['end_date'],
+        "cash": cash,
+        "total_value": round(cash + sum(h["value"] for h in holdings), 2),
+        "holdings": holdings,
+        "stats": sim_tools.trade_stats(portfolio),
+    }
+
+
+def place_replay_order(user_id, session_id: str, tradingsymbol: str, transaction_type: str, quantity: int) -> Dict[str, Any]:
+    """
+    Market order filled at the close of the current replay date.
+    """
+    session = _get_session(user_id, session_id)
+    if session is None:
+        return {"success": False, "message": "Replay session not found"}
+    day = replay_date(session)
+    if day.isoformat() >= session['end_date']:
+        return {"success": False, "message": "Replay has finished"}
+
+    symbol = to_ticker_symbol(tradingsymbol.upper())
+    try:
+        price = close_on(symbol, day)
+    except ValueError as e:
+        return {"success": False, "message": str(e)}
+    if price is None:
+        return {"success": False, "message": f"No stored price for {symbol} on {day.isoformat()}"}
+
+    portfolio, error = sim_tools.apply_simulated_trade(
+        mongo.get_db()[PORTFOLIOS], session_id, symbol, transaction_type, quantity, price, trades_collection=TRADES
+    )
+    if portfolio is None:
+        return {"success": False, "message": error}
+    return {
+        "success": True,
+        "message": f"Replay {transaction_type} order for {quantity} {symbol} filled at {price:.2f} on {day.isoformat()}",
+        "details": {
+            "symbol": symbol,
+            "quantity": quantity,
+            "price": price,
+            "date": day.isoformat(),
+            "remaining_cash": portfolio["cash"],
+        }
+    }
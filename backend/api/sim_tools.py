@@ -1,20 +1,283 @@
 """
 Tools for Simulated Trading
 """
-from typing import Dict, Any, List
-from pymongo import MongoClient
-from django.conf import settings
+import functools
+from typing import Dict, Any, List, Optional, Tuple
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from . import instruments
 from . import market_tools
+from . import mongo
+from . import order_book
+from . import portfolio_valuation
 import datetime
 
+STARTING_CASH = 1000000 # 10L virtual cash
+# Portfolios written by the atomic ledger; older documents keep dotted symbols
+# as holdings keys and are re-keyed on their first order.
+LEDGER_VERSION = 2
+
 def get_mongo_db():
-    client = MongoClient(settings.MONGODB_URI)
-    db = client[settings.MONGODB_DB]
-    return db
+    return mongo.get_db()
+
+def holding_key(symbol: str) -> str:
+    # Dots would be read as a path by $inc/$set ("holdings.TCS.NS.quantity")
+    return symbol.replace('.', ':')
+
+def holding_symbol(key: str) -> str:
+    return key.replace(':', '.')
+
+def portfolio_holdings(portfolio: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Open positions of a portfolio document keyed by symbol. Positions sold
+    down to zero stay in the ledger and are skipped here.
+    """
+    return {
+        holding_symbol(key): data
+        for key, data in (portfolio.get("holdings") or {}).items()
+        if data.get("quantity", 0) > 0
+    }
+
+def _prepare_portfolio(col, user_id, portfolio: Optional[Dict[str, Any]]):
+    """
+    Creates a missing portfolio, or re-keys a pre-ledger one in place.
+    """
+    if portfolio is None:
+        col.create_index("user_id", unique=True)
+        try:
+            col.insert_one({"user_id": user_id, "holdings": {}, "cash": STARTING_CASH, "ledger_version": LEDGER_VERSION})
+        except DuplicateKeyError:
+            pass # Created by a concurrent order
+        return
+
+    holdings = {holding_key(symbol): data for symbol, data in (portfolio.get("holdings") or {}).items()}
+    col.update_one(
+        {"_id": portfolio["_id"], "ledger_version": {"$ne": LEDGER_VERSION}},
+        {"$set": {"holdings": holdings, "ledger_version": LEDGER_VERSION}}
+    )
+
+_trade_indexes_ready = set()
+
+def _trades(col, trades_collection: str):
+    trades = col.database[trades_collection]
+    if trades_collection not in _trade_indexes_ready:
+        trades.create_index([("user_id", 1), ("executed_at", -1)])
+        trades.create_index([("user_id", 1), ("symbol", 1), ("executed_at", -1)])
+        _trade_indexes_ready.add(trades_collection)
+    return trades
+
+def _trade_doc(portfolio: Dict[str, Any], symbol: str, transaction_type: str, quantity: int, price: float, order_id: Optional[str]) -> Dict[str, Any]:
+    """
+    Trade log entry for a fill already applied to `portfolio`. Sells carry the
+    realized P&L against the average price, which a sell doesn't change.
+    """
+    position = portfolio["holdings"][holding_key(symbol)]
+    trade = {
+        "user_id": portfolio["user_id"],
+        "symbol": symbol,
+        "transaction_type": transaction_type,
+        "quantity": quantity,
+        "price": price,
+        "value": quantity * price,
+        "average_price": position["average_price"],
+        "executed_at": datetime.datetime.utcnow(),
+    }
+    if order_id:
+        trade["order_id"] = order_id
+    if transaction_type == "SELL":
+        trade["realized_pnl"] = (price - position["average_price"]) * quantity
+    return trade
+
+def _record_trade(col, portfolio: Dict[str, Any], symbol: str, transaction_type: str, quantity: int, price: float, order_id: Optional[str],
+                  trades_collection: str = "simulated_trades") -> Dict[str, Any]:
+    """
+    Appends a fill, already applied to `portfolio` (stats included), to the
+    trade log. Returns the portfolio: the fill is booked either way, so a
+    failed insert is logged rather than reported as a failed order.
+    """
+    try:
+        _trades(col, trades_collection).insert_one(_trade_doc(portfolio, symbol, transaction_type, quantity, price, order_id))
+    except Exception as e:
+        print(f"Failed to log simulated {transaction_type} of {quantity} {symbol} for user {portfolio.get('user_id')}: {e}")
+    return portfolio
+
+def _stat(name: str, increment):
+    """Pipeline expression adding `increment` to a running stat."""
+    return {"$add": [{"$ifNull": [f"$stats.{name}", 0]}, increment]}
+
+def trade_stats(portfolio: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Running trade statistics of a portfolio. A trade counts as won when a
+    sell realizes a profit against the position's average price.
+    """
+    stats = portfolio.get("stats") or {}
+    closed = stats.get("closed_trades", 0)
+    return {
+        "trades": stats.get("trades", 0),
+        "turnover": round(stats.get("turnover", 0), 2),
+        "closed_trades": closed,
+        "winning_trades": stats.get("winning_trades", 0),
+        "realized_pnl": round(stats.get("realized_pnl", 0), 2),
+        "win_rate": round(stats.get("winning_trades", 0) / closed * 100, 2) if closed else 0.0,
+    }
+
+def apply_simulated_trade(col, user_id, symbol: str, transaction_type: str, quantity: int, price: float, order_id: Optional[str] = None,
+                          trades_collection: str = "simulated_trades") -> Tuple[Optional[Dict[str, Any]], str]:
+    """
+    Applies a fill to the user's ledger with a single conditional
+    find_one_and_update, so concurrent orders (chat, WhatsApp) can neither
+    overdraw cash nor sell shares twice, and appends it to the trade log.
+    Returns the updated portfolio, or None and the reason the order was
+    rejected.
+    """
+    if quantity <= 0:
+        return None, "Quantity must be positive"
+    key = holding_key(symbol)
+    total_value = quantity * price
+
+    if transaction_type == "BUY":
+        guard = {"cash": {"$gte": total_value}}
+        # The weighted average price needs the current position, so buys use
+        # an update pipeline instead of $inc
+        old_qty = {"$ifNull": [f"$holdings.{key}.quantity", 0]}
+        old_avg = {"$ifNull": [f"$holdings.{key}.average_price", 0]}
+        new_qty = {"$add": [old_qty, quantity]}
+        update = [{"$set": {
+            "cash": {"$subtract": ["$cash", total_value]},
+            "stats.trades": _stat("trades", 1),
+            "stats.turnover": _stat("turnover", total_value),
+            f"holdings.{key}": {
+                "quantity": new_qty,
+                "average_price": {"$divide": [{"$add": [{"$multiply": [old_qty, old_avg]}, total_value]}, new_qty]},
+            },
+        }}]
+    elif transaction_type == "SELL":
+        # Average price doesn't change on sell. Realized P&L against it is
+        # booked in the same guarded write, so fill and stats move together
+        guard = {f"holdings.{key}.quantity": {"$gte": quantity}}
+        old_avg = f"$holdings.{key}.average_price"
+        update = [{"$set": {
+            "cash": {"$add": ["$cash", total_value]},
+            "stats.trades": _stat("trades", 1),
+            "stats.turnover": _stat("turnover", total_value),
+            "stats.realized_pnl": _stat("realized_pnl", {"$multiply": [{"$subtract": [price, old_avg]}, quantity]}),
+            "stats.closed_trades": _stat("closed_trades", 1),
+            "stats.winning_trades": _stat("winning_trades", {"$cond": [{"$gt": [price, old_avg]}, 1, 0]}),
+            f"holdings.{key}": {"quantity": {"$subtract": [f"$holdings.{key}.quantity", quantity]}, "average_price": old_avg},
+        }}]
+    else:
+        return None, f"Unknown transaction type: {transaction_type}"
+
+    query = {"user_id": user_id, "ledger_version": LEDGER_VERSION, **guard}
+    portfolio = col.find_one_and_update(query, update, return_document=ReturnDocument.AFTER)
+    if portfolio:
+        return _record_trade(col, portfolio, symbol, transaction_type, quantity, price, order_id, trades_collection), ""
+
+    # Rejected: either a guard failed or the portfolio needs creating/upgrading
+    current = col.find_one({"user_id": user_id})
+    if not current or current.get("ledger_version") != LEDGER_VERSION:
+        _prepare_portfolio(col, user_id, current)
+        portfolio = col.find_one_and_update(query, update, return_document=ReturnDocument.AFTER)
+        if portfolio:
+            return _record_trade(col, portfolio, symbol, transaction_type, quantity, price, order_id, trades_collection), ""
+        current = col.find_one({"user_id": user_id}) or {}
+
+    if transaction_type == "BUY":
+        return None, f"Insufficient virtual cash. Required: {total_value:.2f}, Available: {current.get('cash', 0):.2f}"
+    shares = portfolio_holdings(current).get(symbol, {}).get("quantity", 0)
+    return None, f"Insufficient shares. You have {shares} shares."
+
+def apply_simulated_basket(col, user_id, legs: List[Tuple[str, str, int, float]],
+                           trades_collection: str = "simulated_trades") -> Tuple[Optional[Dict[str, Any]], str]:
+    """
+    Applies several fills, (symbol, transaction_type, quantity, price) with at
+    most one leg per symbol, as one conditional find_one_and_update: either
+    every leg is booked or none is. Sell proceeds count towards the cash
+    needed by the buys. Realized P&L and win counts are booked in the same
+    update and the legs are logged with one insert_many.
+    Returns the updated portfolio, or None and the reason it was rejected.
+    """
+    if not legs:
+        return None, "Basket is empty"
+    symbols = [symbol for symbol, _, _, _ in legs]
+    if len(set(symbols)) != len(symbols):
+        return None, "Each symbol can appear only once in a basket"
+
+    cash_needed = 0.0
+    turnover = 0.0
+    guard = {}
+    new_holdings = {}
+    realized = []
+    wins = []
+    for symbol, transaction_type, quantity, price in legs:
+        if quantity <= 0:
+            return None, f"Quantity must be positive ({symbol})"
+        key = holding_key(symbol)
+        value = quantity * price
+        turnover += value
+        old_qty = {"$ifNull": [f"$holdings.{key}.quantity", 0]}
+        old_avg = {"$ifNull": [f"$holdings.{key}.average_price", 0]}
+        if transaction_type == "BUY":
+            cash_needed += value
+            new_qty = {"$add": [old_qty, quantity]}
+            new_holdings[f"holdings.{key}"] = {
+                "quantity": new_qty,
+                "average_price": {"$divide": [{"$add": [{"$multiply": [old_qty, old_avg]}, value]}, new_qty]},
+            }
+        elif transaction_type == "SELL":
+            cash_needed -= value
+            guard[f"holdings.{key}.quantity"] = {"$gte": quantity}
+            new_holdings[f"holdings.{key}"] = {"quantity": {"$subtract": [old_qty, quantity]}, "average_price": old_avg}
+            realized.append({"$multiply": [{"$subtract": [price, old_avg]}, quantity]})
+            wins.append({"$cond": [{"$gt": [price, old_avg]}, 1, 0]})
+        else:
+            return None, f"Unknown transaction type: {transaction_type} ({symbol})"
+
+    update = [{"$set": {
+        "cash": {"$subtract": ["$cash", cash_needed]},
+        "stats.trades": _stat("trades", len(legs)),
+        "stats.turnover": _stat("turnover", turnover),
+        "stats.realized_pnl": _stat("realized_pnl", {"$add": realized} if realized else 0),
+        "stats.closed_trades": _stat("closed_trades", len(realized)),
+        "stats.winning_trades": _stat("winning_trades", {"$add": wins} if wins else 0),
+        **new_holdings,
+    }}]
+    if cash_needed > 0:
+        guard["cash"] = {"$gte": cash_needed}
+    query = {"user_id": user_id, "ledger_version": LEDGER_VERSION, **guard}
+
+    portfolio = col.find_one_and_update(query, update, return_document=ReturnDocument.AFTER)
+    if not portfolio:
+        current = col.find_one({"user_id": user_id})
+        if not current or current.get("ledger_version") != LEDGER_VERSION:
+            _prepare_portfolio(col, user_id, current)
+            portfolio = col.find_one_and_update(query, update, return_document=ReturnDocument.AFTER)
+        if not portfolio:
+            current = col.find_one({"user_id": user_id}) or {}
+            if cash_needed > current.get("cash", 0):
+                return None, f"Insufficient virtual cash. Required: {cash_needed:.2f}, Available: {current.get('cash', 0):.2f}"
+            held = portfolio_holdings(current)
+            for symbol, transaction_type, quantity, _ in legs:
+                shares = held.get(symbol, {}).get("quantity", 0)
+                if transaction_type == "SELL" and shares < quantity:
+                    return None, f"Insufficient shares of {symbol}. You have {shares} shares."
+            return None, "Basket could not be applied, please retry"
+
+    try:
+        _trades(col, trades_collection).insert_many([
+            _trade_doc(portfolio, symbol, transaction_type, quantity, price, None)
+            for symbol, transaction_type, quantity, price in legs
+        ])
+    except Exception as e:
+        # The legs are booked; only the log entry is missing
+        print(f"Failed to log simulated basket for user {user_id}: {e}")
+    return portfolio, ""
 
+@functools.lru_cache(maxsize=None)
 def get_simulated_tools():
     """
-    Define tools for Gemini Function Calling in Simulation Mode
+    Define tools for Gemini Function Calling in Simulation Mode (built once;
+    the result is shared)
     """
     return [
         {
@@ -37,12 +300,57 @@ def get_simulated_tools():
                             "transaction_type": {"type": "STRING", "description": "BUY or SELL", "enum": ["BUY", "SELL"]},
                             "quantity": {"type": "INTEGER", "description": "Number of shares to buy/sell."},
                             "exchange": {"type": "STRING", "description": "Exchange (NSE or BSE). Default to NSE.", "enum": ["NSE", "BSE"]},
-                            "order_type": {"type": "STRING", "description": "Order type (MARKET or LIMIT). Default MARKET.", "enum": ["MARKET", "LIMIT"]},
-                            "price": {"type": "NUMBER", "description": "Limit price (required if order_type is LIMIT)."}
+                            "order_type": {"type": "STRING", "description": "Order type: MARKET, LIMIT, SL (stop-limit) or SL-M (stop-market). Default MARKET. Non-MARKET orders stay pending until the price reaches them.", "enum": ["MARKET", "LIMIT", "SL", "SL-M"]},
+                            "price": {"type": "NUMBER", "description": "Limit price (required if order_type is LIMIT or SL)."},
+                            "trigger_price": {"type": "NUMBER", "description": "Stop trigger price (required if order_type is SL or SL-M)."}
                         },
                         "required": ["tradingsymbol", "transaction_type", "quantity"]
                     }
                 },
+                {
+                    "name": "place_basket_order",
+                    "description": "Place several SIMULATED market orders at once (e.g. to build a goal portfolio or rebalance). All legs fill together or none do; sells fund buys.",
+                    "parameters": {
+                        "type": "OBJECT",
+                        "properties": {
+                            "orders": {
+                                "type": "ARRAY",
+                                "description": "The legs, at most one per symbol.",
+                                "items": {
+                                    "type": "OBJECT",
+                                    "properties": {
+                                        "tradingsymbol": {"type": "STRING", "description": "The stock symbol (e.g., RELIANCE, TCS, INFY)."},
+                                        "transaction_type": {"type": "STRING", "description": "BUY or SELL", "enum": ["BUY", "SELL"]},
+                                        "quantity": {"type": "INTEGER", "description": "Number of shares to buy/sell."}
+                                    },
+                                    "required": ["tradingsymbol", "transaction_type", "quantity"]
+                                }
+                            }
+                        },
+                        "required": ["orders"]
+                    }
+                },
+                {
+                    "name": "get_orders",
+                    "description": "List the user's SIMULATED orders, including pending LIMIT/stop orders.",
+                    "parameters": {
+                        "type": "OBJECT",
+                        "properties": {
+                            "pending_only": {"type": "BOOLEAN", "description": "Only return orders that are still pending."}
+                        },
+                    }
+                },
+                {
+                    "name": "cancel_order",
+                    "description": "Cancel a pending SIMULATED order.",
+                    "parameters": {
+                        "type": "OBJECT",
+                        "properties": {
+                            "order_id": {"type": "STRING", "description": "The order_id returned when the order was placed."}
+                        },
+                        "required": ["order_id"]
+                    }
+                },
                 {
                     "name": "get_stock_info",
                     "description": "Get real-time stock information (price, change, etc).",
@@ -103,9 +411,10 @@ def get_simulated_tools():
         }
     ]
 
-def place_simulated_order(user_id, tradingsymbol: str, transaction_type: str, quantity: int, price: float = 0, exchange: str = "NSE", order_type: str = "MARKET") -> Dict[str, Any]:
+def place_simulated_order(user_id, tradingsymbol: str, transaction_type: str, quantity: int, price: float = 0, exchange: str = "NSE", order_type: str = "MARKET", trigger_price: float = 0) -> Dict[str, Any]:
     """
-    Place a simulated order
+    Place a simulated order. MARKET orders fill immediately; LIMIT, SL and
+    SL-M orders are queued in the order book until a quote reaches them.
     """
     try:
         db = get_mongo_db()
@@ -115,6 +424,13 @@ def place_simulated_order(user_id, tradingsymbol: str, transaction_type: str, qu
         symbol = tradingsymbol.upper()
         if not symbol.endswith('.NS') and not symbol.endswith('.BO'):
             symbol = f"{symbol}.NS" # Default to NSE
+
+        error = instruments.validate_order(symbol[:-3], 'BSE' if symbol.endswith('.BO') else 'NSE', quantity)
+        if error:
+            return {"success": False, "message": error}
+
+        if order_type in order_book.PENDING_ORDER_TYPES:
+            return order_book.submit_order(user_id, symbol, transaction_type, quantity, order_type, price, trigger_price)
             
         # Get current price if MARKET order
         current_price = price
@@ -127,57 +443,15 @@ def place_simulated_order(user_id, tradingsymbol: str, transaction_type: str, qu
         if not current_price:
              return {"success": False, "message": f"Could not determine price for {symbol}"}
 
-        # Find user portfolio
-        portfolio = col.find_one({"user_id": user_id})
-        if not portfolio:
-            portfolio = {"user_id": user_id, "holdings": {}, "cash": 1000000} # Start with 10L virtual cash
-            
-        holdings = portfolio.get("holdings", {})
-        cash = portfolio.get("cash", 1000000)
-        
         total_value = quantity * current_price
+
+        portfolio, error = apply_simulated_trade(col, user_id, symbol, transaction_type, quantity, current_price)
+        if portfolio is None:
+            return {"success": False, "message": error}
+        cash = portfolio["cash"]
         
-        if transaction_type == "BUY":
-            if cash < total_value:
-                return {"success": False, "message": f"Insufficient virtual cash. Required: {total_value:.2f}, Available: {cash:.2f}"}
-            
-            # Update holdings
-            current_holding = holdings.get(symbol, {"quantity": 0, "average_price": 0})
-            old_qty = current_holding["quantity"]
-            old_avg = current_holding["average_price"]
-            
-            new_qty = old_qty + quantity
-            new_avg = ((old_qty * old_avg) + (quantity * current_price)) / new_qty
-            
-            holdings[symbol] = {"quantity": new_qty, "average_price": new_avg}
-            cash -= total_value
-            
-        elif transaction_type == "SELL":
-            current_holding = holdings.get(symbol)
-            if not current_holding or current_holding["quantity"] < quantity:
-                return {"success": False, "message": f"Insufficient shares. You have {current_holding['quantity'] if current_holding else 0} shares."}
-            
-            new_qty = current_holding["quantity"] - quantity
-            if new_qty == 0:
-                del holdings[symbol]
-            else:
-                holdings[symbol]["quantity"] = new_qty
-                # Average price doesn't change on sell
-            
-            cash += total_value
-            
-        # Save to DB
-        col.update_one(
-            {"user_id": user_id},
-            {"$set": {"holdings": holdings, "cash": cash}},
-            upsert=True
-        )
-        
-        # Sync with Leaderboard
-        try:
-            update_leaderboard_snapshot(user_id, cash, holdings)
-        except Exception as e:
-            print(f"Failed to update leaderboard: {e}")
+        # Sync with Leaderboard, off the order path
+        portfolio_valuation.schedule_snapshot_update(user_id)
         
         return {
             "success": True, 
@@ -194,71 +468,85 @@ def place_simulated_order(user_id, tradingsymbol: str, transaction_type: str, qu
     except Exception as e:
         return {"success": False, "message": f"Simulation error: {str(e)}"}
 
-def update_leaderboard_snapshot(user_id, cash, holdings):
+def place_simulated_basket(user_id, orders: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
-    Updates the SQL LeaderboardSnapshot based on Mongo Portfolio
+    Place simulated market orders for several symbols as one basket: all legs
+    are priced with one batched quote download and booked in one atomic
+    ledger update.
+    orders: dicts with tradingsymbol, transaction_type and quantity.
     """
-    from .models import LeaderboardSnapshot, StockData
-    from django.contrib.auth.models import User
-    
     try:
-        user = User.objects.get(id=user_id)
-    except User.DoesNotExist:
-        return
+        legs = []
+        for order in orders:
+            symbol = str(order.get("tradingsymbol", "")).upper()
+            if not symbol:
+                return {"success": False, "message": "Every order needs a tradingsymbol"}
+            if not symbol.endswith('.NS') and not symbol.endswith('.BO'):
+                symbol = f"{symbol}.NS" # Default to NSE
+            try:
+                quantity = int(order.get("quantity", 0))
+            except (TypeError, ValueError):
+                return {"success": False, "message": f"Invalid quantity for {symbol}"}
+            error = instruments.validate_order(symbol[:-3], 'BSE' if symbol.endswith('.BO') else 'NSE', quantity)
+            if error:
+                return {"success": False, "message": error}
+            legs.append((symbol, str(order.get("transaction_type", "")).upper(), quantity))
+
+        quotes = market_tools.get_quotes([symbol for symbol, _, _ in legs])
+        unpriced = [symbol for symbol, _, _ in legs if not quotes.get(symbol)]
+        if unpriced:
+            return {"success": False, "message": f"Could not fetch price for {', '.join(unpriced)}"}
+
+        priced = [(symbol, transaction_type, quantity, quotes[symbol]) for symbol, transaction_type, quantity in legs]
+        portfolio, error = apply_simulated_basket(get_mongo_db()['simulated_portfolios'], user_id, priced)
+        if portfolio is None:
+            return {"success": False, "message": error}
+
+        # Sync with Leaderboard, off the order path
+        portfolio_valuation.schedule_snapshot_update(user_id)
+
+        return {
+            "success": True,
+            "message": f"Simulated basket of {len(priced)} orders placed",
+            "details": {
+                "orders": [
+                    {"symbol": symbol, "transaction_type": transaction_type, "quantity": quantity,
+                     "price": price, "total_value": quantity * price}
+                    for symbol, transaction_type, quantity, price in priced
+                ],
+                "remaining_cash": portfolio["cash"],
+            }
+        }
+
+    except Exception as e:
+        return {"success": False, "message": f"Simulation error: {str(e)}"}
+
+def update_leaderboard_snapshot(user_id, cash, holdings, stats=None):
+    """
+    Updates the SQL LeaderboardSnapshot based on Mongo Portfolio.
+    stats: trade_stats() of the portfolio, for the win rate.
+    Prices come from one StockData query, with a single batched quote
+    download for symbols it cannot price.
+    """
+    from .models import LeaderboardSnapshot
+    from django.contrib.auth.models import User
+    from django.utils import timezone
+
+    open_positions = {symbol: data["quantity"] for symbol, data in holdings.items() if data["quantity"] > 0}
+    prices, sectors = portfolio_valuation.price_lookup(open_positions)
 
     # Calculate Total Value
-    total_value = cash
-    unique_sectors = set()
-    
-    for symbol, data in holdings.items():
-        qty = data['quantity']
-        if qty > 0:
-            # Get current price
-            price = 0
-            sector = "Unknown"
-            
-            # Try to get from StockData DB first (faster)
-            stock_obj = StockData.objects.filter(symbol=symbol).first()
-            if stock_obj:
-                price = float(stock_obj.current_price or 0)
-                sector = stock_obj.sector or "Unknown"
-            else:
-                # Fallback to live fetch
-                info = market_tools.get_stock_info(symbol)
-                price = info.get('current_price', 0)
-                # We don't have sector in live fetch easily without extra API calls, 
-                # so we might miss it if not in DB.
-            
-            total_value += (qty * price)
-            if sector and sector != "Unknown":
-                unique_sectors.add(sector)
-            else:
-                # If sector unknown, use symbol as proxy for diversification (weak proxy)
-                unique_sectors.add(symbol)
-
-    # Calculate Diversification Score (0-100)
-    # Simple logic: 10 points per unique sector, max 100
-    div_score = min(len(unique_sectors) * 10, 100)
-    
-    # Calculate Win Rate (Placeholder for now as we don't track closed trades history yet)
-    # We'll use "Profitable Current Positions" as a proxy
-    profitable_pos = 0
-    total_pos = 0
-    for symbol, data in holdings.items():
-        qty = data['quantity']
-        if qty > 0:
-            avg = data['average_price']
-            # Get price again (optimization: cache it above)
-            # For now, just re-fetch or assume price is roughly same as above loop
-            # Let's just use a simple heuristic if we don't want to re-fetch
-            pass 
-            
+    total_value = cash + sum(qty * prices.get(symbol, 0) for symbol, qty in open_positions.items())
+    # Calculate Diversification Score (0-100); unknown sectors count per symbol
+    div_score = float(portfolio_valuation.diversification_scores(len({sectors[symbol] for symbol in open_positions})))
+
     # Update Snapshot
-    snapshot, created = LeaderboardSnapshot.objects.get_or_create(user=user)
-    snapshot.total_value = total_value
-    snapshot.diversification_score = div_score
-    # snapshot.win_rate = ... # Keep existing or update if we implement logic
-    snapshot.save()
+    fields = {"total_value": round(total_value, 2), "diversification_score": div_score}
+    if stats is not None:
+        fields["win_rate"] = stats["win_rate"]
+    if not LeaderboardSnapshot.objects.filter(user_id=user_id).update(last_updated=timezone.now(), **fields):
+        if User.objects.filter(id=user_id).exists():
+            LeaderboardSnapshot.objects.create(user_id=user_id, **fields)
 
 def get_simulated_holdings(user_id) -> Dict[str, Any]:
     """
@@ -273,7 +561,7 @@ def get_simulated_holdings(user_id) -> Dict[str, Any]:
              return {"success": True, "holdings": [], "message": "No simulated holdings found. You have 1,000,000 virtual cash."}
              
         holdings_data = []
-        holdings_dict = portfolio.get("holdings", {})
+        holdings_dict = portfolio_holdings(portfolio)
         
         for symbol, data in holdings_dict.items():
             # Fetch current price for P&L
@@ -305,6 +593,7 @@ def get_simulated_holdings(user_id) -> Dict[str, Any]:
             "success": True,
             "holdings": holdings_data,
             "cash": portfolio.get("cash"),
+            "stats": trade_stats(portfolio),
             "message": f"Retrieved {len(holdings_data)} simulated holdings"
         }
         
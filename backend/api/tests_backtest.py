@@ -0,0 +1,287 @@
+import json
+import os
+import tempfile
+from unittest.mock import patch, MagicMock
+import numpy as np
+import pandas as pd
+from django.test import TestCase, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from api import backtest_service
+from api.backtester import BacktestEngine, iter_csv_bars, run_chunked
+from api.factor_backtester import run_factor_strategy
+from api.cache import TTLCache
+from benchmarks.synthetic import gbm_bars, gbm_closes
+
+
+def make_history(periods=300, seed=7):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start='2023-01-01', periods=periods)
+    close = np.linspace(100, 200, periods) + rng.standard_normal(periods) * 5
+    return pd.DataFrame({
+        'Open': close, 'High': close, 'Low': close, 'Close': close,
+        'Volume': rng.integers(1000, 10000, periods),
+    }, index=dates)
+
+
+class TTLCacheTests(TestCase):
+    """Test cases for the shared LRU/TTL cache"""
+
+    def test_evicts_least_recently_used(self):
+        """Test that the oldest untouched entry is evicted when full"""
+        cache = TTLCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(len(cache), 2)
+
+    def test_expires_entries(self):
+        """Test that entries older than the TTL are dropped"""
+        cache = TTLCache(maxsize=2, ttl=10)
+        with patch('api.cache.time.monotonic', return_value=100.0):
+            cache.set('a', 1)
+        with patch('api.cache.time.monotonic', return_value=105.0):
+            self.assertEqual(cache.get('a'), 1)
+        with patch('api.cache.time.monotonic', return_value=111.0):
+            self.assertIsNone(cache.get('a'))
+
+    def test_serves_stale_entries_within_grace(self):
+        """Test that expired entries stay readable as stale until stale_ttl passes"""
+        cache = TTLCache(maxsize=2, ttl=10, stale_ttl=20)
+        with patch('api.cache.time.monotonic', return_value=100.0):
+            cache.set('a', 1)
+        with patch('api.cache.time.monotonic', return_value=105.0):
+            self.assertEqual(cache.get_stale('a'), (1, True))
+        with patch('api.cache.time.monotonic', return_value=125.0):
+            self.assertIsNone(cache.get('a'))
+            self.assertEqual(cache.get_stale('a'), (1, False))
+        with patch('api.cache.time.monotonic', return_value=131.0):
+            self.assertEqual(cache.get_stale('a'), (None, False))
+
+
+class BacktestCacheTests(TestCase):
+    """Test cases for backtest result caching"""
+
+    def setUp(self):
+        backtest_service.clear_cache()
+        self.history = make_history()
+        ticker = MagicMock()
+        ticker.history.side_effect = lambda period: self.history
+        patcher = patch('api.backtest_service.yf.Ticker', return_value=ticker)
+        self.mock_ticker = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(backtest_service.clear_cache)
+
+    def test_identical_requests_hit_cache(self):
+        """Test that equivalent parameters reuse the first result"""
+        with patch.object(backtest_service, 'run_strategy', wraps=backtest_service.run_strategy) as run:
+            first = backtest_service.run_backtest('TCS', 'sma', {'short_window': '10', 'long_window': 50})
+            second = backtest_service.run_backtest('TCS.NS', 'sma', {'long_window': 50, 'short_window': 10})
+        self.assertIs(first, second)
+        self.assertEqual(run.call_count, 1)
+        self.assertEqual(self.mock_ticker.call_count, 1)
+
+    def test_new_bar_invalidates_result(self):
+        """Test that a new bar produces a fresh result"""
+        first = backtest_service.run_backtest('TCS', 'rsi', {})
+        backtest_service._history_cache.clear()
+        self.history = make_history(periods=301)
+        second = backtest_service.run_backtest('TCS', 'rsi', {})
+        self.assertIsNot(first, second)
+        self.assertEqual(len(second['equity_curve']), 301)
+
+    def test_unknown_strategy(self):
+        """Test that unknown strategies are rejected before fetching data"""
+        with self.assertRaises(ValueError):
+            backtest_service.run_backtest('TCS', 'macd', {})
+        self.mock_ticker.assert_not_called()
+
+
+class LowMemoryEngineTests(TestCase):
+    """Test cases for the array-based low-memory engine mode"""
+
+    def setUp(self):
+        self.data = gbm_bars(3000, seed=11, sigma=0.6)
+
+    def test_close_is_a_read_only_view(self):
+        """Test that low-memory mode neither copies nor mutates the input"""
+        engine = BacktestEngine(self.data, low_memory=True)
+        self.assertTrue(np.shares_memory(engine.close, self.data['Close'].to_numpy()))
+        self.assertFalse(engine.close.flags.writeable)
+        self.assertIsNone(engine.data)
+
+    def test_matches_dataframe_mode(self):
+        """Test that both modes produce identical results"""
+        default = BacktestEngine(self.data)
+        low_memory = BacktestEngine(self.data, low_memory=True)
+        self.assertEqual(default.run_sma_strategy(10, 40), low_memory.run_sma_strategy(10, 40))
+        self.assertEqual(default.run_rsi_strategy(5, 60, 40), low_memory.run_rsi_strategy(5, 60, 40))
+
+    def test_float32_keeps_trades(self):
+        """Test that float32 precision yields the same trade sequence"""
+        default = BacktestEngine(self.data).run_rsi_strategy()
+        reduced = BacktestEngine(self.data, low_memory=True, dtype=np.float32).run_rsi_strategy()
+        self.assertEqual([t['date'] for t in default['trades']], [t['date'] for t in reduced['trades']])
+        self.assertAlmostEqual(default['metrics']['total_return'], reduced['metrics']['total_return'], places=1)
+
+    def test_dtype_needs_low_memory(self):
+        """Test that dtype is refused instead of ignored in DataFrame mode"""
+        with self.assertRaises(ValueError):
+            BacktestEngine(self.data, dtype=np.float32)
+
+    def test_equity_curve_points_are_built_when_serialized(self):
+        """Test that the curve is kept as arrays and renders the same points"""
+        curve = BacktestEngine(self.data, low_memory=True).run_sma_strategy(10, 40)['equity_curve']
+        self.assertEqual(len(curve.equity), len(self.data))
+        self.assertTrue(np.shares_memory(curve.price, self.data['Close'].to_numpy()))
+        rendered = JSONRenderer().render({'equity_curve': curve})
+        self.assertEqual(json.loads(rendered)['equity_curve'], list(curve))
+        self.assertEqual(curve[-1], {'date': self.data.index[-1].strftime('%Y-%m-%d'),
+                                     'equity': float(curve.equity[-1]), 'price': float(self.data['Close'].iloc[-1])})
+
+
+class ChunkedBacktestTests(TestCase):
+    """Test cases for chunked execution over streamed bars"""
+
+    def setUp(self):
+        self.data = gbm_bars(5000, freq='min', seed=5, sigma=0.8)
+        self.sma = {'short_window': 20, 'long_window': 120}
+        self.rsi = {'period': 14, 'overbought': 60, 'oversold': 40}
+
+    def blocks(self, size):
+        return (self.data.iloc[i:i + size] for i in range(0, len(self.data), size))
+
+    def test_matches_in_memory_run(self):
+        """Test that block boundaries do not change indicators, trades or equity"""
+        engine = BacktestEngine(self.data, low_memory=True)
+        sma = engine.run_sma_strategy(**self.sma)
+        rsi = engine.run_rsi_strategy(**self.rsi)
+        for size in (1, 97, 1000, 10000):
+            self.assertEqual(run_chunked(self.blocks(size), 'sma', self.sma), sma)
+            self.assertEqual(run_chunked(self.blocks(size), 'rsi', self.rsi), rsi)
+
+    def test_sampled_equity_curve_keeps_last_bar(self):
+        """Test that curve_every thins the curve but keeps the final point"""
+        full = run_chunked(self.blocks(700), 'sma', self.sma)
+        sampled = run_chunked(self.blocks(700), 'sma', self.sma, curve_every=7)
+        self.assertEqual(sampled['metrics'], full['metrics'])
+        self.assertEqual(sampled['equity_curve'][:-1], full['equity_curve'][:-1:7])
+        self.assertEqual(sampled['equity_curve'][-1], full['equity_curve'][-1])
+
+    def test_equity_curve_is_capped(self):
+        """Test that max_points keeps a regularly thinned curve of bounded size"""
+        full = run_chunked(self.blocks(333), 'sma', self.sma)
+        capped = run_chunked(self.blocks(333), 'sma', self.sma, curve_every=2, max_points=300)
+        self.assertEqual(capped['metrics'], full['metrics'])
+        self.assertLessEqual(len(capped['equity_curve']), 301)
+        self.assertEqual(capped['equity_curve'][:-1], full['equity_curve'][:-1:32])
+        self.assertEqual(capped['equity_curve'][-1], full['equity_curve'][-1])
+
+    def test_intraday_backtest_from_csv(self):
+        """Test that stored minute bars stream from disk and match a full read"""
+        with tempfile.TemporaryDirectory() as tmp:
+            os.makedirs(os.path.join(tmp, '1m'))
+            path = os.path.join(tmp, '1m', 'TCS.NS.csv')
+            self.data.to_csv(path, index_label='Datetime')
+            with override_settings(BARS_DATA_DIR=tmp, INTRADAY_CHUNK_ROWS=333):
+                chunks = []
+                results = backtest_service.run_intraday_backtest('tcs', 'rsi', self.rsi, on_chunk=chunks.append)
+                missing = backtest_service.run_intraday_backtest('INFY', 'rsi', self.rsi)
+            expected = BacktestEngine(pd.read_csv(path, index_col=0, parse_dates=True), low_memory=True,
+                                      date_format='%Y-%m-%d %H:%M').run_rsi_strategy(**self.rsi)
+            self.assertEqual(len(next(iter_csv_bars(path, chunksize=100)).columns), 1)
+        self.assertEqual(results, expected)
+        self.assertEqual(chunks[-1], len(self.data))
+        self.assertIsNone(missing)
+        with self.assertRaises(ValueError):
+            backtest_service.bars_path('../secrets', '1m')
+
+
+def make_universe(dates=400, names=12):
+    return pd.DataFrame(
+        np.column_stack([gbm_closes(dates, sigma=0.4, seed=seed) for seed in range(names)]),
+        index=pd.bdate_range('2022-01-03', periods=dates),
+        columns=[f"S{i}" for i in range(names)],
+    )
+
+
+class FactorBacktestTests(TestCase):
+    """Test cases for cross-sectional factor backtests"""
+
+    def setUp(self):
+        backtest_service.clear_cache()
+        self.addCleanup(backtest_service.clear_cache)
+        self.prices = make_universe()
+
+    def test_matches_per_period_loop(self):
+        """Test ranking and equity against a straightforward loop"""
+        results = run_factor_strategy(self.prices, 'momentum', lookback=60, skip=5, top_n=3, bottom_n=2, rebalance=20)
+        close = self.prices.to_numpy()
+        equity = [100000.0] * len(close)
+        value = 100000.0
+        starts = list(range(60, len(close), 20))
+        for k, start in enumerate(starts):
+            scores = close[start - 5] / close[start - 60] - 1
+            ranked = [str(self.prices.columns[j]) for j in np.argsort(scores)]
+            self.assertEqual(sorted(results['rebalances'][k]['long']), sorted(ranked[-3:]))
+            self.assertEqual(sorted(results['rebalances'][k]['short']), sorted(ranked[:2]))
+            weights = np.zeros(close.shape[1])
+            weights[np.argsort(scores)[-3:]] = 1 / 3
+            weights[np.argsort(scores)[:2]] = -1 / 2
+            end = starts[k + 1] if k + 1 < len(starts) else len(close) - 1
+            for t in range(start + 1, end + 1):
+                equity[t] = value * (1 + np.sum(weights * (close[t] / close[start] - 1)))
+            value = equity[end]
+        np.testing.assert_allclose([p['equity'] for p in results['equity_curve']], equity, rtol=1e-12)
+
+    def test_unlisted_names_are_not_picked(self):
+        """Test that names without enough history never enter the portfolio"""
+        self.prices.iloc[:300, 0] = np.nan
+        results = run_factor_strategy(self.prices, 'mean_reversion', lookback=5, top_n=4, rebalance=5)
+        early = [r for r in results['rebalances'] if r['date'] < '2023-03-01']
+        self.assertTrue(early)
+        self.assertTrue(all('S0' not in r['long'] for r in early))
+        self.assertTrue(all(r['turnover'] <= 1 for r in results['rebalances']))
+
+    @patch('api.backtest_service.yf.download')
+    def test_factor_endpoint_downloads_universe_once(self, download):
+        """Test that the endpoint ranks the whole universe from one cached download"""
+        prices = make_universe(names=len(backtest_service.NIFTY_50_SYMBOLS))
+        prices.columns = [f"{s}.NS" for s in backtest_service.NIFTY_50_SYMBOLS]
+        download.return_value = pd.concat({'Close': prices}, axis=1)
+        client = APIClient()
+        for _ in range(2):
+            resp = client.post('/api/backtest/factor/', {'strategy': 'momentum', 'parameters': {'top_n': 5}}, format='json')
+            self.assertEqual(resp.status_code, 200)
+        self.assertEqual(download.call_count, 1)
+        self.assertEqual(len(resp.json()['rebalances'][0]['long']), 5)
+        self.assertNotIn('.NS', resp.json()['rebalances'][0]['long'][0])
+        bad = client.post('/api/backtest/factor/', {'strategy': 'value'}, format='json')
+        self.assertEqual(bad.status_code, 400)
+
+    @override_settings(FACTOR_MAX_SYMBOLS=3)
+    @patch('api.backtest_service.yf.download')
+    def test_factor_endpoint_validates_symbols(self, download):
+        """Test that symbols must be a short list of ticker strings before anything is downloaded"""
+        client = APIClient()
+        for symbols in ('TCS', {'a': 1}, ['TCS', 7], ['A', 'B', 'C', 'D'], ['TCS', '../x']):
+            resp = client.post('/api/backtest/factor/', {'strategy': 'momentum', 'symbols': symbols}, format='json')
+            self.assertEqual(resp.status_code, 400, symbols)
+        download.assert_not_called()
+        self.assertEqual(backtest_service.normalize_symbols(['tcs', 'INFY.NS', 'TCS']), ('INFY.NS', 'TCS.NS'))
+
+
+class SyntheticDataTests(TestCase):
+    """Test cases for the benchmark data generator"""
+
+    def test_gbm_bars_are_reproducible(self):
+        """Test that a seed always yields the same well-formed bars"""
+        first = gbm_bars(1000, seed=3)
+        second = gbm_bars(1000, seed=3)
+        pd.testing.assert_frame_equal(first, second)
+        self.assertTrue((first['High'] >= first[['Open', 'Close']].max(axis=1)).all())
+        self.assertTrue((first['Low'] <= first[['Open', 'Close']].min(axis=1)).all())
+        self.assertTrue((first['Close'] > 0).all())
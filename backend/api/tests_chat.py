@@ -0,0 +1,218 @@
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from bson import ObjectId
+from api import chat_history, chat_service, gemini
+from api.models import UserProfile
+
+
+def chunk(*parts):
+    return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=list(parts)))])
+
+
+def text_response(*deltas):
+    """A streamed text reply, one chunk per delta."""
+    return [chunk(SimpleNamespace(function_call=None, text=delta)) for delta in deltas]
+
+
+@override_settings(GEMINI_API_KEY='test-key')
+class GeminiModelCacheTests(TestCase):
+    """Test cases for the process-wide Gemini models"""
+
+    def setUp(self):
+        gemini.reset()
+        self.addCleanup(gemini.reset)
+        self.user = User.objects.create_user('trader', password='x')
+        UserProfile.objects.create(user=self.user, bio='Retired teacher, cautious investor')
+
+    @patch('google.generativeai.configure')
+    @patch('google.generativeai.GenerativeModel')
+    def test_messages_share_one_model_per_mode(self, model_cls, configure):
+        """Test that chats reuse the model for their mode and keep the bio in the history"""
+        model_cls.return_value.start_chat.return_value.send_message.return_value = text_response('Hi')
+        for _ in range(3):
+            events = list(chat_service.process_chat_message(self.user, 'Hello', mode='real'))
+        self.assertEqual(events[-2], 'data: Hi\n\n')
+        configure.assert_called_once_with(api_key='test-key')
+        model_cls.assert_called_once()
+        _, kwargs = model_cls.call_args
+        self.assertIs(kwargs['tools'], chat_service.get_gemini_tools())
+        self.assertNotIn('Retired teacher', kwargs['system_instruction'])
+        history = model_cls.return_value.start_chat.call_args.kwargs['history']
+        self.assertIn('Retired teacher', history[0]['parts'][0])
+
+        list(chat_service.process_chat_message(self.user, 'Hello', mode='simulation'))
+        self.assertEqual(model_cls.call_count, 2)
+
+    @patch('google.generativeai.configure')
+    @patch('google.generativeai.GenerativeModel', side_effect=lambda *args, **kwargs: MagicMock())
+    def test_models_are_keyed_by_name_and_instruction(self, model_cls, configure):
+        """Test that a different system instruction builds a separate model"""
+        plain = gemini.get_model()
+        self.assertIs(gemini.get_model(), plain)
+        self.assertIsNot(gemini.get_model('plain', system_instruction='Be brief.'), plain)
+        self.assertEqual(model_cls.call_count, 2)
+        configure.assert_called_once()
+
+
+def call_response(*calls):
+    return [chunk(*[SimpleNamespace(function_call=SimpleNamespace(name=name, args=args), text='') for name, args in calls])]
+
+
+@override_settings(GEMINI_API_KEY='test-key', CHAT_MAX_TOOL_ROUNDS=2)
+class ToolLoopTests(TestCase):
+    """Test cases for running the model's function calls"""
+
+    def setUp(self):
+        gemini.reset()
+        self.addCleanup(gemini.reset)
+        self.user = User.objects.create_user('trader', password='x')
+
+    def chat(self, *responses):
+        model = MagicMock()
+        send = model.start_chat.return_value.send_message
+        send.side_effect = list(responses)
+        with patch('api.gemini.get_model', return_value=model):
+            events = list(chat_service.process_chat_message(self.user, 'Compare RELIANCE, TCS and INFY', mode='real'))
+        return events, send
+
+    @patch('api.market_tools.get_stock_info')
+    def test_calls_in_one_turn_run_concurrently(self, get_stock_info):
+        """Test that all calls of a turn run in parallel and go back in one message"""
+        barrier = threading.Barrier(3, timeout=5)
+
+        def info(symbol):
+            barrier.wait()  # only returns once all three calls are running
+            return {'success': True, 'symbol': symbol}
+        get_stock_info.side_effect = info
+
+        events, send = self.chat(
+            call_response(*[('get_stock_info', {'symbol': s}) for s in ('RELIANCE', 'TCS', 'INFY')]),
+            text_response('TCS looks best.'),
+        )
+        self.assertEqual(send.call_count, 2)
+        responses = send.call_args.args[0]
+        self.assertEqual([r['function_response']['response']['symbol'] for r in responses], ['RELIANCE', 'TCS', 'INFY'])
+        self.assertEqual(sum(e.startswith('data: [STOCKS]') for e in events), 3)
+        self.assertEqual(events[-2], 'data: TCS looks best.\n\n')
+        self.assertTrue(all(c.kwargs.get('stream') for c in send.call_args_list))
+
+    @patch('api.kite_tools.place_order')
+    def test_order_calls_run_in_emitted_order(self, place_order):
+        """Test that two orders in one turn are placed one after the other, in order"""
+        placed = []
+        running = threading.Lock()
+
+        def place(user, **args):
+            self.assertTrue(running.acquire(blocking=False), 'orders overlapped')
+            time.sleep(0.05)
+            placed.append(args['tradingsymbol'])
+            running.release()
+            return {'status': 'success', 'order_id': args['tradingsymbol']}
+        place_order.side_effect = place
+
+        sell = ('place_order', {'tradingsymbol': 'INFY', 'exchange': 'NSE', 'transaction_type': 'SELL', 'quantity': 5})
+        buy = ('place_order', {'tradingsymbol': 'TCS', 'exchange': 'NSE', 'transaction_type': 'BUY', 'quantity': 2})
+        _, send = self.chat(call_response(sell, buy), text_response('Done.'))
+        self.assertEqual(placed, ['INFY', 'TCS'])
+        self.assertEqual([r['function_response']['response']['order_id'] for r in send.call_args.args[0]], ['INFY', 'TCS'])
+
+    @patch('api.market_tools.get_market_movers', return_value={'success': False})
+    def test_tool_rounds_are_bounded(self, get_market_movers):
+        """Test that a model that keeps calling tools is stopped after CHAT_MAX_TOOL_ROUNDS"""
+        movers = ('get_market_movers', {})
+        events, send = self.chat(call_response(movers), call_response(movers), call_response(movers))
+        self.assertEqual(get_market_movers.call_count, 2)
+        self.assertEqual(send.call_count, 3)
+        self.assertIn('more steps', events[-2])
+
+
+class StreamingTests(TestCase):
+    """Test cases for streaming replies as Server-Sent Events"""
+
+    def test_multiline_deltas_round_trip(self):
+        """Test that deltas keep their newlines and spaces through SSE framing"""
+        deltas = ['Reliance', ' is up.\n\n', '- TCS\n- INFY']
+        events = [chat_service.sse_event(d) for d in deltas]
+        self.assertEqual(events[1], 'data:  is up.\ndata: \ndata: \n\n')
+        self.assertEqual(''.join(chat_service.event_data(e) for e in events), ''.join(deltas))
+
+    @override_settings(GEMINI_API_KEY='test-key')
+    def test_deltas_are_forwarded_as_they_arrive(self):
+        """Test that each streamed chunk becomes its own event, after tool events"""
+        user = User.objects.create_user('trader', password='x')
+        model = MagicMock()
+        model.start_chat.return_value.send_message.side_effect = [
+            call_response(('get_market_movers', {})),
+            text_response('Top ', 'gainers', ' today'),
+        ]
+        with patch('api.gemini.get_model', return_value=model), \
+                patch('api.market_tools.get_market_movers', return_value={'success': True}):
+            events = list(chat_service.process_chat_message(user, 'Movers?', mode='real'))
+        self.assertTrue(events[0].startswith('data: [STOCKS]'))
+        self.assertEqual(events[1:], ['data: Top \n\n', 'data: gainers\n\n', 'data:  today\n\n', 'data: [DONE]\n\n'])
+
+
+def conversation(count, words=100):
+    """`count` alternating messages of about `words` * 1.25 tokens each."""
+    return [{'role': 'user' if i % 2 == 0 else 'assistant', 'content': f"m{i} " + 'word ' * words} for i in range(count)]
+
+
+@override_settings(CHAT_HISTORY_TOKENS=1000)
+class ChatHistoryTests(TestCase):
+    """Test cases for the token-budgeted history and rolling summary"""
+
+    def test_history_keeps_recent_messages_within_budget(self):
+        """Test that only the newest messages that fit are replayed, after the summary"""
+        messages = conversation(40)
+        history = chat_history.build_history(messages)
+        self.assertLessEqual(sum(chat_history.estimate_tokens(h['parts'][0]) for h in history), 1000)
+        self.assertTrue(history[-1]['parts'][0].startswith('m39 '))
+        self.assertEqual(history[-1]['role'], 'model')
+        # The window that fits starts on an assistant message; it is moved to the next user turn
+        self.assertEqual(chat_history.window_start(messages, 1000) % 2, 1)
+        self.assertEqual([h['role'] for h in history], ['user', 'model'] * (len(history) // 2))
+
+        summarized = chat_history.build_history(messages, 'Earlier: asked about TCS.', summary_upto=38)
+        self.assertIn('Earlier: asked about TCS.', summarized[0]['parts'][0])
+        self.assertEqual([h['parts'][0][:4] for h in summarized[2:]], ['m38 ', 'm39 '])
+
+        summarized = chat_history.build_history(messages, 'Earlier: asked about TCS.', summary_upto=37)
+        self.assertEqual([h['role'] for h in summarized], ['user', 'model', 'user', 'model'])
+
+    def test_oversized_summary_and_turns_keep_the_last_exchange(self):
+        """Test that a summary over budget is cut and the latest user turn is always sent"""
+        messages = conversation(40)
+        history = chat_history.build_history(messages, 'Earlier: ' + 'fact ' * 2000, summary_upto=20)
+        self.assertLessEqual(chat_history.estimate_tokens(history[0]['parts'][0]), 550)
+        self.assertEqual([h['parts'][0][:4] for h in history[-2:]], ['m38 ', 'm39 '])
+        self.assertLessEqual(sum(chat_history.estimate_tokens(h['parts'][0]) for h in history), 1000 + 50)
+
+        long_turns = conversation(4, words=2000)
+        history = chat_history.build_history(long_turns)
+        self.assertEqual([h['parts'][0][:3] for h in history], ['m2 ', 'm3 '])
+
+    @patch('api.chat_history.summarize', return_value='User is studying IT stocks.')
+    @patch('api.chat_history.mongo.get_db')
+    def test_summary_folds_only_messages_leaving_the_window(self, get_db, summarize):
+        """Test that the summary is updated incrementally and the write is guarded"""
+        col = get_db.return_value.__getitem__.return_value
+        _id = ObjectId()
+        col.find_one.return_value = {'_id': _id, 'messages': conversation(6)}
+        self.assertFalse(chat_history.update_summary(str(_id)))
+        summarize.assert_not_called()
+
+        col.find_one.return_value = {'_id': _id, 'messages': conversation(20), 'summary': 'Old.', 'summary_upto': 4}
+        chat_history.update_summary(str(_id))
+        previous, folded = summarize.call_args.args
+        self.assertEqual(previous, 'Old.')
+        self.assertTrue(folded[0]['content'].startswith('m4 '))
+        query, update = col.update_one.call_args.args
+        self.assertEqual(query['summary_upto'], 4)
+        new_upto = update['$set']['summary_upto']
+        self.assertEqual(new_upto, 4 + len(folded))
+        # What is left fits in half the budget, so the next few turns need no update
+        self.assertLessEqual(sum(chat_history.estimate_tokens(m['content']) for m in conversation(20)[new_upto:]), 500)
@@ -0,0 +1,74 @@
+import threading
+from unittest.mock import patch
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from api import jobs
+
+
+def fake_backtest(symbol, strategy, params, period):
+    return {'metrics': {'total_return': float(params.get('short_window', 0)), 'final_equity': 0, 'total_trades': 0}}
+
+
+@patch('api.jobs.backtest_service.run_backtest', side_effect=fake_backtest)
+class BacktestJobTests(TestCase):
+    """Test cases for the background backtest job queue"""
+
+    def test_sweep_streams_partial_results(self, _run):
+        """Test that a sweep reports every combination and ranks them"""
+        job = jobs.submit('owner-sweep', 'sweep', {'strategy': 'sma', 'grid': {'short_window': [5, 20, 10]}})
+        frames = ''.join(jobs.stream_events(job))
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(frames.count('event: progress'), 3)
+        self.assertIn('event: done', frames)
+        self.assertEqual(job.result['best']['parameters']['short_window'], 20)
+
+    def test_resume_from_last_event_id(self, _run):
+        """Test that reconnecting clients only receive newer events"""
+        job = jobs.submit('owner-resume', 'backtest', {'symbol': 'TCS'})
+        all_frames = list(jobs.stream_events(job))
+        resumed = list(jobs.stream_events(job, last_event_id=len(job.events) - 1))
+        self.assertEqual(resumed, all_frames[-1:])
+
+    @override_settings(BACKTEST_JOBS_PER_USER=1)
+    def test_per_user_limit(self, _run):
+        """Test that a user cannot queue more than their concurrent limit"""
+        release = threading.Event()
+
+        def blocking_backtest(*args):
+            release.wait(5)
+            return fake_backtest(*args)
+
+        _run.side_effect = blocking_backtest
+        job = jobs.submit('owner-limit', 'backtest', {})
+        try:
+            with self.assertRaises(jobs.JobLimitError):
+                jobs.submit('owner-limit', 'backtest', {})
+            other = jobs.submit('someone-else', 'backtest', {})
+        finally:
+            release.set()
+        list(jobs.stream_events(job))
+        list(jobs.stream_events(other))
+        self.assertEqual(other.status, 'done')
+
+    def test_job_endpoints(self, _run):
+        """Test submit, events and status endpoints"""
+        client = APIClient()
+        resp = client.post('/api/backtest/jobs/', {'kind': 'backtest', 'symbol': 'TCS'}, format='json')
+        self.assertEqual(resp.status_code, 202)
+        job_id = resp.json()['id']
+
+        events = client.get(f'/api/backtest/jobs/{job_id}/events/', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(events.status_code, 200)
+        self.assertIn('event: done', b''.join(events.streaming_content).decode())
+
+        status = client.get(f'/api/backtest/jobs/{job_id}/')
+        self.assertEqual(status.json()['status'], 'done')
+        self.assertEqual(client.get('/api/backtest/jobs/missing/').status_code, 404)
+
+    def test_intraday_rejects_bad_curve_every(self, _run):
+        """Test that a curve_every below 1 is refused at submit time"""
+        client = APIClient()
+        for value in (0, -3, 'x'):
+            resp = client.post('/api/backtest/jobs/', {'kind': 'intraday', 'curve_every': value}, format='json')
+            self.assertEqual(resp.status_code, 400)
+            self.assertIn('curve_every', resp.json()['detail'])
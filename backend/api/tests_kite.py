@@ -0,0 +1,262 @@
+import os
+import tempfile
+import threading
+import time
+from unittest.mock import patch, MagicMock
+import pandas as pd
+from kiteconnect import KiteConnect, exceptions as kite_exceptions
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from api import instruments, kite_tools, order_dispatcher
+from api.models import UserProfile
+from benchmarks.fake_kite import FakeKite
+
+
+class KiteClientCacheTests(TestCase):
+    """Test cases for the per-user KiteConnect client cache"""
+
+    def setUp(self):
+        kite_tools._clients.clear()
+        self.addCleanup(kite_tools._clients.clear)
+        self.user = User.objects.create_user('trader', password='x')
+        self.profile = UserProfile.objects.create(user=self.user, kiteconnect_access_token='token-1')
+        self.profile.kiteconnect_key = 'api-key'
+        self.profile.save()
+
+    @patch('api.kite_tools.decrypt_value', wraps=kite_tools.decrypt_value)
+    @patch('api.kite_tools.KiteConnect')
+    def test_client_is_reused_until_credentials_change(self, kite_cls, decrypt):
+        """Test that calls share one client and a new token builds a new one"""
+        first = kite_tools.get_kite_client(self.user)
+        with self.assertNumQueries(1):
+            self.assertIs(kite_tools.get_kite_client(self.user), first)
+        kite_cls.assert_called_once_with(api_key='api-key', root=None)
+        self.assertEqual(decrypt.call_count, 1)
+
+        self.profile.kiteconnect_access_token = 'token-2'
+        self.profile.save()
+        self.assertEqual(len(kite_tools._clients), 0)
+        kite_tools.get_kite_client(self.user)
+        self.assertEqual(kite_cls.call_count, 2)
+        kite_cls.return_value.set_access_token.assert_called_with('token-2')
+
+    @patch('api.kite_tools.KiteConnect')
+    def test_token_changed_elsewhere_is_picked_up(self, kite_cls):
+        """Test that credentials updated without a signal still miss the cache"""
+        kite_tools.get_kite_client(self.user)
+        UserProfile.objects.filter(pk=self.profile.pk).update(kiteconnect_access_token='token-3')
+        kite_tools.get_kite_client(self.user)
+        self.assertEqual(kite_cls.call_count, 2)
+        kite_cls.return_value.set_access_token.assert_called_with('token-3')
+
+
+class HoldingsCacheTests(TestCase):
+    """Test cases for cached broker holdings"""
+
+    def setUp(self):
+        kite_tools._holdings.clear()
+        self.addCleanup(kite_tools._holdings.clear)
+        self.user = User.objects.create_user('holder', password='x')
+        patcher = patch('api.kite_tools.get_kite_client')
+        self.kite = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.kite.holdings.return_value = [{"tradingsymbol": "TCS", "quantity": 1}]
+
+    def test_holdings_are_cached_until_an_order(self):
+        """Test that holdings are fetched once and refetched after place_order"""
+        kite_tools.get_holdings(self.user)
+        result = kite_tools.get_holdings(self.user)
+        self.assertEqual(result["holdings"], [{"tradingsymbol": "TCS", "quantity": 1}])
+        self.assertEqual(self.kite.holdings.call_count, 1)
+
+        self.assertTrue(kite_tools.place_order(self.user, "TCS", "NSE", "BUY", 1)["success"])
+        kite_tools.get_holdings(self.user)
+        self.assertEqual(self.kite.holdings.call_count, 2)
+
+    def test_stale_holdings_are_served_while_refreshing(self):
+        """Test that allow_stale answers from the expired entry and refreshes in the background"""
+        with patch('api.cache.time.monotonic', return_value=100.0):
+            kite_tools.get_holdings(self.user)
+        self.kite.holdings.return_value = []
+        with patch('api.cache.time.monotonic', return_value=100.0 + kite_tools.settings.KITE_HOLDINGS_TTL + 1), \
+                patch('api.kite_tools._schedule_refresh') as schedule:
+            result = kite_tools.get_holdings(self.user, allow_stale=True)
+        self.assertEqual(len(result["holdings"]), 1)
+        schedule.assert_called_once_with(self.user)
+
+        kite_tools._refresh_holdings(self.user)
+        self.assertEqual(kite_tools.get_holdings(self.user)["holdings"], [])
+
+    def test_fetch_during_order_is_not_cached(self):
+        """Test that holdings fetched across an order placement are not stored"""
+        def holdings():
+            kite_tools.invalidate_holdings(self.user.id)
+            return []
+        self.kite.holdings.side_effect = holdings
+        kite_tools.get_holdings(self.user)
+        self.assertEqual(len(kite_tools._holdings), 0)
+
+
+class InstrumentIndexTests(TestCase):
+    """Test cases for the local instrument master"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings = override_settings(INSTRUMENTS_FILE=os.path.join(tmp.name, 'instruments.npy'))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.dump = pd.DataFrame({
+            'instrument_token': [738561, 2953217, 128083204, 13238786],
+            'tradingsymbol': ['RELIANCE', 'TCS', 'RELIANCE', 'NIFTY24DECFUT'],
+            'tick_size': [0.05, 0.05, 0.05, 0.1],
+            'lot_size': [1, 1, 1, 25],
+            'exchange': ['NSE', 'NSE', 'BSE', 'NFO'],
+        })
+
+    def test_lookup_matches_dump_rows(self):
+        """Test that every dumped instrument is found and unknown ones are not"""
+        self.assertIsNone(instruments.get_index())
+        self.assertEqual(instruments.build_index(self.dump), 4)
+        for row in self.dump.itertuples():
+            found = instruments.lookup(row.tradingsymbol.lower(), row.exchange)
+            self.assertEqual((found['instrument_token'], found['lot_size'], found['tick_size']),
+                             (row.instrument_token, row.lot_size, row.tick_size))
+        self.assertIsNone(instruments.lookup('RELIANCE', 'NFO'))
+        self.assertIsNone(instruments.lookup('ZZZZ', 'NSE'))
+
+    def test_zero_lot_size_accepts_any_quantity(self):
+        """Test that dump rows with lot_size 0 neither divide by zero nor block orders"""
+        self.dump.loc[1, 'lot_size'] = 0
+        instruments.build_index(self.dump)
+        self.assertEqual(instruments.lookup('TCS')['lot_size'], 1)
+        self.assertIsNone(instruments.validate_order('TCS', 'NSE', 3))
+
+    def test_index_is_memory_mapped_and_reloaded(self):
+        """Test that the index is mapped from disk and a rebuilt file is picked up"""
+        instruments.build_index(self.dump)
+        self.assertIsInstance(instruments.get_index(), instruments.np.memmap)
+        instruments.build_index(self.dump[self.dump.tradingsymbol != 'TCS'])
+        # mtime resolution may not separate two quick rebuilds
+        os.utime(kite_tools.settings.INSTRUMENTS_FILE, (1, 1))
+        self.assertIsNone(instruments.lookup('TCS'))
+
+    @patch('api.kite_tools.get_kite_client')
+    def test_invalid_orders_never_reach_the_broker(self, get_client):
+        """Test that unknown symbols and broken lots are rejected locally"""
+        instruments.build_index(self.dump)
+        user = User.objects.create_user('trader', password='x')
+        self.assertIn("Unknown instrument", kite_tools.place_order(user, "RELIANC", "NSE", "BUY", 1)["message"])
+        self.assertIn("lot size (25)", kite_tools.place_order(user, "NIFTY24DECFUT", "NFO", "BUY", 30)["message"])
+        get_client.assert_not_called()
+        self.assertTrue(kite_tools.place_order(user, "NIFTY24DECFUT", "NFO", "BUY", 50)["success"])
+
+
+@override_settings(KITE_ORDERS_PER_SECOND=20, KITE_ORDER_BURST=5, KITE_ORDER_RETRY_BACKOFF=0.01)
+class OrderDispatcherTests(TestCase):
+    """Test cases for concurrent, rate-limited Kite order dispatch"""
+
+    def setUp(self):
+        order_dispatcher._lanes.clear()
+        self.addCleanup(order_dispatcher._lanes.clear)
+        self.legs = [
+            {'tradingsymbol': f"SYM{i}", 'exchange': 'NSE', 'transaction_type': 'BUY', 'quantity': 1,
+             'order_type': 'MARKET', 'product': 'CNC'}
+            for i in range(30)
+        ]
+
+    def test_legs_stay_within_broker_rate_limit(self):
+        """Test that every leg is placed once without tripping the broker's limit"""
+        server = FakeKite(latency=0.01, orders_per_second=25).start()
+        self.addCleanup(server.stop)
+        kite = KiteConnect(api_key='key', access_token='token', root=server.url)
+
+        statuses = order_dispatcher.dispatch_orders(kite, 1, self.legs)
+
+        self.assertTrue(all(s['success'] for s in statuses))
+        self.assertEqual([s['tradingsymbol'] for s in statuses], [leg['tradingsymbol'] for leg in self.legs])
+        self.assertEqual(server.rejected, 0)
+        self.assertEqual(sorted(o['tradingsymbol'] for o in server.orders), sorted(leg['tradingsymbol'] for leg in self.legs))
+
+    def test_transient_failures_are_retried_once_placed(self):
+        """Test that a timed-out leg the broker accepted is not placed again"""
+        kite = MagicMock()
+        accepted = []
+
+        def place_order(**kwargs):
+            accepted.append(kwargs['tag'])
+            raise kite_exceptions.NetworkException("Gateway timed out", code=504)
+        kite.place_order.side_effect = place_order
+        kite.orders.side_effect = lambda: [{'order_id': '42', 'tag': tag} for tag in accepted]
+
+        status, = order_dispatcher.dispatch_orders(kite, 1, self.legs[:1])
+
+        self.assertEqual((status['success'], status['order_id'], status['attempts']), (True, '42', 1))
+        kite.place_order.assert_called_once()
+
+    def test_permanent_failures_are_not_retried(self):
+        """Test that rejected orders fail at once and rate limits are retried"""
+        kite = MagicMock()
+        kite.orders.return_value = []
+        kite.place_order.side_effect = [
+            kite_exceptions.InputException("Invalid quantity", code=400),
+        ]
+        status, = order_dispatcher.dispatch_orders(kite, 1, self.legs[:1])
+        self.assertEqual((status['success'], status['attempts']), (False, 1))
+        self.assertIn("Invalid quantity", status['message'])
+
+        kite.place_order.side_effect = [kite_exceptions.NetworkException("Too many requests", code=429), '43']
+        status, = order_dispatcher.dispatch_orders(kite, 1, self.legs[:1])
+        self.assertEqual((status['success'], status['order_id'], status['attempts']), (True, '43', 2))
+
+    @override_settings(KITE_ORDERS_PER_SECOND=5, KITE_ORDER_BURST=1, KITE_DISPATCH_USER_WORKERS=2)
+    def test_large_basket_does_not_stall_other_users(self):
+        """Test that a user waiting on their rate limit holds only their share of the workers"""
+        kite = MagicMock()
+        kite.place_order.return_value = '1'
+        busy = threading.Thread(target=order_dispatcher.dispatch_orders, args=(kite, 1, self.legs[:10]))
+        busy.start()
+        self.addCleanup(busy.join)
+        time.sleep(0.1)
+
+        start = time.monotonic()
+        status, = order_dispatcher.dispatch_orders(kite, 2, self.legs[:1])
+        self.assertTrue(status['success'])
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_idle_lanes_are_evicted(self):
+        """Test that a user's rate state is dropped once it has refilled and gone unused"""
+        kite = MagicMock()
+        kite.place_order.return_value = '1'
+        order_dispatcher.dispatch_orders(kite, 1, self.legs[:1])
+        self.assertIn(1, order_dispatcher._lanes)
+        later = time.monotonic() + order_dispatcher.LANE_SWEEP_SECONDS + 1
+        with patch('api.order_dispatcher.time.monotonic', return_value=later):
+            order_dispatcher.dispatch_orders(kite, 2, self.legs[:1])
+        self.assertEqual(list(order_dispatcher._lanes), [2])
+
+
+class FakeBrokerTests(TestCase):
+    """Test cases for the local fake Kite server used by the load tests"""
+
+    def test_session_holdings_and_orders_round_trip(self):
+        """Test that a KiteConnect client can log in, read holdings and place orders"""
+        server = FakeKite(require_session=True).start()
+        self.addCleanup(server.stop)
+        kite = KiteConnect(api_key='key', root=server.url)
+        with self.assertRaises(kite_exceptions.TokenException):
+            kite.holdings()
+
+        kite.set_access_token(kite.generate_session('request', api_secret='secret')['access_token'])
+        self.assertEqual(len(kite.holdings()), 20)
+        order_id = kite.place_order(variety='regular', exchange='NSE', tradingsymbol='TCS', transaction_type='BUY',
+                                    quantity=1, product='CNC', order_type='MARKET')
+        self.assertEqual(kite.orders()[0]['order_id'], order_id)
+
+    def test_injected_errors_surface_as_kite_exceptions(self):
+        """Test that error injection fails requests with the configured Kite error"""
+        server = FakeKite(error_rate=1.0, error_type='DataException').start()
+        self.addCleanup(server.stop)
+        with self.assertRaises(kite_exceptions.DataException):
+            KiteConnect(api_key='key', access_token='token', root=server.url).holdings()
+        self.assertEqual(server.injected_errors, 1)
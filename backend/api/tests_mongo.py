@@ -0,0 +1,31 @@
+from unittest.mock import patch
+from django.test import TestCase, override_settings
+from api import mongo
+
+
+class SharedMongoClientTests(TestCase):
+    """Test cases for the process-wide MongoDB client"""
+
+    def setUp(self):
+        mongo.close()
+        self.addCleanup(mongo.close)
+
+    @override_settings(MONGODB_MAX_POOL_SIZE=7)
+    def test_client_is_created_once(self):
+        """Test that repeated calls share one lazily created client"""
+        with patch('api.mongo.MongoClient', wraps=mongo.MongoClient) as client_cls:
+            first = mongo.get_client()
+            self.assertIs(mongo.get_client(), first)
+            self.assertEqual(mongo.get_db().client, first)
+        client_cls.assert_called_once()
+        self.assertEqual(client_cls.call_args.kwargs['maxPoolSize'], 7)
+        self.assertEqual(first.options.pool_options.max_pool_size, 7)
+
+    def test_forked_process_gets_its_own_client(self):
+        """Test that a client inherited across fork is not reused"""
+        parent = mongo.get_client()
+        with patch('api.mongo.os.getpid', return_value=-1):
+            child = mongo.get_client()
+        self.assertIsNot(child, parent)
+        mongo._after_fork_in_child()
+        self.assertIsNone(mongo._client)
@@ -0,0 +1,502 @@
+import datetime
+import os
+import random
+import tempfile
+from decimal import Decimal
+from unittest.mock import patch, MagicMock
+from bson import ObjectId
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from api import leaderboard, order_book, portfolio_valuation, replay, sim_tools
+from api.models import LeaderboardSnapshot, StockData
+from api.order_book import OrderBook
+
+
+def ledger_portfolio(cash=1000000, holdings=None):
+    return {"_id": 1, "user_id": 5, "cash": cash, "holdings": holdings or {}, "ledger_version": sim_tools.LEDGER_VERSION}
+
+
+class SimulatedLedgerTests(TestCase):
+    """Test cases for the atomic simulated trading ledger"""
+
+    def setUp(self):
+        self.col = MagicMock()
+
+    def test_buy_is_one_guarded_update(self):
+        """Test that a buy needs a single round trip guarded on cash"""
+        self.col.find_one_and_update.return_value = ledger_portfolio(
+            cash=990000, holdings={"TCS:NS": {"quantity": 10, "average_price": 1000}})
+        portfolio, error = sim_tools.apply_simulated_trade(self.col, 5, "TCS.NS", "BUY", 10, 1000.0)
+
+        self.assertEqual(error, "")
+        self.assertEqual(sim_tools.portfolio_holdings(portfolio), {"TCS.NS": {"quantity": 10, "average_price": 1000}})
+        query, update = self.col.find_one_and_update.call_args.args
+        self.assertEqual(query["cash"], {"$gte": 10000.0})
+        self.assertIn("holdings.TCS:NS", update[0]["$set"])
+        self.col.find_one.assert_not_called()
+
+    def test_sell_is_one_guarded_update(self):
+        """Test that sells credit cash and reduce quantity under a share guard and report missing shares"""
+        self.col.find_one_and_update.return_value = None
+        self.col.find_one.return_value = ledger_portfolio(holdings={"TCS:NS": {"quantity": 3, "average_price": 900}})
+        portfolio, error = sim_tools.apply_simulated_trade(self.col, 5, "TCS.NS", "SELL", 5, 1000.0)
+
+        self.assertIsNone(portfolio)
+        self.assertEqual(error, "Insufficient shares. You have 3 shares.")
+        query, update = self.col.find_one_and_update.call_args.args
+        self.assertEqual(query["holdings.TCS:NS.quantity"], {"$gte": 5})
+        self.assertEqual(update[0]["$set"]["cash"], {"$add": ["$cash", 5000.0]})
+        self.assertEqual(update[0]["$set"]["holdings.TCS:NS"]["quantity"], {"$subtract": ["$holdings.TCS:NS.quantity", 5]})
+        self.col.update_one.assert_not_called()
+
+    def test_legacy_portfolio_is_rekeyed_then_retried(self):
+        """Test that old dotted holdings keys are upgraded before the order applies"""
+        legacy = {"_id": 1, "user_id": 5, "cash": 50000, "holdings": {"INFY.NS": {"quantity": 2, "average_price": 1500}}}
+        self.col.find_one.return_value = legacy
+        self.col.find_one_and_update.side_effect = [
+            None, ledger_portfolio(holdings={"INFY:NS": {"quantity": 0, "average_price": 1500}})]
+        portfolio, error = sim_tools.apply_simulated_trade(self.col, 5, "INFY.NS", "SELL", 2, 1600.0)
+
+        self.assertIsNotNone(portfolio)
+        self.assertEqual(self.col.find_one_and_update.call_count, 2)
+        update = self.col.update_one.call_args_list[0].args[1]["$set"]
+        self.assertEqual(update["holdings"], {"INFY:NS": {"quantity": 2, "average_price": 1500}})
+
+    def test_sell_books_realized_pnl(self):
+        """Test that a sell books its stats in the guarded write and appends a trade"""
+        self.col.find_one_and_update.return_value = ledger_portfolio(
+            holdings={"TCS:NS": {"quantity": 2, "average_price": 900}})
+        self.col.find_one_and_update.return_value["stats"] = {"trades": 3, "turnover": 20000, "closed_trades": 2,
+                                                               "winning_trades": 1, "realized_pnl": 400.0}
+        portfolio, _ = sim_tools.apply_simulated_trade(self.col, 5, "TCS.NS", "SELL", 4, 1000.0, order_id="abc")
+
+        trade = self.col.database["simulated_trades"].insert_one.call_args.args[0]
+        self.assertEqual(trade["realized_pnl"], 400.0)
+        self.assertEqual(trade["order_id"], "abc")
+        update = self.col.find_one_and_update.call_args.args[1][0]["$set"]
+        avg = "$holdings.TCS:NS.average_price"
+        self.assertEqual(update["stats.realized_pnl"]["$add"][1], {"$multiply": [{"$subtract": [1000.0, avg]}, 4]})
+        self.assertEqual(update["stats.winning_trades"]["$add"][1], {"$cond": [{"$gt": [1000.0, avg]}, 1, 0]})
+        self.col.update_one.assert_not_called()
+        self.assertEqual(sim_tools.trade_stats(portfolio)["win_rate"], 50.0)
+
+    @patch('api.sim_tools.portfolio_valuation.schedule_snapshot_update')
+    @patch('api.sim_tools.market_tools.get_stock_info', return_value={'success': True, 'current_price': 1000})
+    @patch('api.sim_tools.get_mongo_db')
+    def test_place_order_reports_remaining_cash(self, get_db, _info, _snapshot):
+        """Test that place_simulated_order returns the ledger's cash after the fill"""
+        get_db.return_value = {'simulated_portfolios': self.col}
+        self.col.find_one_and_update.return_value = ledger_portfolio(
+            cash=995000, holdings={"TCS:NS": {"quantity": 5, "average_price": 1000}})
+        result = sim_tools.place_simulated_order(5, "tcs", "BUY", 5)
+        self.assertTrue(result["success"])
+        self.assertEqual(result["details"]["remaining_cash"], 995000)
+        self.assertEqual(result["details"]["symbol"], "TCS.NS")
+
+    def test_booked_fill_survives_a_failed_trade_log(self):
+        """Test that a fill already in the ledger is reported even if logging it fails"""
+        self.col.find_one_and_update.return_value = ledger_portfolio(
+            cash=995000, holdings={"TCS:NS": {"quantity": 5, "average_price": 1000}})
+        self.col.database["simulated_trades"].insert_one.side_effect = RuntimeError("connection reset")
+        portfolio, error = sim_tools.apply_simulated_trade(self.col, 5, "TCS.NS", "BUY", 5, 1000.0)
+        self.assertEqual((portfolio["cash"], error), (995000, ""))
+
+    @patch('api.sim_tools.order_book.submit_order', return_value={'success': True})
+    @patch('api.sim_tools.get_mongo_db')
+    def test_limit_orders_go_to_the_book(self, get_db, submit):
+        """Test that LIMIT orders rest instead of filling at their price"""
+        sim_tools.place_simulated_order(5, "tcs", "BUY", 5, price=990, order_type="LIMIT")
+        submit.assert_called_once_with(5, "TCS.NS", "BUY", 5, "LIMIT", 990, 0)
+        self.col.find_one_and_update.assert_not_called()
+
+    def test_basket_is_one_guarded_update(self):
+        """Test that a basket books every leg with a single update guarded on net cash and shares"""
+        self.col.find_one_and_update.return_value = ledger_portfolio(cash=1001000, holdings={
+            "TCS:NS": {"quantity": 10, "average_price": 1000}, "INFY:NS": {"quantity": 5, "average_price": 1200},
+        })
+        legs = [("TCS.NS", "BUY", 10, 1000.0), ("INFY.NS", "SELL", 5, 1400.0)]
+        portfolio, error = sim_tools.apply_simulated_basket(self.col, 5, legs)
+
+        self.assertEqual(error, "")
+        self.col.find_one_and_update.assert_called_once()
+        query, update = self.col.find_one_and_update.call_args.args
+        self.assertEqual(query["cash"], {"$gte": 3000.0})
+        self.assertEqual(query["holdings.INFY:NS.quantity"], {"$gte": 5})
+        self.assertEqual(update[0]["$set"]["cash"], {"$subtract": ["$cash", 3000.0]})
+        trades = self.col.database.__getitem__.return_value.insert_many.call_args.args[0]
+        self.assertEqual([t["symbol"] for t in trades], ["TCS.NS", "INFY.NS"])
+        self.assertEqual(trades[1]["realized_pnl"], 1000.0)
+
+    def test_basket_rejects_duplicate_symbols(self):
+        """Test that a basket with two legs for one symbol is refused before any write"""
+        portfolio, error = sim_tools.apply_simulated_basket(self.col, 5, [("TCS.NS", "BUY", 1, 10.0), ("TCS.NS", "SELL", 1, 10.0)])
+        self.assertIsNone(portfolio)
+        self.assertIn("only once", error)
+        self.col.find_one_and_update.assert_not_called()
+
+    @patch('api.sim_tools.portfolio_valuation.schedule_snapshot_update')
+    @patch('api.sim_tools.apply_simulated_basket', return_value=(ledger_portfolio(), ""))
+    @patch('api.sim_tools.market_tools.get_quotes', return_value={"TCS.NS": 4000.0, "INFY.NS": 1500.0})
+    @patch('api.sim_tools.get_mongo_db', return_value=MagicMock())
+    def test_basket_prices_legs_in_one_batch(self, get_db, get_quotes, apply_basket, schedule):
+        """Test that all legs are priced with one quote download"""
+        result = sim_tools.place_simulated_basket(5, [
+            {"tradingsymbol": "tcs", "transaction_type": "buy", "quantity": 2.0},
+            {"tradingsymbol": "INFY", "transaction_type": "SELL", "quantity": 1},
+        ])
+        self.assertTrue(result["success"])
+        get_quotes.assert_called_once_with(["TCS.NS", "INFY.NS"])
+        self.assertEqual(apply_basket.call_args.args[2], [("TCS.NS", "BUY", 2, 4000.0), ("INFY.NS", "SELL", 1, 1500.0)])
+
+
+def book_order(order_id, side, order_type, price=None, trigger=None, symbol='TCS.NS'):
+    return {
+        'id': order_id, 'user_id': 5, 'symbol': symbol, 'transaction_type': side, 'quantity': 1,
+        'order_type': order_type, 'price': price, 'trigger_price': trigger,
+        'status': order_book.OPEN if order_type == 'LIMIT' else order_book.TRIGGER_PENDING,
+    }
+
+
+class OrderBookTests(TestCase):
+    """Test cases for the pending order book"""
+
+    def test_limits_fill_when_reached(self):
+        """Test that only limit levels the quote reaches are filled, best first"""
+        book = OrderBook()
+        book.add(book_order('b1', 'BUY', 'LIMIT', price=99))
+        book.add(book_order('b2', 'BUY', 'LIMIT', price=101))
+        book.add(book_order('s1', 'SELL', 'LIMIT', price=100))
+        book.add(book_order('s2', 'SELL', 'LIMIT', price=102))
+
+        fills, _ = book.match({'TCS.NS': 100.0, 'INFY.NS': 1.0})
+        self.assertEqual([(o['id'], p) for o, p in fills], [('b2', 100.0), ('s1', 100.0)])
+        self.assertEqual(len(book), 2)
+        fills, _ = book.match({'TCS.NS': 98.0})
+        self.assertEqual([o['id'] for o, _ in fills], ['b1'])
+
+    def test_stops_trigger(self):
+        """Test that SL-M fills on trigger and SL rests as a limit order"""
+        book = OrderBook()
+        book.add(book_order('stop', 'SELL', 'SL-M', trigger=95))
+        book.add(book_order('stop_limit', 'SELL', 'SL', price=98, trigger=97))
+
+        fills, triggered = book.match({'TCS.NS': 96.5})
+        self.assertEqual(fills, [])
+        self.assertEqual([o['id'] for o in triggered], ['stop_limit'])
+        fills, _ = book.match({'TCS.NS': 94.0})
+        self.assertEqual([o['id'] for o, _ in fills], ['stop'])
+        fills, _ = book.match({'TCS.NS': 98.0})
+        self.assertEqual([o['id'] for o, _ in fills], ['stop_limit'])
+        self.assertEqual(book.symbols(), [])
+
+    def test_matches_brute_force_at_scale(self):
+        """Test a large random book against checking every order"""
+        rng = random.Random(3)
+        book = OrderBook()
+        orders = []
+        for i in range(50000):
+            side = rng.choice(['BUY', 'SELL'])
+            if rng.random() < 0.7:
+                order = book_order(str(i), side, 'LIMIT', price=round(rng.uniform(90, 110), 1), symbol=f"S{i % 40}")
+            else:
+                order = book_order(str(i), side, 'SL-M', trigger=round(rng.uniform(90, 110), 1), symbol=f"S{i % 40}")
+            book.add(order)
+            orders.append(dict(order))
+        cancelled = {str(i) for i in range(0, 50000, 7)}
+        for order_id in cancelled:
+            self.assertTrue(book.remove(order_id))
+
+        quotes = {f"S{i}": rng.uniform(90, 110) for i in range(40)}
+        fills, _ = book.match(quotes)
+
+        def reached(o):
+            q = quotes[o['symbol']]
+            if o['order_type'] == 'LIMIT':
+                return q <= o['price'] if o['transaction_type'] == 'BUY' else q >= o['price']
+            return q >= o['trigger_price'] if o['transaction_type'] == 'BUY' else q <= o['trigger_price']
+
+        expected = {o['id'] for o in orders if o['id'] not in cancelled and reached(o)}
+        self.assertEqual({o['id'] for o, _ in fills}, expected)
+        self.assertEqual(len(book), 50000 - len(cancelled) - len(expected))
+
+    @patch('api.order_book.portfolio_valuation.schedule_snapshot_update')
+    @patch('api.order_book.sim_tools.apply_simulated_trade')
+    @patch('api.order_book.get_orders_collection')
+    @patch('api.order_book.mongo.get_db')
+    def test_matching_pass_claims_before_filling(self, get_db, get_orders, apply_trade, _snapshot):
+        """Test that an order already claimed elsewhere is not filled again"""
+        book = OrderBook()
+        book.add(book_order('64b000000000000000000001', 'BUY', 'LIMIT', price=100))
+        book.add(book_order('64b000000000000000000002', 'BUY', 'LIMIT', price=100))
+        orders = get_orders.return_value
+        orders.update_one.side_effect = [MagicMock(modified_count=1), MagicMock(), MagicMock(modified_count=0)]
+        apply_trade.return_value = (ledger_portfolio(), "")
+        get_db.return_value = MagicMock()
+
+        with patch('api.order_book.get_book', return_value=book):
+            self.assertEqual(order_book.run_matching_pass({'TCS.NS': 99.0}), 2)
+        apply_trade.assert_called_once()
+        self.assertEqual(apply_trade.call_args.args[-1], 99.0)
+        self.assertEqual(orders.update_one.call_args_list[1].args[1]['$set']['status'], order_book.COMPLETE)
+
+    @patch('api.order_book.get_orders_collection')
+    def test_sync_picks_up_orders_from_other_processes(self, get_orders):
+        """Test that each sync adds newly placed orders and drops cancelled ones"""
+        first, second, third = ObjectId(), ObjectId(), ObjectId()
+
+        def doc(_id, price):
+            return {'_id': _id, 'user_id': 5, 'symbol': 'TCS.NS', 'transaction_type': 'BUY', 'quantity': 1,
+                    'order_type': 'LIMIT', 'price': price, 'trigger_price': None, 'status': order_book.OPEN}
+        orders = get_orders.return_value
+        book = OrderBook()
+        orders.find.side_effect = [[doc(first, 99), doc(second, 98)]]
+        self.assertEqual(order_book.sync_book(book), (2, 0))
+
+        # Placed and cancelled in a web worker since; `second` is re-read in the overlap
+        orders.find.side_effect = [[{'_id': first}], [doc(second, 98), doc(third, 97)]]
+        self.assertEqual(order_book.sync_book(book), (1, 1))
+        closed_query = orders.find.call_args_list[1].args[0]
+        self.assertEqual(closed_query['status'], {'$nin': [order_book.OPEN, order_book.TRIGGER_PENDING]})
+        self.assertNotIn(str(first), book)
+        fills, _ = book.match({'TCS.NS': 97.0})
+        self.assertEqual([o['id'] for o, _ in fills], [str(second), str(third)])
+
+    @patch('api.order_book.sim_tools.apply_simulated_trade', side_effect=RuntimeError('connection reset'))
+    @patch('api.order_book.get_orders_collection')
+    @patch('api.order_book.mongo.get_db')
+    def test_failed_fill_does_not_stay_filling(self, get_db, get_orders, _apply_trade):
+        """Test that an order whose fill raises is rejected instead of left FILLING"""
+        orders = get_orders.return_value
+        orders.update_one.return_value = MagicMock(modified_count=1)
+        self.assertFalse(order_book._execute_fill(book_order('64b000000000000000000001', 'BUY', 'LIMIT', price=100), 99.0))
+        query, update = orders.update_one.call_args.args
+        self.assertEqual(query['status'], order_book.FILLING)
+        self.assertEqual(update['$set']['status'], order_book.REJECTED)
+        self.assertIn('connection reset', update['$set']['message'])
+
+    @patch('api.order_book.get_orders_collection')
+    @patch('api.order_book.mongo.get_db')
+    def test_stale_fills_are_settled_on_load(self, get_db, get_orders):
+        """Test that orders a crashed process left FILLING are completed or rejected"""
+        logged, lost = ObjectId(), ObjectId()
+        old = datetime.datetime.utcnow() - datetime.timedelta(minutes=5)
+        orders = get_orders.return_value
+        orders.find.return_value = [{'_id': logged, 'updated_at': old}, {'_id': lost, 'updated_at': old}]
+        trades = get_db.return_value.__getitem__.return_value
+        trades.find_one.side_effect = lambda q: {'price': 101.0} if q['order_id'] == str(logged) else None
+
+        order_book.recover_stale_fills()
+        updates = {c.args[0]['_id']: c.args[1]['$set'] for c in orders.update_one.call_args_list}
+        self.assertEqual(updates[logged]['status'], order_book.COMPLETE)
+        self.assertEqual(updates[logged]['fill_price'], 101.0)
+        self.assertEqual(updates[lost]['status'], order_book.REJECTED)
+
+
+def random_portfolios(users, symbols, seed=1):
+    rng = random.Random(seed)
+    return [
+        {
+            "user_id": u,
+            "cash": rng.uniform(0, 1e6),
+            "holdings": {
+                sim_tools.holding_key(s): {"quantity": rng.choice([0, 1, 5, 20]), "average_price": 100}
+                for s in rng.sample(symbols, rng.randint(0, 6))
+            },
+        }
+        for u in range(users)
+    ]
+
+
+class RevaluationTests(TestCase):
+    """Test cases for the end-of-day leaderboard revaluation"""
+
+    def test_vectorized_values_match_per_user_loop(self):
+        """Test values and diversification against valuing each portfolio separately"""
+        symbols = [f"S{i}.NS" for i in range(30)]
+        prices = {s: 10.0 + i for i, s in enumerate(symbols[:-2])}
+        sectors = {s: f"sector{i % 7}" if i % 3 else s for i, s in enumerate(symbols)}
+        portfolios = random_portfolios(2000, symbols)
+
+        flat = portfolio_valuation.flatten_portfolios(portfolios)
+        values, scores = portfolio_valuation.compute_valuations(flat, prices, sectors)
+        for row, portfolio in enumerate(portfolios):
+            holdings = sim_tools.portfolio_holdings(portfolio)
+            expected = portfolio["cash"] + sum(h["quantity"] * prices.get(s, 0) for s, h in holdings.items())
+            self.assertAlmostEqual(values[row], expected, places=6)
+            self.assertEqual(scores[row], min(len({sectors[s] for s in holdings}) * 10, 100))
+
+    @patch('api.portfolio_valuation.market_tools.get_quotes', return_value={"TCS.NS": 4000.0})
+    @patch('api.portfolio_valuation.mongo.get_db')
+    def test_revalue_writes_all_snapshots(self, get_db, get_quotes):
+        """Test that existing snapshots are updated and missing ones created"""
+        alice = User.objects.create_user('alice', password='x')
+        bob = User.objects.create_user('bob', password='x')
+        LeaderboardSnapshot.objects.create(user=alice, total_value=1)
+        StockData.objects.create(symbol="INFY.NS", current_price=Decimal("1500"), sector="IT")
+        get_db.return_value = {"simulated_portfolios": MagicMock(find=MagicMock(return_value=[
+            {"user_id": alice.id, "cash": 1000.0, "holdings": {"TCS:NS": {"quantity": 2, "average_price": 1}}},
+            {"user_id": bob.id, "cash": 0.0, "holdings": {"INFY:NS": {"quantity": 1, "average_price": 1}}},
+            {"user_id": 999, "cash": 5.0, "holdings": {}},
+        ])), "portfolio_values": MagicMock()}
+
+        summary = portfolio_valuation.revalue_portfolios(day=datetime.date(2024, 3, 1))
+
+        self.assertEqual((summary["updated"], summary["created"]), (1, 1))
+        get_quotes.assert_called_once()
+        self.assertEqual(LeaderboardSnapshot.objects.get(user=alice).total_value, Decimal("9000.00"))
+        self.assertEqual(LeaderboardSnapshot.objects.get(user=bob).total_value, Decimal("1500.00"))
+        self.assertEqual(LeaderboardSnapshot.objects.get(user=bob).diversification_score, 10)
+        operations = get_db.return_value["portfolio_values"].bulk_write.call_args.args[0]
+        self.assertEqual([op._doc for op in operations[1::2]], [
+            {"$set": {"values.60": 9000.0}}, {"$set": {"values.60": 1500.0}}, {"$set": {"values.60": 5.0}},
+        ])
+
+    @patch('api.portfolio_valuation.mongo.get_db')
+    def test_value_series_is_columnar(self, get_db):
+        """Test that yearly buckets are read back as date and value columns"""
+        last_year = [None] * 366
+        last_year[364] = 100.0  # 2023-12-31
+        this_year = [None] * 366
+        this_year[0] = 101.5
+        this_year[2] = 99.0
+        col = get_db.return_value.__getitem__.return_value
+        col.find.return_value.sort.return_value = [{"year": 2023, "values": last_year}, {"year": 2024, "values": this_year}]
+
+        series = portfolio_valuation.get_value_series(7, datetime.date(2023, 6, 1), datetime.date(2024, 1, 2))
+
+        self.assertEqual(series, {"dates": ["2023-12-31", "2024-01-01"], "values": [100.0, 101.5]})
+        self.assertEqual(col.find.call_args.args[0], {"user_id": 7, "year": {"$gte": 2023, "$lte": 2024}})
+
+    @patch('api.portfolio_valuation.mongo.get_db')
+    def test_value_series_defaults_to_a_year_back_from_leap_day(self, get_db):
+        """Test that the default one-year window works when it ends on Feb 29"""
+        col = get_db.return_value.__getitem__.return_value
+        col.find.return_value.sort.return_value = []
+        series = portfolio_valuation.get_value_series(7, end=datetime.date(2028, 2, 29))
+        self.assertEqual(series, {"dates": [], "values": []})
+        self.assertEqual(col.find.call_args.args[0]["year"], {"$gte": 2027, "$lte": 2028})
+
+    @patch('api.portfolio_valuation.market_tools.get_quotes')
+    def test_snapshot_prices_all_holdings_in_one_query(self, get_quotes):
+        """Test that a snapshot costs one StockData query and one quote batch for misses"""
+        user = User.objects.create_user('carol', password='x')
+        symbols = [f"S{i}.NS" for i in range(20)]
+        StockData.objects.bulk_create([
+            StockData(symbol=s, current_price=Decimal("10"), sector=f"sector{i % 4}") for i, s in enumerate(symbols[:15])
+        ])
+        get_quotes.return_value = {s: 20.0 for s in symbols[15:]}
+        holdings = {s: {"quantity": 1, "average_price": 5} for s in symbols}
+
+        sim_tools.update_leaderboard_snapshot(user.id, 0, {}, None)
+        # StockData and the snapshot update, however many holdings
+        with self.assertNumQueries(2):
+            sim_tools.update_leaderboard_snapshot(user.id, 100.0, holdings, {"win_rate": 25.0})
+        get_quotes.assert_called_once_with(symbols[15:])
+        snapshot = LeaderboardSnapshot.objects.get(user=user)
+        self.assertEqual(snapshot.total_value, Decimal("350.00"))
+        self.assertEqual(snapshot.diversification_score, 90)
+        self.assertEqual(snapshot.win_rate, 25.0)
+
+    @patch('api.portfolio_valuation.refresh_snapshot')
+    def test_deferred_updates_are_coalesced(self, refresh):
+        """Test that queued refreshes for the same user collapse into one"""
+        executor = MagicMock()
+        with patch('api.portfolio_valuation._executor', executor):
+            portfolio_valuation.schedule_snapshot_update(42)
+            portfolio_valuation.schedule_snapshot_update(42)
+            portfolio_valuation.schedule_snapshot_update(43)
+        self.assertEqual(executor.submit.call_count, 2)
+        portfolio_valuation._pending.clear()
+
+
+class LeaderboardTests(TestCase):
+    """Test cases for leaderboard ranking and pagination"""
+
+    def setUp(self):
+        rng = random.Random(3)
+        users = User.objects.bulk_create([User(username=f"u{i}") for i in range(120)])
+        LeaderboardSnapshot.objects.bulk_create([
+            # Few distinct values, so ties have to be broken consistently
+            LeaderboardSnapshot(user=u, total_value=Decimal(rng.choice(["900000.50", "1000000.00", "1200000.25"])),
+                                diversification_score=rng.choice([10.0, 30.0]), win_rate=rng.random() * 100)
+            for u in users
+        ])
+
+    def test_pages_and_ranks_match_full_ordering(self):
+        """Test that cursor pages and counted ranks agree with sorting everything"""
+        for metric, field in leaderboard.METRICS.items():
+            expected = list(LeaderboardSnapshot.objects.order_by(f"-{field}", "id").values_list("user__username", flat=True))
+            seen = []
+            cursor = None
+            while True:
+                entries, cursor = leaderboard.get_page(metric, cursor, limit=25)
+                seen.extend(entries)
+                if cursor is None:
+                    break
+            self.assertEqual([e["username"] for e in seen], expected)
+            self.assertEqual([e["rank"] for e in seen], list(range(1, 121)))
+
+            snapshot = LeaderboardSnapshot.objects.get(user__username=expected[57])
+            with self.assertNumQueries(1):
+                self.assertEqual(leaderboard.rank_of(snapshot, metric), 58)
+
+    def test_view_rejects_bad_cursor(self):
+        """Test that a malformed cursor is a client error"""
+        response = self.client.get('/api/leaderboard/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/leaderboard/')
+        self.assertEqual(len(response.json()['leaderboard']), 50)
+        self.assertIsNotNone(response.json()['next_cursor'])
+
+
+class ReplayTests(TestCase):
+    """Test cases for historical replay sessions"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        os.makedirs(os.path.join(self.tmp.name, '1d'))
+        with open(os.path.join(self.tmp.name, '1d', 'TCS.NS.csv'), 'w') as f:
+            f.write("Date,Open,High,Low,Close,Volume\n")
+            # Friday, then Monday: the weekend replays at Friday's close
+            f.write("2024-01-05 00:00:00+05:30,1,1,1,100.0,10\n")
+            f.write("2024-01-08 00:00:00+05:30,1,1,1,104.5,10\n")
+        settings = override_settings(BARS_DATA_DIR=self.tmp.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.session = {
+            'user_id': 5, 'start_date': '2024-01-01', 'end_date': '2024-01-31', 'speed': 2.0,
+            'starting_cash': 1000000.0, 'started_at': datetime.datetime(2024, 6, 1, 12, 0, 0),
+        }
+
+    def test_prices_come_from_stored_bars(self):
+        """Test that lookups use the last close on or before the replay date, reading the file once"""
+        with patch('api.replay.pd.read_csv', wraps=replay.pd.read_csv) as read_csv:
+            self.assertIsNone(replay.close_on('TCS.NS', datetime.date(2024, 1, 4)))
+            self.assertEqual(replay.close_on('TCS.NS', datetime.date(2024, 1, 7)), 100.0)
+            self.assertEqual(replay.close_on('TCS.NS', datetime.date(2024, 3, 1)), 104.5)
+        self.assertEqual(read_csv.call_count, 2)  # header and columns, once
+        self.assertIsNone(replay.close_on('INFY.NS', datetime.date(2024, 3, 1)))
+
+    def test_clock_advances_at_speed_until_end(self):
+        """Test that the replay date is start plus elapsed seconds times speed"""
+        started = self.session['started_at']
+        self.assertEqual(replay.replay_date(self.session, started + datetime.timedelta(seconds=3.5)), datetime.date(2024, 1, 8))
+        self.assertEqual(replay.replay_date(self.session, started + datetime.timedelta(hours=1)), datetime.date(2024, 1, 31))
+
+    @patch('api.replay.sim_tools.apply_simulated_trade')
+    @patch('api.replay.mongo.get_db')
+    def test_order_fills_at_replay_close(self, get_db, apply_trade):
+        """Test that a replay order fills at the stored close into the session ledger"""
+        session_id = str(ObjectId())
+        self.session['started_at'] = datetime.datetime.utcnow() - datetime.timedelta(seconds=3)
+        get_db.return_value['replay_sessions'].find_one.return_value = self.session
+        apply_trade.return_value = ({"cash": 999000.0}, "")
+
+        result = replay.place_replay_order(5, session_id, 'tcs', 'BUY', 10)
+
+        self.assertTrue(result['success'])
+        self.assertEqual(result['details']['date'], '2024-01-07')
+        args, kwargs = apply_trade.call_args
+        self.assertEqual(args[1:], (session_id, 'TCS.NS', 'BUY', 10, 100.0))
+        self.assertEqual(kwargs, {'trades_collection': replay.TRADES})
@@ -19,11 +19,23 @@ urlpatterns = [
     
     path('stocks/history/', views.get_stock_history, name='stock-history'),
     path('backtest_strategy/', views.backtest_strategy, name='backtest_strategy'),
+    path('backtest/factor/', views.factor_backtest, name='backtest-factor'),
+    path('backtest/jobs/', views.submit_backtest_job, name='backtest-jobs-submit'),
+    path('backtest/jobs/<str:job_id>/', views.get_backtest_job, name='backtest-jobs-get'),
+    path('backtest/jobs/<str:job_id>/events/', views.backtest_job_events, name='backtest-jobs-events'),
+    path('backtest/jobs/<str:job_id>/cancel/', views.cancel_backtest_job, name='backtest-jobs-cancel'),
     path('analyze_playground/', views.analyze_playground, name='analyze_playground'),
     path('leaderboard/', views.get_leaderboard, name='get_leaderboard'),
     path('leaderboard/seed/', views.seed_leaderboard, name='seed_leaderboard'),
     path('market/movers/', views.get_market_movers_view, name='get_market_movers'),
     path('simulation/portfolio/', views.get_simulated_portfolio_view, name='get_simulated_portfolio'),
+    path('simulation/portfolio/history/', views.get_simulated_value_history_view, name='get_simulated_value_history'),
+    path('simulation/basket/', views.place_simulated_basket_view, name='place_simulated_basket'),
+    path('simulation/replay/', views.start_replay_view, name='start_replay'),
+    path('simulation/replay/<str:session_id>/', views.get_replay_view, name='get_replay'),
+    path('simulation/replay/<str:session_id>/order/', views.place_replay_order_view, name='place_replay_order'),
+    path('simulation/orders/', views.get_simulated_orders_view, name='get_simulated_orders'),
+    path('simulation/orders/<str:order_id>/cancel/', views.cancel_simulated_order_view, name='cancel_simulated_order'),
     path('webhook/whatsapp/', views.whatsapp_webhook, name='whatsapp-webhook'),
     
     # Goals / Portfolio Architect
@@ -2,13 +2,13 @@ from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.conf import settings
-from pymongo import MongoClient
 from bson import ObjectId
 import os
 import json
@@ -19,12 +19,20 @@ from django.http import StreamingHttpResponse, HttpResponse, JsonResponse
 from .models import UserProfile, StockData, LeaderboardSnapshot, Goal, GoalItem
 from django.db import transaction
 from kiteconnect import KiteConnect
+from . import gemini
 from . import kite_tools
 from . import market_tools
 from . import sim_tools
+from . import order_book
+from . import portfolio_valuation
+from . import mongo
+from . import backtest_service
+from . import chat_history
+from . import jobs
+from . import leaderboard
+from . import replay
 from .guardrails.safety import SafetyFilter
 from twilio.twiml.messaging_response import MessagingResponse
-from .backtester import BacktestEngine
 try:
     safety_filter = SafetyFilter()
 except Exception as e:
@@ -34,9 +42,7 @@ except Exception as e:
 
 
 def get_mongo():
-    client = MongoClient(settings.MONGODB_URI)
-    db = client[settings.MONGODB_DB]
-    return client, db
+    return mongo.get_client(), mongo.get_db()
 
 
 def user_payload(user: User):
@@ -156,7 +162,7 @@ def exchange_token(request):
     if not api_key or not api_secret:
         return Response({"detail": "Kite API key/secret not set in profile"}, status=400)
 
-    kite = KiteConnect(api_key=api_key)
+    kite = KiteConnect(api_key=api_key, root=settings.KITE_API_ROOT)
     try:
         data = kite.generate_session(request_token, api_secret=api_secret)
         access_token = data.get("access_token")
@@ -248,10 +254,7 @@ def generate_ai_reply(prompt: str) -> str:
     # Prefer Gemini if key is configured
     if settings.GEMINI_API_KEY:
         try:
-            import google.generativeai as genai  # type: ignore
-            genai.configure(api_key=settings.GEMINI_API_KEY)
-            model = genai.GenerativeModel("gemini-2.5-flash")
-            resp = model.generate_content(prompt)
+            resp = gemini.get_model().generate_content(prompt)
             return getattr(resp, 'text', None) or (resp.candidates[0].content.parts[0].text if resp.candidates else "")
         except Exception as e:
             return f"AI error: {e}"
@@ -270,111 +273,6 @@ def generate_ai_reply(prompt: str) -> str:
     return f"You said: {prompt}"
 
 
-def get_gemini_tools():
-    """
-    Define tools for Gemini Function Calling
-    """
-    return [
-        {
-            "function_declarations": [
-                {
-                    "name": "get_holdings",
-                    "description": "Get the current user's stock holdings/portfolio.",
-                    "parameters": {
-                        "type": "OBJECT",
-                        "properties": {},
-                    }
-                },
-                {
-                    "name": "place_order",
-                    "description": "Place a buy or sell order for a stock.",
-                    "parameters": {
-                        "type": "OBJECT",
-                        "properties": {
-                            "tradingsymbol": {"type": "STRING", "description": "The stock symbol (e.g., RELIANCE, TCS)."},
-                            "exchange": {"type": "STRING", "description": "The exchange (NSE or BSE).", "enum": ["NSE", "BSE"]},
-                            "transaction_type": {"type": "STRING", "description": "BUY or SELL.", "enum": ["BUY", "SELL"]},
-                            "quantity": {"type": "INTEGER", "description": "Number of shares to trade."},
-                            "product": {"type": "STRING", "description": "Product type (CNC for delivery, MIS for intraday).", "enum": ["CNC", "MIS", "NRML"]},
-                            "order_type": {"type": "STRING", "description": "Order type (MARKET or LIMIT).", "enum": ["MARKET", "LIMIT"]}
-                        },
-                        "required": ["tradingsymbol", "exchange", "transaction_type", "quantity"]
-                    }
-                },
-                {
-                    "name": "get_stock_info",
-                    "description": "Get live price and fundamentals for a specific stock.",
-                    "parameters": {
-                        "type": "OBJECT",
-                        "properties": {
-                            "symbol": {"type": "STRING", "description": "The stock symbol (e.g., RELIANCE)."}
-                        },
-                        "required": ["symbol"]
-                    }
-                },
-                {
-                    "name": "get_market_movers",
-                    "description": "Get top gaining and losing stocks in the market (Nifty 50).",
-                    "parameters": {
-                        "type": "OBJECT",
-                        "properties": {},
-                    }
-                },
-                {
-                    "name": "screen_stocks",
-                    "description": "Find or recommend stocks based on a strategy (bullish/bearish). Use this when user asks for recommendations or ideas.",
-                    "parameters": {
-                        "type": "OBJECT",
-                        "properties": {
-                            "strategy": {"type": "STRING", "description": "The strategy to use (bullish or bearish).", "enum": ["bullish", "bearish"]}
-                        },
-                        "required": ["strategy"]
-                    }
-                },
-                {
-                    "name": "get_stock_history",
-                    "description": "Get historical stock data for analysis.",
-                    "parameters": {
-                        "type": "OBJECT",
-                        "properties": {
-                            "symbol": {"type": "STRING", "description": "The stock symbol (e.g., RELIANCE)."},
-                            "period": {"type": "STRING", "description": "Time period (1d, 5d, 1mo, 3mo, 6mo, 1y, 5y). Default 1mo."}
-                        },
-                        "required": ["symbol"]
-                    }
-                },
-                {
-                    "name": "get_company_news",
-                    "description": "Get recent news for a company.",
-                    "parameters": {
-                        "type": "OBJECT",
-                        "properties": {
-                            "symbol": {"type": "STRING", "description": "The stock symbol (e.g., RELIANCE)."}
-                        },
-                        "required": ["symbol"]
-                    }
-                },
-                {
-                    "name": "query_market_data",
-                    "description": "Query/Screen the stock market database for stocks matching specific criteria (sector, price, PE, market cap). Use this for broad questions like 'Find cheap banks' or 'Stocks with high market cap'.",
-                    "parameters": {
-                        "type": "OBJECT",
-                        "properties": {
-                            "sector": {"type": "STRING", "description": "Sector to filter by (e.g., 'Bank', 'IT', 'Energy')."},
-                            "min_price": {"type": "NUMBER", "description": "Minimum price."},
-                            "max_price": {"type": "NUMBER", "description": "Maximum price."},
-                            "min_pe": {"type": "NUMBER", "description": "Minimum PE ratio."},
-                            "max_pe": {"type": "NUMBER", "description": "Maximum PE ratio."},
-                            "min_market_cap": {"type": "INTEGER", "description": "Minimum market cap."},
-                            "sort_by": {"type": "STRING", "description": "Field to sort by (market_cap, pe_ratio, current_price). Default is market_cap."}
-                        },
-                        "required": []
-                    }
-                }
-            ]
-        }
-    ]
-
 @api_view(['POST'])
 def stream_message(request, conversation_id: str):
     # Server-Sent Events streaming of assistant reply
@@ -408,18 +306,19 @@ def stream_message(request, conversation_id: str):
         mode = convo.get('mode', 'real')
 
         # Use chat service
-        from .chat_service import process_chat_message
-        generator = process_chat_message(request.user, user_text, previous_messages, mode, files=files)
+        from .chat_service import process_chat_message, event_data, is_text_event
+        generator = process_chat_message(request.user, user_text, previous_messages, mode, files=files,
+                                         summary=convo.get('summary'), summary_upto=convo.get('summary_upto', 0))
         
         full_response = ""
         for chunk in generator:
             if chunk == "data: [DONE]\n\n":
                 continue
             yield chunk
-            # Accumulate text content for saving
-            if chunk.startswith("data: ") and not chunk.startswith("data: ["):
-                content = chunk[6:].strip()
-                full_response += content + " "
+            # Accumulate the streamed text deltas for saving
+            content = event_data(chunk)
+            if is_text_event(content):
+                full_response += content
 
         # Persist assistant message
         if full_response:
@@ -429,6 +328,7 @@ def stream_message(request, conversation_id: str):
                 {'_id': ObjectId(conversation_id)},
                 {'$push': {'messages': assistant_msg}, '$set': {'updated_at': saved_at}}
             )
+            chat_history.schedule_summary_update(conversation_id)
             
             # Dynamic Title Generation
             # Check if title is default "New chat" and we have enough context
@@ -491,16 +391,17 @@ def add_message(request, conversation_id: str):
             return Response(conversation_doc_to_dto(updated))
 
     # Use chat service (non-streaming)
-    from .chat_service import process_chat_message
+    from .chat_service import process_chat_message, event_data, is_text_event
     previous_messages = convo.get('messages', [])
     mode = convo.get('mode', 'real')
     
-    generator = process_chat_message(request.user, user_text, previous_messages, mode)
+    generator = process_chat_message(request.user, user_text, previous_messages, mode,
+                                     summary=convo.get('summary'), summary_upto=convo.get('summary_upto', 0))
     full_response = ""
     for chunk in generator:
-        if chunk.startswith("data: ") and not chunk.startswith("data: [") and chunk != "data: [DONE]\n\n":
-            content = chunk[6:].strip()
-            full_response += content + " "
+        content = event_data(chunk)
+        if is_text_event(content):
+            full_response += content
             
     ai_text = full_response.strip() if full_response else "I couldn't generate a response."
     
@@ -509,6 +410,7 @@ def add_message(request, conversation_id: str):
         {'_id': ObjectId(conversation_id)},
         {'$push': {'messages': {'$each': [user_msg, ai_msg]}}, '$set': {'updated_at': now}}
     )
+    chat_history.schedule_summary_update(conversation_id)
     
     # Dynamic Title Generation
     try:
@@ -545,7 +447,6 @@ from twilio.rest import Client
 
 def process_whatsapp_message(user_id, incoming_msg, sender_phone):
     try:
-        # Re-connect to DB in thread
         _, db = get_mongo()
         col = db['conversations']
         user = User.objects.get(id=user_id)
@@ -575,15 +476,16 @@ def process_whatsapp_message(user_id, incoming_msg, sender_phone):
         col.update_one({'_id': convo_id}, {'$push': {'messages': user_msg}, '$set': {'updated_at': now}})
         
         # Process with chat service
-        from .chat_service import process_chat_message
+        from .chat_service import process_chat_message, event_data
         previous_messages = convo.get('messages', [])
         
-        generator = process_chat_message(user, incoming_msg, previous_messages, mode='real')
+        generator = process_chat_message(user, incoming_msg, previous_messages, mode='real',
+                                         summary=convo.get('summary'), summary_upto=convo.get('summary_upto', 0))
         
         full_response = ""
         for chunk in generator:
-            if chunk.startswith("data: ") and not chunk.startswith("data: [DONE]"):
-                content = chunk[6:].strip()
+            content = event_data(chunk)
+            if content != "[DONE]":
                 
                 # Handle Structured Data Events
                 if content.startswith("[HOLDINGS]"):
@@ -628,7 +530,7 @@ def process_whatsapp_message(user_id, incoming_msg, sender_phone):
                         full_response += "\n(Could not display stock data)\n"
                 
                 else:
-                    full_response += content + " "
+                    full_response += content
         
         # Save assistant message
         if full_response:
@@ -638,6 +540,7 @@ def process_whatsapp_message(user_id, incoming_msg, sender_phone):
                 {'_id': convo_id},
                 {'$push': {'messages': assistant_msg}, '$set': {'updated_at': saved_at}}
             )
+            chat_history.schedule_summary_update(convo_id)
             
             # Send response via Twilio API
             if settings.TWILIO_ACCOUNT_SID and settings.TWILIO_AUTH_TOKEN:
@@ -745,39 +648,123 @@ def backtest_strategy(request):
     params = request.data.get('parameters', {})
     period = request.data.get('period', '1y')
     
-    # Fetch Data
     try:
-        if not symbol.endswith(".NS") and not symbol.endswith(".BO"):
-            ticker_symbol = f"{symbol}.NS"
-        else:
-            ticker_symbol = symbol
-            
-        ticker = yf.Ticker(ticker_symbol)
-        # Fetch enough data for indicators
-        df = ticker.history(period=period)
-        
-        if df.empty:
+        results = backtest_service.run_backtest(symbol, strategy, params, period)
+        if results is None:
              return Response({'detail': 'No data found'}, status=404)
-             
-        engine = BacktestEngine(df)
-        
-        if strategy == 'sma':
-            short_window = int(params.get('short_window', 50))
-            long_window = int(params.get('long_window', 200))
-            results = engine.run_sma_strategy(short_window, long_window)
-        elif strategy == 'rsi':
-            period = int(params.get('period', 14))
-            overbought = int(params.get('overbought', 70))
-            oversold = int(params.get('oversold', 30))
-            results = engine.run_rsi_strategy(period, overbought, oversold)
-        else:
-            return Response({'detail': 'Unknown strategy'}, status=400)
-            
         return Response(results)
         
+    except ValueError as e:
+        return Response({'detail': str(e)}, status=400)
     except Exception as e:
         return Response({'detail': str(e)}, status=500)
 
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def factor_backtest(request):
+    """
+    Cross-sectional momentum/mean reversion backtest over the NIFTY 50
+    universe (or the given 'symbols').
+    """
+    strategy = request.data.get('strategy', 'momentum')
+    params = request.data.get('parameters', {})
+    period = request.data.get('period', '2y')
+    symbols = request.data.get('symbols')
+
+    try:
+        results = backtest_service.run_factor_backtest(strategy, params, period, symbols)
+        if results is None:
+            return Response({'detail': 'No data found'}, status=404)
+        return Response(results)
+
+    except ValueError as e:
+        return Response({'detail': str(e)}, status=400)
+    except Exception as e:
+        return Response({'detail': str(e)}, status=500)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets EventSource clients (Accept: text/event-stream) through content negotiation."""
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return f"event: error\ndata: {json.dumps(data)}\n\n"
+
+
+def job_owner(request):
+    # Anonymous playground users are limited per client address
+    if request.user.is_authenticated:
+        return request.user.id
+    return f"anon:{request.META.get('REMOTE_ADDR', '')}"
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def submit_backtest_job(request):
+    """
+    Queues a backtest ('backtest'), parameter sweep ('sweep'), chunked minute
+    bar backtest ('intraday') or factor backtest ('factor') and returns its
+    job id. Progress is available from backtest_job_events as SSE.
+    """
+    kind = request.data.get('kind', 'backtest')
+    payload = {k: v for k, v in request.data.items() if k != 'kind'}
+    try:
+        job = jobs.submit(job_owner(request), kind, payload)
+    except jobs.JobLimitError as e:
+        return Response({'detail': str(e)}, status=429)
+    except ValueError as e:
+        return Response({'detail': str(e)}, status=400)
+    return Response(job.to_dict(), status=202)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def get_backtest_job(request, job_id: str):
+    job = jobs.get_job(job_id, job_owner(request))
+    if not job:
+        return Response({'detail': 'Not found'}, status=404)
+    return Response(job.to_dict())
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@renderer_classes([JSONRenderer, EventStreamRenderer])
+def backtest_job_events(request, job_id: str):
+    job = jobs.get_job(job_id, job_owner(request))
+    if not job:
+        return Response({'detail': 'Not found'}, status=404)
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID') or 0)
+    except ValueError:
+        last_event_id = 0
+
+    response = StreamingHttpResponse(jobs.stream_events(job, last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def cancel_backtest_job(request, job_id: str):
+    job = jobs.get_job(job_id, job_owner(request))
+    if not job:
+        return Response({'detail': 'Not found'}, status=404)
+    job.cancel()
+    return Response(job.to_dict(include_result=False))
+
+PLAYGROUND_INSTRUCTION = """
+You are an expert algorithmic trading instructor in a "Playground" environment.
+The first message describes the user's strategy and its backtest results.
+
+YOUR ROLE:
+- Explain the performance educationaly.
+- If the user asks "Why did I lose money?", explain based on the strategy logic (e.g., "RSI is a mean reversion strategy, but the market was trending strongly...").
+- Suggest improvements (e.g., "Try increasing the window size to reduce noise").
+- Be concise, friendly, and encouraging.
+"""
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def analyze_playground(request):
@@ -792,31 +779,18 @@ def analyze_playground(request):
         return Response({'detail': 'Gemini API key not configured'}, status=500)
         
     try:
-        import google.generativeai as genai
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        model = genai.GenerativeModel("gemini-2.5-flash")
-        
-        # Construct System Context
-        system_context = f"""
-        You are an expert algorithmic trading instructor in a "Playground" environment.
-        
+        model = gemini.get_model('playground', system_instruction=PLAYGROUND_INSTRUCTION)
+
+        # The strategy under discussion opens the history; the instructor
+        # role is the shared system instruction
+        strategy_context = f"""
         CURRENT STRATEGY CONTEXT:
         Configuration: {json.dumps(strategy_config, indent=2)}
         Backtest Results: {json.dumps(results.get('metrics') if results else {}, indent=2)}
-        
-        YOUR ROLE:
-        - Explain the performance educationaly.
-        - If the user asks "Why did I lose money?", explain based on the strategy logic (e.g., "RSI is a mean reversion strategy, but the market was trending strongly...").
-        - Suggest improvements (e.g., "Try increasing the window size to reduce noise").
-        - Be concise, friendly, and encouraging.
         """
-        
-        # Build History for Gemini
-        # Better approach for stateless API:
-        # Construct history list for start_chat.
-        
+
         gemini_history = []
-        gemini_history.append({"role": "user", "parts": [system_context]})
+        gemini_history.append({"role": "user", "parts": [strategy_context]})
         gemini_history.append({"role": "model", "parts": ["Understood. I am ready to help the user with their algorithmic trading strategy."]})
         
         for msg in messages[:-1]:
@@ -839,45 +813,26 @@ def analyze_playground(request):
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def get_leaderboard(request):
+    """
+    ?metric=value|balanced|consistency; ?cursor=<next_cursor> for the page
+    after the top 50 (?limit, max 200)
+    """
     metric = request.GET.get('metric', 'value') # value, balanced, consistency
-    
-    queryset = LeaderboardSnapshot.objects.select_related('user').all()
-    
-    if metric == 'value':
-        queryset = queryset.order_by('-total_value')
-    elif metric == 'balanced':
-        queryset = queryset.order_by('-diversification_score')
-    elif metric == 'consistency':
-        queryset = queryset.order_by('-win_rate')
-        
+    current_user_id = request.user.id if request.user.is_authenticated else None
+    try:
+        limit = int(request.GET.get('limit', leaderboard.PAGE_SIZE))
+        data, next_cursor = leaderboard.get_page(metric, request.GET.get('cursor'), limit, current_user_id)
+    except ValueError as e:
+        return JsonResponse({'detail': str(e)}, status=400)
+
     # Calculate user rank if authenticated
     user_entry = None
-    if request.user.is_authenticated:
-        # Find user's position in the full sorted list
-        for rank, entry in enumerate(queryset, 1):
-            if entry.user.id == request.user.id:
-                user_entry = {
-                    'rank': rank,
-                    'username': entry.user.username,
-                    'total_value': entry.total_value,
-                    'diversification_score': entry.diversification_score,
-                    'win_rate': entry.win_rate,
-                    'is_current_user': True
-                }
-                break
-                
-    data = []
-    for rank, entry in enumerate(queryset[:50], 1):
-        data.append({
-            'rank': rank,
-            'username': entry.user.username,
-            'total_value': entry.total_value,
-            'diversification_score': entry.diversification_score,
-            'win_rate': entry.win_rate,
-            'is_current_user': request.user.is_authenticated and entry.user.id == request.user.id
-        })
-        
-    return JsonResponse({'leaderboard': data, 'user_entry': user_entry})
+    if current_user_id is not None:
+        snapshot = LeaderboardSnapshot.objects.select_related('user').filter(user_id=current_user_id).first()
+        if snapshot:
+            user_entry = leaderboard.entry(snapshot, leaderboard.rank_of(snapshot, metric), current_user_id)
+
+    return JsonResponse({'leaderboard': data, 'user_entry': user_entry, 'next_cursor': next_cursor})
 
 
 @api_view(['POST'])
@@ -1056,6 +1011,108 @@ def get_market_movers_view(request):
     except Exception as e:
         return Response({'success': False, 'message': str(e)}, status=500)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_simulated_value_history_view(request):
+    """
+    Daily portfolio values as columns {"dates": [...], "values": [...]};
+    optional ?start=YYYY-MM-DD&end=YYYY-MM-DD (default: the last year)
+    """
+    try:
+        start = request.query_params.get('start')
+        end = request.query_params.get('end')
+        start = datetime.date.fromisoformat(start) if start else None
+        end = datetime.date.fromisoformat(end) if end else None
+    except ValueError:
+        return Response({'success': False, 'message': 'Dates must be YYYY-MM-DD'}, status=400)
+    try:
+        data = portfolio_valuation.get_value_series(request.user.id, start, end)
+        return Response({'success': True, **data})
+    except Exception as e:
+        return Response({'success': False, 'message': str(e)}, status=500)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_simulated_orders_view(request):
+    """
+    Recent simulated orders; ?pending=1 for resting LIMIT/stop orders only
+    """
+    try:
+        data = order_book.list_orders(request.user.id, request.query_params.get('pending') in ('1', 'true'))
+        return Response(data)
+    except Exception as e:
+        return Response({'success': False, 'message': str(e)}, status=500)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def cancel_simulated_order_view(request, order_id: str):
+    try:
+        data = order_book.cancel_order(request.user.id, order_id)
+        return Response(data, status=200 if data['success'] else 404)
+    except Exception as e:
+        return Response({'success': False, 'message': str(e)}, status=500)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def place_simulated_basket_view(request):
+    """
+    Place simulated market orders as one basket:
+    {"orders": [{"tradingsymbol", "transaction_type", "quantity"}, ...]}
+    """
+    orders = request.data.get('orders')
+    if not isinstance(orders, list) or not all(isinstance(o, dict) for o in orders):
+        return Response({'success': False, 'message': 'orders must be a list of objects'}, status=400)
+    try:
+        data = sim_tools.place_simulated_basket(request.user.id, orders)
+        return Response(data, status=200 if data['success'] else 400)
+    except Exception as e:
+        return Response({'success': False, 'message': str(e)}, status=500)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def start_replay_view(request):
+    """
+    Start a historical replay: start_date, end_date (YYYY-MM-DD), speed in
+    days per second (default 1) and optional starting cash
+    """
+    try:
+        start_date = datetime.date.fromisoformat(str(request.data.get('start_date')))
+        end_date = datetime.date.fromisoformat(str(request.data.get('end_date')))
+        speed = float(request.data.get('speed', 1))
+        cash = float(request.data.get('cash', sim_tools.STARTING_CASH))
+    except (TypeError, ValueError):
+        return Response({'success': False, 'message': 'start_date/end_date must be YYYY-MM-DD, speed and cash numbers'}, status=400)
+    try:
+        data = replay.start_session(request.user.id, start_date, end_date, speed, cash)
+        return Response(data, status=201 if data['success'] else 400)
+    except Exception as e:
+        return Response({'success': False, 'message': str(e)}, status=500)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_replay_view(request, session_id: str):
+    try:
+        data = replay.get_session_state(request.user.id, session_id)
+        return Response(data, status=200 if data['success'] else 404)
+    except Exception as e:
+        return Response({'success': False, 'message': str(e)}, status=500)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def place_replay_order_view(request, session_id: str):
+    try:
+        quantity = int(request.data.get('quantity', 0))
+    except (TypeError, ValueError):
+        return Response({'success': False, 'message': 'quantity must be an integer'}, status=400)
+    try:
+        data = replay.place_replay_order(
+            request.user.id, session_id, str(request.data.get('tradingsymbol', '')),
+            str(request.data.get('transaction_type', '')).upper(), quantity
+        )
+        return Response(data, status=200 if data['success'] else 400)
+    except Exception as e:
+        return Response({'success': False, 'message': str(e)}, status=500)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_simulated_portfolio_view(request):
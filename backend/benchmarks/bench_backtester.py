@@ -0,0 +1,209 @@
+"""
+Benchmarks for the BacktestEngine hot path on synthetic GBM bars.
+
+Records wall time (best of N) and peak traced memory per case and size, and
+can compare a run against a stored JSON baseline:
+
+    cd backend
+    python -m benchmarks.bench_backtester --output benchmarks/baseline.json
+    python -m benchmarks.bench_backtester --compare benchmarks/baseline.json
+
+Sizes whose extrapolated run time or peak memory exceeds --time-budget or
+--memory-budget are skipped, so the default 10^3..10^7 sweep finishes on a
+laptop.
+"""
+import argparse
+import datetime
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from api.backtester import BacktestEngine, run_chunked
+from benchmarks.synthetic import gbm_bars
+
+DEFAULT_SIZES = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7]
+
+
+def case_engine_init(df):
+    return lambda: BacktestEngine(df)
+
+
+def case_sma(df):
+    engine = BacktestEngine(df)
+    return lambda: engine.run_sma_strategy(50, 200)
+
+
+def case_rsi(df):
+    engine = BacktestEngine(df)
+    return lambda: engine.run_rsi_strategy(14, 70, 30)
+
+
+def case_sma_low_memory(df):
+    engine = BacktestEngine(df, low_memory=True)
+    return lambda: engine.run_sma_strategy(50, 200)
+
+
+def case_sma_float32(df):
+    engine = BacktestEngine(df, low_memory=True, dtype=np.float32)
+    return lambda: engine.run_sma_strategy(50, 200)
+
+
+def case_rsi_low_memory(df):
+    engine = BacktestEngine(df, low_memory=True)
+    return lambda: engine.run_rsi_strategy(14, 70, 30)
+
+
+def case_sma_chunked(df):
+    blocks = [df.iloc[i:i + 100_000] for i in range(0, len(df), 100_000)]
+    # Capped curve, as run_intraday_backtest does with INTRADAY_CURVE_POINTS
+    return lambda: run_chunked(blocks, 'sma', {'short_window': 50, 'long_window': 200}, max_points=5000)
+
+
+def case_performance(df):
+    engine = BacktestEngine(df)
+    prepared = df.copy()
+    sma_short = prepared['Close'].rolling(50).mean()
+    sma_long = prepared['Close'].rolling(200).mean()
+    prepared['Position'] = np.sign(sma_short - sma_long).fillna(0).diff()
+    return lambda: engine._calculate_performance(prepared)
+
+
+def case_serialize(df):
+    results = BacktestEngine(df).run_sma_strategy(50, 200)
+    # Like DRF's encoder, build the equity curve points through tolist()
+    return lambda: json.dumps(results, default=lambda o: o.tolist() if hasattr(o, 'tolist') else str(o))
+
+
+CASES = {
+    'engine_init': case_engine_init,
+    'sma': case_sma,
+    'rsi': case_rsi,
+    'sma_low_memory': case_sma_low_memory,
+    'sma_float32': case_sma_float32,
+    'rsi_low_memory': case_rsi_low_memory,
+    'sma_chunked': case_sma_chunked,
+    'performance': case_performance,
+    'serialize': case_serialize,
+}
+
+
+def make_data(n, seed):
+    # A daily index cannot hold 10^7 bars, minute bars can
+    return gbm_bars(n, freq='D' if n <= 50_000 else 'min', seed=seed)
+
+
+def measure(fn, repeat):
+    gc.collect()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+        if timings[-1] > 5:
+            break  # long runs are stable enough from a single sample
+    gc.collect()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': round(min(timings), 6), 'peak_mb': round(peak / 2 ** 20, 3)}
+
+
+def run(cases, sizes, repeat, time_budget, memory_budget, seed):
+    results = {name: {} for name in cases}
+    previous = {}
+    for n in sizes:
+        df = make_data(n, seed)
+        for name in cases:
+            if name in previous:
+                # Setup (e.g. the run that 'serialize' needs) counts towards the budget
+                prev_n, prev_t, prev_mb = previous[name]
+                est_t = prev_t * n / prev_n
+                est_mb = prev_mb * n / prev_n
+                if est_t > time_budget or est_mb > memory_budget:
+                    reason = f"estimated {est_t:.0f}s / {est_mb:.0f}MB exceeds budget"
+                    results[name][str(n)] = {'skipped': reason}
+                    print(f"{name:>12} {n:>10}  skipped ({reason})")
+                    continue
+            start = time.perf_counter()
+            fn = CASES[name](df)
+            setup = time.perf_counter() - start
+            stats = measure(fn, repeat)
+            results[name][str(n)] = stats
+            previous[name] = (n, setup + stats['seconds'], stats['peak_mb'])
+            print(f"{name:>12} {n:>10}  {stats['seconds']:>10.4f}s  {stats['peak_mb']:>10.2f}MB")
+        del df
+    return results
+
+
+def compare(current, baseline, tolerance, min_seconds=0.005):
+    """Returns a list of human readable regressions."""
+    regressions = []
+    for name, sizes in current.items():
+        for n, stats in sizes.items():
+            base = baseline.get(name, {}).get(n)
+            if not base or 'seconds' not in base or 'seconds' not in stats:
+                continue
+            if stats['seconds'] > base['seconds'] * (1 + tolerance) and stats['seconds'] - base['seconds'] > min_seconds:
+                regressions.append(f"{name}[{n}] time {base['seconds']:.4f}s -> {stats['seconds']:.4f}s")
+            if stats['peak_mb'] > base['peak_mb'] * (1 + tolerance) and stats['peak_mb'] - base['peak_mb'] > 1:
+                regressions.append(f"{name}[{n}] memory {base['peak_mb']:.2f}MB -> {stats['peak_mb']:.2f}MB")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES), default=list(CASES))
+    parser.add_argument('--sizes', nargs='+', type=int, default=DEFAULT_SIZES)
+    parser.add_argument('--max-rows', type=int, default=None, help='drop sizes above this')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--time-budget', type=float, default=120.0, help='seconds per measurement')
+    parser.add_argument('--memory-budget', type=float, default=2048.0, help='peak MB per measurement')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write results as a JSON baseline')
+    parser.add_argument('--compare', help='baseline JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slowdown')
+    args = parser.parse_args(argv)
+
+    sizes = [n for n in args.sizes if args.max_rows is None or n <= args.max_rows]
+    results = run(args.cases, sizes, args.repeat, args.time_budget, args.memory_budget, args.seed)
+
+    if args.output:
+        payload = {
+            'meta': {
+                'created': datetime.datetime.utcnow().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'pandas': pd.__version__,
+                'machine': platform.machine(),
+                'seed': args.seed,
+            },
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(payload, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baseline written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print('Regressions:')
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print('No regressions against baseline.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
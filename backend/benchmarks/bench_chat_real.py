@@ -0,0 +1,158 @@
+"""
+End-to-end real-mode chat against the local fake broker.
+
+Drives chat_service.process_chat_message in real mode for a user whose Kite
+credentials point at benchmarks.fake_kite, so profile lookup, guardrails,
+tool dispatch, kite_tools (client cache, holdings cache, order dispatcher)
+and the HTTP round trips to the broker all run for real. Gemini is replaced
+by a scripted model that asks for one tool and then answers, with
+--llm-latency seconds per model call. Broker failures injected with
+--error-rate reach the model as failed tool results (basket legs are
+retried by the dispatcher); "ai errors" counts messages that crashed.
+
+    cd backend
+    python -m benchmarks.bench_chat_real --scenario holdings order basket --requests 200 --concurrency 1 8 \\
+        --latency 0.05 --error-rate 0.02
+
+Runs in a throwaway test database; nothing is written to db.sqlite3.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
+django.setup()
+
+import numpy as np  # noqa: E402
+from django.conf import settings  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+
+from api import chat_service, kite_tools  # noqa: E402
+from api.models import UserProfile  # noqa: E402
+from benchmarks.fake_kite import FakeKite  # noqa: E402
+
+SCENARIOS = {
+    'holdings': ("Show me my holdings", 'get_holdings', {}),
+    'order': ("Buy 1 share of TCS", 'place_order',
+              {'tradingsymbol': 'TCS', 'exchange': 'NSE', 'transaction_type': 'BUY', 'quantity': 1}),
+    'basket': ("Rebalance into five stocks", 'place_basket_order', {'orders': [
+        {'tradingsymbol': f"SYM{i}", 'exchange': 'NSE', 'transaction_type': 'BUY', 'quantity': 1} for i in range(5)
+    ]}),
+}
+
+
+class ScriptedModel:
+    """Stands in for genai.GenerativeModel: one tool call, then a text answer."""
+
+    tool_name = None
+    tool_args = None
+    latency = 0.0
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def start_chat(self, history=None):
+        return ScriptedChat(self)
+
+
+class ScriptedChat:
+
+    def __init__(self, model):
+        self.model = model
+
+    def send_message(self, parts, **kwargs):
+        if self.model.latency:
+            time.sleep(self.model.latency)
+        first = parts and isinstance(parts[0], str)
+        if first:
+            call = SimpleNamespace(name=self.model.tool_name, args=dict(self.model.tool_args))
+            chunks = [[SimpleNamespace(function_call=call, text='')]]
+        else:
+            chunks = [[SimpleNamespace(function_call=None, text=delta)] for delta in ('All ', 'done.')]
+        chunks = [SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=p))]) for p in chunks]
+        # chat_service streams replies; a list of chunks iterates like a streamed response
+        return chunks if kwargs.get('stream') else chunks[0]
+
+
+def run_message(user, text):
+    start = time.perf_counter()
+    events = list(chat_service.process_chat_message(user, text, mode='real'))
+    elapsed = time.perf_counter() - start
+    ok = not any('AI error' in e for e in events)
+    return elapsed, ok, events
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', nargs='+', default=['holdings', 'order', 'basket'], choices=sorted(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.05, help='broker latency, seconds')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--llm-latency', type=float, default=0.0, help='scripted model latency per call, seconds')
+    parser.add_argument('--cold-holdings', action='store_true', help='drop cached holdings before every message')
+    args = parser.parse_args(argv)
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    server = FakeKite(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                      orders_per_second=10, require_session=True).start()
+    settings.KITE_API_ROOT = server.url
+    settings.GEMINI_API_KEY = settings.GEMINI_API_KEY or 'bench'
+    settings.INSTRUMENTS_FILE = os.path.join(os.path.dirname(__file__), 'no-instruments.npy')
+    settings.KITE_ORDER_RETRY_BACKOFF = 0.05
+    try:
+        users = []
+        for i in range(args.users):
+            user = User.objects.create_user(f"bench{i}", password='x')
+            profile = UserProfile.objects.create(user=user)
+            profile.kiteconnect_key = f"key{i}"
+            profile.kiteconnect_secret = 'secret'
+            # Log in through the fake broker like the exchange_token view does
+            session = kite_tools.KiteConnect(api_key=f"key{i}", root=server.url).generate_session(f"req{i}", api_secret='secret')
+            profile.kiteconnect_access_token = session['access_token']
+            profile.save()
+            users.append(user)
+
+        print(f"{'scenario':>9} {'conc':>5} {'msg/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'ai errors':>10} "
+              f"{'broker calls':>13} {'injected':>9}")
+        for name in args.scenario:
+            text, tool_name, tool_args = SCENARIOS[name]
+            ScriptedModel.tool_name, ScriptedModel.tool_args, ScriptedModel.latency = tool_name, tool_args, args.llm_latency
+            for concurrency in args.concurrency:
+                server.requests.clear()
+                server.injected_errors = 0
+
+                def one(i):
+                    if args.cold_holdings:
+                        kite_tools._holdings.clear()
+                    return run_message(users[i % len(users)], text)
+
+                with patch('google.generativeai.GenerativeModel', ScriptedModel), patch('google.generativeai.configure'):
+                    start = time.perf_counter()
+                    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                        results = list(pool.map(one, range(args.requests)))
+                    wall = time.perf_counter() - start
+
+                latencies = np.array([r[0] for r in results]) * 1000
+                errors = sum(1 for r in results if not r[1])
+                calls = sum(server.requests.values())
+                print(f"{name:>9} {concurrency:>5} {args.requests / wall:>8.1f} {np.percentile(latencies, 50):>8.1f} "
+                      f"{np.percentile(latencies, 95):>8.1f} {errors:>10} {calls:>13} {server.injected_errors:>9}")
+    finally:
+        server.stop()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""
+Multi-leg Kite orders: one place_order call after another vs the concurrent,
+rate-limited dispatcher, against the local fake broker (no credentials or
+network needed):
+
+    cd backend
+    python -m benchmarks.bench_kite_dispatch --legs 10 50 --latency 0.1 --rate 8 --broker-limit 10
+
+The fake broker answers 429 above --broker-limit orders per second; the
+dispatcher should never trip it while --rate + --burst stays within that, and
+every leg must be placed exactly once.
+"""
+import argparse
+import os
+import sys
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from kiteconnect import KiteConnect  # noqa: E402
+
+from api import order_dispatcher  # noqa: E402
+from benchmarks.fake_kite import FakeKite  # noqa: E402
+
+
+def make_legs(n):
+    return [
+        {'tradingsymbol': f"SYM{i}", 'exchange': 'NSE', 'transaction_type': 'BUY' if i % 2 else 'SELL',
+         'quantity': 1, 'order_type': 'MARKET', 'product': 'CNC'}
+        for i in range(n)
+    ]
+
+
+def sequential(kite, legs):
+    for leg in legs:
+        kite.place_order(variety='regular', **leg)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--legs', type=int, nargs='+', default=[10, 50])
+    parser.add_argument('--latency', type=float, default=0.1, help='broker response time, seconds')
+    parser.add_argument('--rate', type=float, default=8, help='dispatcher budget, orders per second')
+    parser.add_argument('--burst', type=float, default=2, help='dispatcher burst size')
+    parser.add_argument('--broker-limit', type=int, default=10, help='fake broker limit, orders per second')
+    args = parser.parse_args(argv)
+
+    settings.KITE_ORDERS_PER_SECOND = args.rate
+    settings.KITE_ORDER_BURST = args.burst
+    print(f"{'legs':>6} {'sequential s':>13} {'dispatcher s':>13} {'speedup':>8} {'429s':>5} {'placed':>7}")
+    for n in args.legs:
+        legs = make_legs(n)
+        server = FakeKite(latency=args.latency, orders_per_second=args.broker_limit).start()
+        try:
+            kite = KiteConnect(api_key=f"bench{n}", access_token='token', root=server.url)
+            start = time.perf_counter()
+            sequential(kite, legs)
+            sequential_s = time.perf_counter() - start
+            time.sleep(1.0)  # let the broker's rate window drain
+
+            server.orders.clear()
+            server.rejected = 0
+            order_dispatcher._lanes.clear()
+            start = time.perf_counter()
+            statuses = order_dispatcher.dispatch_orders(kite, f"bench{n}", legs)
+            dispatcher_s = time.perf_counter() - start
+        finally:
+            server.stop()
+
+        placed = len({o['tag'] for o in server.orders})
+        print(f"{n:>6} {sequential_s:>13.2f} {dispatcher_s:>13.2f} {sequential_s / dispatcher_s:>7.1f}x "
+              f"{server.rejected:>5} {placed:>7}")
+        if not all(s['success'] for s in statuses) or placed != n or len(server.orders) != n:
+            print("  legs were lost or placed twice", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Concurrent simulated orders: read-modify-write vs the atomic ledger.
+
+Many threads buy and sell one symbol for the same few users against a local
+mongod. The old flow (find_one, update the holdings dict in Python, $set it
+back) loses updates under contention; the ledger's guarded
+find_one_and_update must keep cash + position value exactly conserved:
+
+    cd backend
+    python -m benchmarks.bench_ledger --uri mongodb://localhost:27017 --orders 2000 --threads 1 4 16
+
+Writes to (and afterwards drops) a scratch database, never MONGODB_DB.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+
+from api import mongo, sim_tools  # noqa: E402
+
+SCRATCH_DB = 'bench_ledger'
+SYMBOL = 'TCS.NS'
+PRICE = 100.0
+
+
+def read_modify_write(col, user_id, side, quantity):
+    portfolio = col.find_one({'user_id': user_id})
+    holdings = portfolio['holdings']
+    cash = portfolio['cash']
+    qty = holdings.get(SYMBOL, {'quantity': 0})['quantity']
+    if side == 'BUY' and cash >= quantity * PRICE:
+        holdings[SYMBOL] = {'quantity': qty + quantity, 'average_price': PRICE}
+        cash -= quantity * PRICE
+    elif side == 'SELL' and qty >= quantity:
+        holdings[SYMBOL] = {'quantity': qty - quantity, 'average_price': PRICE}
+        cash += quantity * PRICE
+    col.update_one({'user_id': user_id}, {'$set': {'holdings': holdings, 'cash': cash}})
+
+
+def atomic(col, user_id, side, quantity):
+    sim_tools.apply_simulated_trade(col, user_id, SYMBOL, side, quantity, PRICE)
+
+
+def replay(fn, col, orders, threads, users):
+    col.delete_many({})
+    col.insert_many([
+        {'user_id': u, 'cash': float(sim_tools.STARTING_CASH), 'holdings': {}, 'ledger_version': sim_tools.LEDGER_VERSION}
+        for u in range(users)
+    ])
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda i: fn(col, i % users, 'BUY' if i % 3 else 'SELL', 1), range(orders)))
+    wall = time.perf_counter() - start
+
+    # Every fill moves PRICE between cash and the position, so this is invariant
+    drift = 0.0
+    for portfolio in col.find():
+        shares = sum(h['quantity'] for h in portfolio['holdings'].values())
+        drift += abs(portfolio['cash'] + shares * PRICE - sim_tools.STARTING_CASH)
+    return orders / wall, drift
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--uri', default=settings.MONGODB_URI)
+    parser.add_argument('--orders', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=4)
+    parser.add_argument('--threads', nargs='+', type=int, default=[1, 4, 16])
+    args = parser.parse_args(argv)
+
+    settings.MONGODB_URI = args.uri
+    mongo.close()
+    col = mongo.get_client()[SCRATCH_DB]['simulated_portfolios']
+    col.create_index('user_id', unique=True)
+
+    try:
+        for threads in args.threads:
+            for name, fn in (('read-modify-write', read_modify_write), ('atomic ledger', atomic)):
+                throughput, drift = replay(fn, col, args.orders, threads, args.users)
+                print(f"{name:>18}  threads {threads:>3}  {throughput:8.0f} orders/s  value drift {drift:12.2f}")
+    finally:
+        mongo.get_client().drop_database(SCRATCH_DB)
+        mongo.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+Request latency with a client per call vs the shared pooled client.
+
+Replays a request-shaped workload (one indexed find_one on a portfolio
+document, as the simulated trading views do) against a local mongod, first
+constructing a MongoClient per request like the old get_mongo(), then through
+api.mongo:
+
+    cd backend
+    python -m benchmarks.bench_mongo --uri mongodb://localhost:27017 --requests 500 --threads 8
+
+Writes to (and afterwards drops) a scratch database, never MONGODB_DB.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from pymongo import MongoClient  # noqa: E402
+
+from api import mongo  # noqa: E402
+
+SCRATCH_DB = 'bench_mongo_pool'
+
+
+def request_per_client(uri, user_id):
+    client = MongoClient(uri)
+    try:
+        return client[SCRATCH_DB]['simulated_portfolios'].find_one({'user_id': user_id})
+    finally:
+        client.close()
+
+
+def request_shared(uri, user_id):
+    return mongo.get_client()[SCRATCH_DB]['simulated_portfolios'].find_one({'user_id': user_id})
+
+
+def replay(fn, uri, requests, threads):
+    def timed(i):
+        start = time.perf_counter()
+        fn(uri, i % 100)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = sorted(pool.map(timed, range(requests)))
+    wall = time.perf_counter() - start
+    return {
+        'mean_ms': statistics.fmean(latencies) * 1000,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        'throughput': requests / wall,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--uri', default=settings.MONGODB_URI)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--pool-size', type=int, default=settings.MONGODB_MAX_POOL_SIZE)
+    args = parser.parse_args(argv)
+
+    settings.MONGODB_URI = args.uri
+    settings.MONGODB_MAX_POOL_SIZE = args.pool_size
+    mongo.close()
+
+    col = mongo.get_client()[SCRATCH_DB]['simulated_portfolios']
+    col.drop()
+    col.create_index('user_id')
+    col.insert_many([{'user_id': i, 'cash_balance': 100000.0, 'holdings': {}} for i in range(100)])
+
+    try:
+        for name, fn in (('client per request', request_per_client), ('shared pool', request_shared)):
+            fn(args.uri, 0)  # warm up imports / first connection
+            stats = replay(fn, args.uri, args.requests, args.threads)
+            print(f"{name:>20}  mean {stats['mean_ms']:8.2f}ms  p50 {stats['p50_ms']:8.2f}ms  "
+                  f"p95 {stats['p95_ms']:8.2f}ms  {stats['throughput']:8.0f} req/s")
+    finally:
+        mongo.get_client().drop_database(SCRATCH_DB)
+        mongo.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Matching cost of the simulated order book vs scanning every resting order.
+
+Builds a book of resting LIMIT/SL-M orders around a price of 100 (buy limits
+and sell stops below it, sell limits and buy stops above) over a universe of
+symbols, then times one matching pass against a snapshot of small moves:
+
+    cd backend
+    python -m benchmarks.bench_order_book --orders 10000 100000 1000000 --symbols 50
+"""
+import argparse
+import random
+import sys
+import time
+
+from api.order_book import OrderBook
+
+
+def make_orders(n, symbols, seed):
+    rng = random.Random(seed)
+    orders = []
+    for i in range(n):
+        side = rng.choice(['BUY', 'SELL'])
+        stop = rng.random() < 0.3
+        below = (side == 'BUY') != stop
+        price = round(rng.uniform(90, 100) if below else rng.uniform(100, 110), 2)
+        orders.append({
+            'id': str(i),
+            'user_id': i % 1000,
+            'symbol': f"SYM{i % symbols}",
+            'transaction_type': side,
+            'quantity': 1,
+            'order_type': 'SL-M' if stop else 'LIMIT',
+            'price': None if stop else price,
+            'trigger_price': price if stop else None,
+            'status': 'TRIGGER PENDING' if stop else 'OPEN',
+        })
+    return orders
+
+
+def scan(orders, quotes):
+    fills = []
+    for o in orders:
+        q = quotes[o['symbol']]
+        if o['order_type'] == 'LIMIT':
+            hit = q <= o['price'] if o['transaction_type'] == 'BUY' else q >= o['price']
+        else:
+            hit = q >= o['trigger_price'] if o['transaction_type'] == 'BUY' else q <= o['trigger_price']
+        if hit:
+            fills.append((o, q))
+    return fills
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--orders', nargs='+', type=int, default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--symbols', type=int, default=50)
+    parser.add_argument('--quote-move', type=float, default=0.002, help='relative quote spread around 100')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    quotes = {f"SYM{i}": 100 * (1 + rng.uniform(-args.quote_move, args.quote_move)) for i in range(args.symbols)}
+    print(f"{'orders':>10} {'build':>10} {'match':>10} {'scan':>10} {'fills':>8}")
+    for n in args.orders:
+        orders = make_orders(n, args.symbols, args.seed)
+        book = OrderBook()
+        start = time.perf_counter()
+        for o in orders:
+            book.add(o)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        fills, _ = book.match(quotes)
+        match = time.perf_counter() - start
+
+        start = time.perf_counter()
+        expected = scan(orders, quotes)
+        scanned = time.perf_counter() - start
+        assert {o['id'] for o, _ in fills} == {o['id'] for o, _ in expected}
+        print(f"{n:>10} {build:>9.3f}s {match * 1000:>8.2f}ms {scanned * 1000:>8.2f}ms {len(fills):>8}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
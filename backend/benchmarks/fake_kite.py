@@ -0,0 +1,268 @@
+"""
+Local stand-in for the Kite Connect HTTP API, for load tests.
+
+Serves the endpoints the app uses: POST /session/token (login), GET
+/portfolio/holdings, POST /orders/<variety> and GET /orders. Responses can be
+delayed (latency plus uniform jitter) and a fraction of them can fail with a
+Kite error (error_rate, error_type). Like Kite, it limits orders per API key
+and answers 429 NetworkException above that rate. With require_session, only
+access tokens it issued through /session/token are accepted.
+
+Point a client at it with KiteConnect(root=server.url) or KITE_API_ROOT:
+
+    server = FakeKite(latency=0.05, orders_per_second=10).start()
+    ...
+    server.stop()
+
+or run it on its own and start the dev server with KITE_API_ROOT set:
+
+    python -m benchmarks.fake_kite --port 8765 --latency 0.05 --error-rate 0.02
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import random
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# HTTP status Kite answers each error type with
+ERROR_STATUS = {
+    'NetworkException': 503,
+    'DataException': 502,
+    'GeneralException': 500,
+    'TokenException': 403,
+    'InputException': 400,
+    'OrderException': 500,
+}
+
+
+def make_holdings(count, seed=0):
+    """Holdings rows shaped like GET /portfolio/holdings."""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        average = round(rng.uniform(50, 5000), 2)
+        last = round(average * rng.uniform(0.7, 1.5), 2)
+        quantity = rng.randint(1, 500)
+        rows.append({
+            "tradingsymbol": f"SYM{i}",
+            "exchange": "NSE",
+            "instrument_token": 100000 + i,
+            "isin": f"INE{i:09d}",
+            "product": "CNC",
+            "quantity": quantity,
+            "t1_quantity": 0,
+            "average_price": average,
+            "last_price": last,
+            "close_price": last,
+            "pnl": round((last - average) * quantity, 2),
+            "day_change": 0.0,
+            "day_change_percentage": 0.0,
+        })
+    return rows
+
+
+class FakeKite:
+    """
+    latency: seconds every response is delayed by, plus up to `jitter` more.
+    orders_per_second: accepted orders per API key in any one-second window.
+    error_rate: fraction of requests answered with `error_type` instead.
+    holdings: rows returned by GET /portfolio/holdings (default 20 synthetic).
+    require_session: reject access tokens not issued by /session/token.
+    """
+
+    def __init__(self, latency=0.0, orders_per_second=10, jitter=0.0, error_rate=0.0,
+                 error_type='NetworkException', holdings=None, require_session=False,
+                 seed=0, host='127.0.0.1', port=0):
+        if error_type not in ERROR_STATUS:
+            raise ValueError(f"error_type must be one of {', '.join(ERROR_STATUS)}")
+        self.latency = latency
+        self.jitter = jitter
+        self.orders_per_second = orders_per_second
+        self.error_rate = error_rate
+        self.error_type = error_type
+        self.holdings = make_holdings(20) if holdings is None else holdings
+        self.require_session = require_session
+        self.orders = []
+        self.rejected = 0
+        self.requests = Counter()
+        self.injected_errors = 0
+        self._sessions = set()
+        self._rng = random.Random(seed)
+        self._order_ids = itertools.count(250000000000000)
+        self._recent = defaultdict(deque)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-kite', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _delay(self):
+        with self._lock:
+            extra = self._rng.uniform(0, self.jitter) if self.jitter else 0.0
+        return self.latency + extra
+
+    def _inject_error(self):
+        with self._lock:
+            if self.error_rate and self._rng.random() < self.error_rate:
+                self.injected_errors += 1
+                return True
+        return False
+
+    def _allow_order(self, api_key):
+        now = time.monotonic()
+        with self._lock:
+            recent = self._recent[api_key]
+            while recent and now - recent[0] >= 1.0:
+                recent.popleft()
+            if len(recent) >= self.orders_per_second:
+                self.rejected += 1
+                return False
+            recent.append(now)
+            return True
+
+    def _create_session(self, params):
+        api_key = params.get("api_key", "")
+        if not api_key or not params.get("request_token") or not params.get("checksum"):
+            return 400, {"status": "error", "message": "Missing api_key, request_token or checksum", "error_type": "InputException"}
+        access_token = hashlib.sha256(f"{api_key}:{params['request_token']}".encode()).hexdigest()[:32]
+        with self._lock:
+            self._sessions.add(access_token)
+        return 200, {"status": "success", "data": {
+            "user_id": "FK0001",
+            "user_name": "Fake Broker",
+            "api_key": api_key,
+            "access_token": access_token,
+            "public_token": access_token[:16],
+            "login_time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }}
+
+    def _place_order(self, api_key, variety, params):
+        if not self._allow_order(api_key):
+            return 429, {"status": "error", "message": "Too many requests", "error_type": "NetworkException"}
+        with self._lock:
+            order_id = str(next(self._order_ids))
+            self.orders.append({
+                "order_id": order_id,
+                "variety": variety,
+                "status": "COMPLETE",
+                "tradingsymbol": params.get("tradingsymbol"),
+                "exchange": params.get("exchange"),
+                "transaction_type": params.get("transaction_type"),
+                "quantity": int(params.get("quantity", 0)),
+                "order_type": params.get("order_type"),
+                "product": params.get("product"),
+                "tag": params.get("tag"),
+            })
+        return 200, {"status": "success", "data": {"order_id": order_id}}
+
+    def route(self, method, path, api_key, access_token, params):
+        """Returns (status code, JSON body) for a request."""
+        parts = path.strip('/').split('/')
+        with self._lock:
+            self.requests[f"{method} /{parts[0]}"] += 1
+        if self._inject_error():
+            return ERROR_STATUS[self.error_type], {"status": "error", "message": "Injected failure", "error_type": self.error_type}
+
+        if method == 'POST' and parts == ['session', 'token']:
+            return self._create_session(params)
+        if self.require_session and access_token not in self._sessions:
+            return 403, {"status": "error", "message": "Incorrect `api_key` or `access_token`.", "error_type": "TokenException"}
+        if method == 'GET' and parts == ['portfolio', 'holdings']:
+            return 200, {"status": "success", "data": self.holdings}
+        if method == 'POST' and len(parts) == 2 and parts[0] == 'orders':
+            return self._place_order(api_key, parts[1], params)
+        if method == 'GET' and parts == ['orders']:
+            with self._lock:
+                return 200, {"status": "success", "data": list(self.orders)}
+        return 404, {"status": "error", "message": "Route not found", "error_type": "GeneralException"}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+            def _respond(self, method):
+                url = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    params.update({k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()})
+                # "token api_key:access_token"
+                auth = self.headers.get('Authorization', '')
+                api_key, _, access_token = auth[len('token '):].partition(':') if auth.startswith('token ') else ('', '', '')
+
+                delay = fake._delay()
+                if delay:
+                    time.sleep(delay)
+                status, body = fake.route(method, url.path, api_key, access_token, params)
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self._respond('GET')
+
+            def do_POST(self):
+                self._respond('POST')
+
+            def do_DELETE(self):
+                self._respond('DELETE')
+
+            def do_PUT(self):
+                self._respond('PUT')
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra random latency, seconds')
+    parser.add_argument('--orders-per-second', type=int, default=10)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-type', default='NetworkException', choices=sorted(ERROR_STATUS))
+    parser.add_argument('--holdings', type=int, default=20, help='number of synthetic holdings')
+    parser.add_argument('--require-session', action='store_true')
+    args = parser.parse_args(argv)
+
+    server = FakeKite(latency=args.latency, jitter=args.jitter, orders_per_second=args.orders_per_second,
+                      error_rate=args.error_rate, error_type=args.error_type, holdings=make_holdings(args.holdings),
+                      require_session=args.require_session, host=args.host, port=args.port)
+    print(f"Fake Kite API on {server.url} (set KITE_API_ROOT={server.url})")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+Synthetic OHLCV generators for benchmarks and tests
+"""
+import numpy as np
+import pandas as pd
+
+
+def gbm_closes(n, s0=100.0, mu=0.08, sigma=0.25, steps_per_year=252, seed=0):
+    """
+    Geometric Brownian motion close prices:
+    S_t = S_0 * exp(sum((mu - sigma^2 / 2) * dt + sigma * sqrt(dt) * Z)).
+    """
+    rng = np.random.default_rng(seed)
+    dt = 1.0 / steps_per_year
+    log_returns = (mu - 0.5 * sigma ** 2) * dt + sigma * np.sqrt(dt) * rng.standard_normal(n)
+    return s0 * np.exp(np.cumsum(log_returns))
+
+
+def gbm_bars(n, freq='D', start='2000-01-03', seed=0, **kwargs):
+    """
+    DataFrame with ['Open', 'High', 'Low', 'Close', 'Volume'] and a datetime
+    index, shaped like yfinance history. Use freq='min' for sizes beyond what a
+    daily index can hold (pandas timestamps end in 2262).
+    """
+    steps_per_year = {'D': 252, 'min': 252 * 375}.get(freq, 252)
+    kwargs.setdefault('steps_per_year', steps_per_year)
+    close = gbm_closes(n, seed=seed, **kwargs)
+    rng = np.random.default_rng(seed + 1)
+
+    open_ = np.empty(n)
+    open_[0] = close[0]
+    open_[1:] = close[:-1]
+    spread = np.abs(rng.standard_normal(n)) * 0.002
+    high = np.maximum(open_, close) * (1 + spread)
+    low = np.minimum(open_, close) * (1 - spread)
+    volume = rng.integers(1_000, 100_000, n)
+
+    index = pd.date_range(start=start, periods=n, freq=freq)
+    return pd.DataFrame({
+        'Open': open_,
+        'High': high,
+        'Low': low,
+        'Close': close,
+        'Volume': volume,
+    }, index=index)
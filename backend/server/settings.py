@@ -160,3 +160,69 @@ ENCRYPTION_KEY = os.getenv('ENCRYPTION_KEY', '')
 TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID', '')
 TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN', '')
 TWILIO_PHONE_NUMBER = os.getenv('TWILIO_PHONE_NUMBER', '')
+
+# Backtest playground caching
+BACKTEST_CACHE_SIZE = int(os.getenv('BACKTEST_CACHE_SIZE', '256'))
+BACKTEST_HISTORY_TTL = int(os.getenv('BACKTEST_HISTORY_TTL', '300'))  # seconds
+FACTOR_MAX_SYMBOLS = int(os.getenv('FACTOR_MAX_SYMBOLS', '100'))  # universe size for factor backtests
+
+# Background backtest jobs
+BACKTEST_JOB_WORKERS = int(os.getenv('BACKTEST_JOB_WORKERS', '2'))
+BACKTEST_JOB_QUEUE_SIZE = int(os.getenv('BACKTEST_JOB_QUEUE_SIZE', '32'))
+BACKTEST_JOBS_PER_USER = int(os.getenv('BACKTEST_JOBS_PER_USER', '2'))
+BACKTEST_JOB_RETENTION = int(os.getenv('BACKTEST_JOB_RETENTION', '900'))  # seconds to keep finished jobs
+BACKTEST_JOB_HEARTBEAT = 15  # seconds between SSE keep-alives
+BACKTEST_SWEEP_MAX_COMBINATIONS = int(os.getenv('BACKTEST_SWEEP_MAX_COMBINATIONS', '200'))
+
+# Stored OHLCV bars for chunked intraday backtests: <BARS_DATA_DIR>/1m/<TICKER>.csv
+BARS_DATA_DIR = os.getenv('BARS_DATA_DIR', str(BASE_DIR / 'data' / 'bars'))
+INTRADAY_CHUNK_ROWS = int(os.getenv('INTRADAY_CHUNK_ROWS', '250000'))
+INTRADAY_CURVE_POINTS = int(os.getenv('INTRADAY_CURVE_POINTS', '5000'))  # max equity curve points per result
+
+# Shared MongoDB connection pool (per process)
+MONGODB_MAX_POOL_SIZE = int(os.getenv('MONGODB_MAX_POOL_SIZE', '50'))
+MONGODB_MIN_POOL_SIZE = int(os.getenv('MONGODB_MIN_POOL_SIZE', '0'))
+
+# Simulation mode pending orders: background matcher polling quotes, started with
+# the web server. With several web workers set SIM_ORDER_MATCHER=False and run
+# `manage.py run_order_matcher` once instead.
+SIM_ORDER_MATCHER = os.getenv('SIM_ORDER_MATCHER', 'True') == 'True'
+SIM_ORDER_MATCH_INTERVAL = int(os.getenv('SIM_ORDER_MATCH_INTERVAL', '5'))  # seconds
+
+# Background threads refreshing leaderboard snapshots after simulated trades
+LEADERBOARD_UPDATE_WORKERS = int(os.getenv('LEADERBOARD_UPDATE_WORKERS', '2'))
+
+# Historical replay sessions: daily bars from <BARS_DATA_DIR>/1d/<TICKER>.csv
+REPLAY_BAR_CACHE_SIZE = int(os.getenv('REPLAY_BAR_CACHE_SIZE', '1000'))  # symbols kept in memory
+REPLAY_MAX_SPEED = float(os.getenv('REPLAY_MAX_SPEED', '30'))  # replayed days per second
+
+# Per-user KiteConnect clients and broker holdings kept warm between calls
+KITE_CLIENT_CACHE_SIZE = int(os.getenv('KITE_CLIENT_CACHE_SIZE', '1000'))
+KITE_CLIENT_TTL = int(os.getenv('KITE_CLIENT_TTL', '3600'))  # seconds
+KITE_HOLDINGS_TTL = int(os.getenv('KITE_HOLDINGS_TTL', '30'))  # seconds
+KITE_HOLDINGS_STALE_TTL = int(os.getenv('KITE_HOLDINGS_STALE_TTL', '300'))  # served while refreshing (chat only)
+KITE_HOLDINGS_REFRESH_WORKERS = int(os.getenv('KITE_HOLDINGS_REFRESH_WORKERS', '2'))
+
+# Instrument master for symbol validation: built by `manage.py load_instruments`
+INSTRUMENTS_FILE = os.getenv('INSTRUMENTS_FILE', str(BASE_DIR / 'data' / 'instruments.npy'))
+INSTRUMENTS_URL = os.getenv('INSTRUMENTS_URL', 'https://api.kite.trade/instruments')
+
+# Multi-leg Kite orders: sent concurrently within a per-user rate budget
+KITE_API_ROOT = os.getenv('KITE_API_ROOT') or None  # e.g. a local fake broker for load tests
+KITE_DISPATCH_WORKERS = int(os.getenv('KITE_DISPATCH_WORKERS', '8'))
+KITE_DISPATCH_USER_WORKERS = int(os.getenv('KITE_DISPATCH_USER_WORKERS', '3'))  # per-user share of the workers
+# Kite allows 10 orders/s per API key; any second sees at most burst + rate
+KITE_ORDERS_PER_SECOND = float(os.getenv('KITE_ORDERS_PER_SECOND', '8'))
+KITE_ORDER_BURST = float(os.getenv('KITE_ORDER_BURST', '2'))
+KITE_ORDER_MAX_RETRIES = int(os.getenv('KITE_ORDER_MAX_RETRIES', '3'))
+KITE_ORDER_RETRY_BACKOFF = float(os.getenv('KITE_ORDER_RETRY_BACKOFF', '0.5'))  # seconds, doubled per retry
+
+# Chat tool calls: read-only calls (READ_ONLY_TOOLS) in a model turn run concurrently;
+# orders, cancels and other calls run one after another, in the order emitted
+CHAT_TOOL_WORKERS = int(os.getenv('CHAT_TOOL_WORKERS', '8'))
+CHAT_MAX_TOOL_ROUNDS = int(os.getenv('CHAT_MAX_TOOL_ROUNDS', '5'))  # model turns with tool calls per message
+
+# Chat history sent to Gemini: recent messages within a token budget, older ones summarized
+CHAT_HISTORY_TOKENS = int(os.getenv('CHAT_HISTORY_TOKENS', '6000'))
+CHAT_SUMMARY_WORDS = int(os.getenv('CHAT_SUMMARY_WORDS', '250'))
+CHAT_SUMMARY_WORKERS = int(os.getenv('CHAT_SUMMARY_WORKERS', '2'))
@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
 
 application = get_wsgi_application()
+
+# Match resting simulated orders from startup rather than from the first
+# order submitted after a restart
+from django.conf import settings  # noqa: E402
+
+if settings.SIM_ORDER_MATCHER:
+    from api import order_book  # noqa: E402
+    order_book.start_matcher()
@@ -224,15 +224,20 @@ export default function Chat({ mode = "real" }: { mode?: "real" | "simulation" }
       const reader = res.body.getReader();
       const decoder = new TextDecoder();
       let done = false;
+      // Events can straddle reads, so keep the unfinished tail for the next one
+      let buffer = "";
 
       while (!done) {
         const { value, done: readerDone } = await reader.read();
         if (readerDone) break;
-        const chunk = decoder.decode(value, { stream: true });
-        const lines = chunk.split(/\n\n/).filter(Boolean);
-        for (const line of lines) {
-          if (!line.startsWith("data:")) continue;
-          const data = line.replace(/^data:\s?/, "");
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split("\n\n");
+        buffer = events.pop() ?? "";
+        for (const event of events) {
+          // A multi-line text delta arrives as one data: field per line
+          const dataLines = event.split("\n").filter((l) => l.startsWith("data:"));
+          if (dataLines.length === 0) continue;
+          const data = dataLines.map((l) => l.replace(/^data: ?/, "")).join("\n");
           if (data === "[DONE]") {
             done = true;
             break;